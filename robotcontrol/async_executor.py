@@ -0,0 +1,212 @@
+#! /usr/bin/env python
+
+"""asyncio mission engine, actionlib callbacks and battery updates are bridged to futures
+
+a single event loop thread drives any number of missions and monitors; blocking service calls
+(robot state, configuration) run in the loop's default executor, waits on goals, battery levels
+and Rainbow never hold a thread
+"""
+import asyncio
+import threading
+
+from actionlib_msgs.msg import GoalStatus
+import ig_action_msgs.msg
+
+from robotcontrol import log
+from robotcontrol.bot_controller import sleep_interval
+
+
+class MissionEngine:
+    """runs an asyncio event loop in one background thread and accepts missions from any thread"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = None
+        self.bots = {}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.loop.run_forever, name='mission-engine')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def submit(self, coro):
+        """schedule a coroutine, returns a concurrent.futures.Future that can be waited on or cancelled"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def async_bot(self, bot):
+        """the AsyncBot of a BotController, created on first use"""
+        if bot not in self.bots:
+            self.bots[bot] = AsyncBot(bot, self.loop)
+        return self.bots[bot]
+
+    def run_mission(self, bot, start, targets, **kwargs):
+        """schedule a mission of bot, see AsyncBot.run_mission for the keyword arguments"""
+        return self.submit(self.async_bot(bot).run_mission(start, targets, **kwargs))
+
+
+class AsyncBot:
+    """awaitable versions of the BotController operations for one robot"""
+
+    def __init__(self, bot, loop):
+        self.bot = bot
+        self.gazebo = bot.gazebo
+        self.loop = loop
+        # (predicate on the charge, future) resolved from the battery subscriber thread
+        self.charge_watchers = []
+        self.watchers_lock = threading.Lock()
+        self.gazebo.charge_callbacks.append(self.on_charge)
+
+    def _resolve(self, future, value):
+        """resolve a future of the loop from any thread"""
+        def set_result():
+            if not future.done():
+                future.set_result(value)
+        self.loop.call_soon_threadsafe(set_result)
+
+    def on_charge(self, charge):
+        with self.watchers_lock:
+            pending = []
+            for predicate, future in self.charge_watchers:
+                if predicate(charge):
+                    self._resolve(future, charge)
+                else:
+                    pending.append((predicate, future))
+            self.charge_watchers = pending
+
+    async def battery(self, predicate):
+        """wait until the charge satisfies predicate, returns the charge"""
+        future = self.loop.create_future()
+        with self.watchers_lock:
+            if self.gazebo.battery_charge >= 0 and predicate(self.gazebo.battery_charge):
+                return self.gazebo.battery_charge
+            self.charge_watchers.append((predicate, future))
+        return await future
+
+    async def battery_below(self, fraction):
+        capacity = self.gazebo.battery_capacity
+        return await self.battery(lambda charge: charge < fraction * capacity)
+
+    async def battery_full(self):
+        capacity = self.gazebo.battery_capacity
+        return await self.battery(lambda charge: charge >= capacity)
+
+    async def call(self, func, *args):
+        """run a blocking service call in the executor of the loop"""
+        return await self.loop.run_in_executor(None, func, *args)
+
+    async def _goal(self, client, goal, active_cb=None, done_cb=None):
+        """send an action goal and wait for it without blocking a thread, the goal is cancelled with the task"""
+        future = self.loop.create_future()
+
+        def on_done(status, result):
+            if done_cb is not None:
+                done_cb(status, result)
+            self._resolve(future, status)
+
+        client.send_goal(goal, done_cb=on_done, active_cb=active_cb)
+        try:
+            status = await future
+        except asyncio.CancelledError:
+            client.cancel_goal()
+            raise
+        return status == GoalStatus.SUCCEEDED
+
+    async def send_instructions(self, igcode, active_cb=None, done_cb=None):
+        goal = ig_action_msgs.msg.InstructionGraphGoal(order=igcode)
+        # battery updates cancel the goal through the preemption check of the interface while it is active
+        self.gazebo.preempted = False
+        self.gazebo.goal_active = True
+        try:
+            success = await self._goal(self.gazebo.ig_client, goal, active_cb=active_cb, done_cb=done_cb)
+        finally:
+            self.gazebo.goal_active = False
+        self.gazebo.observe('ig_result', int(success))
+        return success
+
+    async def move_to_point(self, x, y):
+        success = await self._goal(self.gazebo.movebase_client, self.gazebo.movebase_goal(x, y))
+        self.gazebo.observe('movebase_result', int(success))
+        return success
+
+    async def rainbow_done(self):
+        """wait for Rainbow to report the current task DONE or FAILED"""
+        while True:
+            res = self.bot.rainbow_status()
+            if res is not None:
+                return res
+            await asyncio.sleep(sleep_interval)
+
+    async def go_instructions(self, start, target, active_cb=None, done_cb=None):
+        task = await self.call(self.bot.prepare_task, start, target)
+        if task is None:
+            return False
+        igcode, updated_igcode = task
+        return await self.send_instructions(updated_igcode, active_cb=active_cb, done_cb=done_cb)
+
+    async def go_charging(self, current_loc, charging_id=None):
+        # the search for the closest station and the memory profile snapshot of the phase block
+        charging_id = await self.call(self.bot.charging_station, current_loc, charging_id)
+        if self.gazebo.movebase_client is None:
+            await self.call(self.gazebo.connect_to_navigation_server)
+        coords = self.bot.map_server.waypoint_to_coords(charging_id)
+        res = await self.move_to_point(coords['x'], coords['y'])
+        if res:
+            await self.call(self.bot.dock)
+        else:
+            log.warn("The instruction to go to the nearest charging station was failed")
+        return res, charging_id
+
+    async def charge(self, charging_id=None):
+        """go to a charging station (the closest by default), wait for a full battery and undock, returns the station"""
+        x, y, w, v = await self.call(self.gazebo.get_bot_state)
+        loc = {"x": x, "y": y}
+        res, charging_id = await self.go_charging(loc, charging_id)
+        while not res:
+            res, charging_id = await self.go_charging(loc, charging_id)
+        await self.battery_full()
+        await self.call(self.bot.undock)
+        self.gazebo.preempted = False
+        return charging_id
+
+    async def run_mission(self, start, targets, adaptive=False, active_cb=None, done_cb=None,
+                          at_waypoint_cb=None, mission_done_cb=None):
+        """the mission loops of BotController as a coroutine, Rainbow decides task completion when adaptive"""
+        log.info("Asynchronous robot started the mission!")
+
+        number_of_tasks_accomplished = 0
+        locs = []
+        self.bot.trace_mission()
+
+        for i, target in enumerate(targets):
+            log.info("Starting a new task to get to: {}", target)
+            current_start = start
+            if adaptive:
+                # as in the adaptive loop the goal is only sent, Rainbow tells when the task is over
+                self.bot.update_current_target_waypoint_and_resetting_previous(current_waypoint=target)
+                await self.call(self.bot.go_instructions, current_start, target, False, active_cb, done_cb)
+                success = await self.rainbow_done()
+            else:
+                success = await self.go_instructions(current_start, target, active_cb=active_cb, done_cb=done_cb)
+
+            bot_state = await self.call(self.gazebo.get_bot_state)
+            loc, start = self.bot.finish_task(current_start, target, success, bot_state, at_waypoint_cb)
+            locs.append(loc)
+            if loc["task_accomplished"]:
+                number_of_tasks_accomplished += 1
+
+            if adaptive:
+                continue
+            charge_now, charging_id = await self.call(self.bot.needs_charging, start, targets[i + 1:])
+            if charge_now:
+                start = await self.charge(charging_id)
+
+        if mission_done_cb is not None:
+            mission_done_cb(number_of_tasks_accomplished, locs)
+
+        return number_of_tasks_accomplished, locs
@@ -1,26 +1,92 @@
+import hashlib
+import json
+import os
+import tempfile
 import xml.etree.ElementTree as et
 
+from robotcontrol import cache
+
+
+def read_battery_parameters(world_file, battery_name):
+    """stream the world file until the battery and the battery plugin are found
+
+    :return: (voltage, charge_rate, capacity), zero for what the file does not have
+    """
+    voltage = charge_rate = capacity = None
+    # elements of the battery and the plugin are kept until they are read, everything else is cleared once parsed
+    keep = 0
+    for event, elem in et.iterparse(world_file, events=('start', 'end')):
+        wanted = (elem.tag == 'battery' and elem.get('name') == battery_name and voltage is None) or \
+                 (elem.tag == 'plugin' and elem.get('name') == 'battery' and capacity is None)
+        if event == 'start':
+            if wanted:
+                keep += 1
+            continue
+
+        if wanted:
+            keep -= 1
+            # assuming the plugin name is "battery", see the world xml file structure where the battery plugin live
+            if elem.tag == 'battery':
+                voltage = float(elem.find('voltage').text)
+            else:
+                charge_rate = float(elem.find('charge_rate').text)
+                capacity = float(elem.find('capacity').text)
+            if voltage is not None and capacity is not None:
+                break
+        if keep == 0:
+            elem.clear()
+
+    return voltage or 0, charge_rate or 0, capacity or 0
+
+
+def _cache_file(world_file, battery_name):
+    """the battery parameters are cached as json keyed by the path, mtime and size of the world file, so a warm
+    start neither parses nor reads the world file; unlike the database cache they are cached by default"""
+    st = os.stat(world_file)
+    key = '{0}:{1}:{2}:{3}'.format(os.path.abspath(world_file), st.st_mtime_ns, st.st_size, battery_name)
+    return os.path.join(cache.cache_dir, 'battery-{0}.json'.format(hashlib.sha1(key.encode()).hexdigest()))
+
 
 class BatteryDB:
 
-    def __init__(self, world_file, battery_name):
-        tree = et.parse(world_file)
-        self.battery_voltage = 0
-        self.charge_rate = 0
-        self.capacity = 0
-        for battery in tree.iter('battery'):
-            if battery.get('name') == battery_name:
-                self.battery_voltage = float(battery.find('voltage').text)
-        # assuming the plugin name is "battery", see the world xml file structure where the battery plugin live
-        for plugin in tree.iter('plugin'):
-            if plugin.get('name') == 'battery':
-                self.charge_rate = float(plugin.find('charge_rate').text)
-                self.capacity = float(plugin.find('capacity').text)
+    def __init__(self, world_file, battery_name, use_cache=True):
+        cache_file = _cache_file(world_file, battery_name) if use_cache else None
+        params = None
+        if cache_file is not None:
+            try:
+                with open(cache_file) as cached:
+                    params = json.load(cached)
+            except (OSError, ValueError):
+                params = None
+
+        if params is None:
+            params = read_battery_parameters(world_file, battery_name)
+            if cache_file is not None:
+                self._store(cache_file, params)
+        self.battery_voltage, self.charge_rate, self.capacity = params
+
+    @staticmethod
+    def _store(cache_file, params):
+        try:
+            if not os.path.isdir(cache.cache_dir):
+                os.makedirs(cache.cache_dir)
+            # write to a temporary file first so that a concurrent start never reads half of it
+            fd, tmp = tempfile.mkstemp(dir=cache.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w') as tmp_file:
+                json.dump(params, tmp_file)
+            os.replace(tmp, cache_file)
+        except OSError:
+            # a read-only home only costs the xml parsing on the next start
+            pass
+
+    def discharge_rate(self, power_load):
+        """Ah drawn per second under the given power load (in Watt)"""
+        return power_load / (self.battery_voltage * 3600)
 
     def time_to_fully_discharge(self, charge_level, power_load):
         """calculate Ah per second by dividing Power Load (in Watt) by Voltage to give the current"""
         """return the time in seconds"""
-        draw_per_second = power_load / (self.battery_voltage * 3600)
+        draw_per_second = self.discharge_rate(power_load)
         time_to_discharge = charge_level / draw_per_second
         return time_to_discharge
 
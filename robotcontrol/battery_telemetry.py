@@ -0,0 +1,69 @@
+#! /usr/bin/env python
+
+"""fixed-capacity ring buffer of battery telemetry"""
+import numpy as np
+
+# columns of a telemetry record
+TIMESTAMP = 0
+CHARGE = 1
+CHARGING = 2
+CONFIG = 3
+
+
+class BatteryTelemetry:
+    """preallocated ring buffer of (timestamp, charge, charging flag, config id) records
+
+    every record is written twice, at pos and pos + capacity, so the most recent k <= capacity
+    records are always one contiguous slice and windows are returned as views without copying.
+    Views are only valid until the buffer wraps around over them.
+    """
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.data = np.zeros((2 * capacity, 4), dtype=np.float64)
+        self.pos = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp, charge, charging, config_id):
+        """called from the subscriber callback, writes in place without allocating"""
+        data = self.data
+        pos = self.pos
+        data[pos, TIMESTAMP] = data[pos + self.capacity, TIMESTAMP] = timestamp
+        data[pos, CHARGE] = data[pos + self.capacity, CHARGE] = charge
+        data[pos, CHARGING] = data[pos + self.capacity, CHARGING] = charging
+        data[pos, CONFIG] = data[pos + self.capacity, CONFIG] = config_id
+        self.pos = (pos + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def window(self, n=None):
+        """view of the last n records (all of them by default), oldest first"""
+        if n is None or n > self.count:
+            n = self.count
+        end = self.pos + self.capacity
+        return self.data[end - n:end]
+
+    def since(self, timestamp):
+        """view of the records received at or after timestamp"""
+        records = self.window()
+        start = np.searchsorted(records[:, TIMESTAMP], timestamp, side='left')
+        return records[start:]
+
+    def latest(self):
+        """the most recent record, or None if nothing has been recorded yet"""
+        if self.count == 0:
+            return None
+        return self.data[self.pos + self.capacity - 1]
+
+    def timestamps(self, n=None):
+        return self.window(n)[:, TIMESTAMP]
+
+    def charges(self, n=None):
+        return self.window(n)[:, CHARGE]
+
+    def clear(self):
+        self.pos = 0
+        self.count = 0
@@ -0,0 +1,310 @@
+#! /usr/bin/env python
+
+"""microbenchmarks of the data path: map queries, instruction and configuration lookups, database loading and the
+pose conversions
+
+everything runs on synthetic databases written to a temporary directory, so neither ROS nor the cp1 files are needed:
+    python -m robotcontrol.benchmarks --sizes small medium --format json --out benchmarks.json
+"""
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from robotcontrol import cache
+from robotcontrol import instruction_generator
+from robotcontrol import planar_pose
+from robotcontrol import synthetic
+from robotcontrol import transformations
+from robotcontrol.mapserver import MapServer
+from robotcontrol.instructions_db import InstructionDB
+from robotcontrol.instruction_generator import InstructionGenerator
+from robotcontrol.configuration_db import ConfigurationDB
+from robotcontrol.battery_db import BatteryDB
+from robotcontrol.reachability import ReachabilityTable
+
+# size -> (side of the waypoint grid, instruction db pairs, configurations, models in the world file, batch length)
+sizes = OrderedDict([
+    ('small', (5, 500, 14, 10, 100)),
+    ('medium', (20, 5000, 100, 1000, 10000)),
+    ('large', (50, 20000, 1000, 10000, 100000)),
+    ('huge', (70, 100000, 10000, 50000, 1000000)),
+])
+
+battery_name = 'brass_battery'
+# meters between neighbouring waypoints of the grid
+spacing = 4.0
+# seed of the synthetic databases, the same inputs for every version being compared
+seed = 1
+
+
+def write_configurations(path, count):
+    rnd = random.Random(seed)
+    configurations = []
+    for config_id in range(count):
+        power = rnd.uniform(30.0, 90.0)
+        configurations.append({'config_id': config_id, 'speed': rnd.uniform(0.3, 1.2), 'power_load_w': power,
+                               'power_load': power / 3.6})
+    with open(path, 'w') as config_json:
+        json.dump({'configurations': configurations}, config_json)
+
+
+def write_world(path, models):
+    """a world file with the battery of the robot after the given number of filler models"""
+    with open(path, 'w') as world:
+        world.write('<?xml version="1.0" ?>\n<sdf version="1.4">\n<world name="default">\n')
+        for k in range(models):
+            world.write('<model name="box{0}"><pose>{0} 0 0 0 0 0</pose><link name="link"><collision name="c">'
+                        '<geometry><box><size>1 1 1</size></box></geometry></collision></link></model>\n'.format(k))
+        world.write('<model name="mobile_base"><link name="body"><battery name="{0}"><voltage>12.592</voltage>'
+                    '</battery></link><plugin name="battery" filename="libbattery_discharge.so">'
+                    '<charge_rate>0.2</charge_rate><capacity>1.2009</capacity></plugin></model>\n'.format(battery_name))
+        world.write('</world>\n</sdf>\n')
+
+
+class Inputs:
+    """the synthetic databases of one size, written once and loaded by the benchmarks"""
+
+    def __init__(self, directory, size):
+        self.size = size
+        side, pairs, configs, models, batch = sizes[size]
+        self.directory = os.path.join(directory, size)
+        os.makedirs(self.directory)
+        self.map_file = os.path.join(self.directory, 'map.json')
+        self.instructions_file = os.path.join(self.directory, 'instructions.json')
+        self.config_file = os.path.join(self.directory, 'configurations.json')
+        self.world_file = os.path.join(self.directory, 'world.sdf')
+
+        # a side x side grid with charging stations in the first and the last waypoint of the first row
+        layout = synthetic.Grid(side, side, spacing=spacing, station_every=max(side - 1, 1), seed=seed)
+        synthetic.write_map(self.map_file, layout)
+        self.map_server = MapServer(self.map_file)
+        synthetic.write_instructions(self.instructions_file, layout,
+                                     synthetic.sample_pairs(layout, pairs, seed=seed))
+        write_configurations(self.config_file, configs)
+        write_world(self.world_file, models)
+        self.instruction_server = InstructionDB(self.instructions_file)
+        self.config_server = ConfigurationDB(self.config_file)
+        self.battery = BatteryDB(self.world_file, battery_name)
+        self.waypoints = len(self.map_server.waypoint_list)
+
+        rnd = random.Random(seed)
+        ids = [wp['node-id'] for wp in self.map_server.waypoint_list]
+        self.ids = ids
+        self.pairs = [key.split('_to_') for key in sorted(self.instruction_server.db)]
+        rnd.shuffle(self.pairs)
+        self.missing_pairs = [(a, b + 'x') for a, b in self.pairs[:100]]
+        self.random_pairs = [rnd.sample(ids, 2) for _ in range(100)]
+        self.locations = [{'x': rnd.uniform(0, side * spacing), 'y': rnd.uniform(0, side * spacing)}
+                          for _ in range(100)]
+        self.igcodes = [self.instruction_server.db['_to_'.join(pair)]['instructions'] for pair in self.pairs[:100]]
+        self.config_ids = [rnd.randrange(configs) for _ in range(100)]
+
+        np_rnd = np.random.RandomState(seed)
+        quaternions = np_rnd.normal(size=(batch, 4))
+        self.quaternions = quaternions / np.linalg.norm(quaternions, axis=1)[:, None]
+        self.angles = np_rnd.uniform(-math.pi, math.pi, size=(batch, 3))
+        self.yaws = self.angles[:, 2].copy()
+
+
+def cycling(func, items):
+    """a call of func with the next of items, so that one query is not measured over and over"""
+    items = itertools.cycle(items)
+    return lambda: func(*next(items))
+
+
+def uncached(load):
+    def run():
+        enabled = cache.enabled
+        cache.enabled = False
+        try:
+            load()
+        finally:
+            cache.enabled = enabled
+    return run
+
+
+def _conversions(inputs):
+    q = [tuple(row) for row in inputs.quaternions[:100]]
+    a = [tuple(row) for row in inputs.angles[:100]]
+    return q, a
+
+
+# name -> (function of the inputs returning the callable to time, largest size it runs on)
+benchmarks = OrderedDict([
+    ('mapserver.load', (lambda i: uncached(lambda: MapServer(i.map_file)), 'huge')),
+    ('mapserver.load_cached', (lambda i: lambda: MapServer(i.map_file), 'huge')),
+    ('mapserver.waypoint_to_coords', (lambda i: cycling(i.map_server.waypoint_to_coords,
+                                                        [(wp,) for wp in i.ids[:100]]), 'huge')),
+    ('mapserver.is_waypoint', (lambda i: cycling(i.map_server.is_waypoint, [(wp,) for wp in i.ids[:100]]), 'huge')),
+    ('mapserver.shortest_path', (lambda i: cycling(i.map_server.shortest_path, i.random_pairs), 'huge')),
+    ('mapserver.path_lengths', (lambda i: cycling(i.map_server.path_lengths, [(wp,) for wp in i.ids[:100]]), 'huge')),
+    ('mapserver.coords_to_waypoint', (lambda i: cycling(i.map_server.coords_to_waypoint,
+                                                        [(loc,) for loc in i.locations]), 'large')),
+    ('mapserver.distances_to_stations', (lambda i: i.map_server.distances_to_stations, 'huge')),
+    ('reachability.build', (lambda i: lambda: ReachabilityTable(i.map_server, i.config_server, i.battery), 'large')),
+    ('reachability.nearest_waypoint', (lambda i: cycling(
+        ReachabilityTable(i.map_server, i.config_server, i.battery).nearest_waypoint,
+        [(loc['x'], loc['y']) for loc in i.locations]), 'large')),
+    ('reachability.margin', (lambda i: cycling(
+        ReachabilityTable(i.map_server, i.config_server, i.battery).margin,
+        [(loc, 1.0, c) for loc, c in zip(i.locations, i.config_ids)]), 'large')),
+    ('instruction_db.load', (lambda i: uncached(lambda: InstructionDB(i.instructions_file)), 'huge')),
+    ('instruction_db.load_cached', (lambda i: lambda: InstructionDB(i.instructions_file), 'huge')),
+    ('instruction_db.get_instructions', (lambda i: cycling(i.instruction_server.get_instructions,
+                                                           i.pairs[:100]), 'huge')),
+    ('instruction_db.get_instructions_missing', (lambda i: cycling(i.instruction_server.get_instructions,
+                                                                   i.missing_pairs), 'huge')),
+    ('instruction_db.get_predicted_duration', (lambda i: cycling(i.instruction_server.get_predicted_duration,
+                                                                 i.pairs[:100]), 'huge')),
+    ('instruction_generator.generate', (lambda i: cycling(
+        InstructionGenerator(i.instruction_server, i.map_server).generate, i.random_pairs), 'huge')),
+    ('instruction_generator.replace_speed', (lambda i: cycling(
+        instruction_generator.replace_speed, [(igcode, 0.7) for igcode in i.igcodes]), 'huge')),
+    ('configuration_db.load', (lambda i: uncached(lambda: ConfigurationDB(i.config_file)), 'huge')),
+    ('configuration_db.get_speed', (lambda i: cycling(i.config_server.get_speed,
+                                                      [(c,) for c in i.config_ids]), 'huge')),
+    ('configuration_db.get_power_load', (lambda i: cycling(i.config_server.get_power_load,
+                                                           [(c,) for c in i.config_ids]), 'huge')),
+    ('configuration_db.get_a_conservative_config', (lambda i: i.config_server.get_a_conservative_config, 'huge')),
+    ('configuration_db.get_a_highest_speed_config', (lambda i: i.config_server.get_a_highest_speed_config, 'huge')),
+    ('battery_db.load', (lambda i: lambda: BatteryDB(i.world_file, battery_name, use_cache=False), 'huge')),
+    ('battery_db.load_cached', (lambda i: lambda: BatteryDB(i.world_file, battery_name), 'huge')),
+    ('transformations.euler_from_quaternion', (lambda i: cycling(
+        transformations.euler_from_quaternion, [(q,) for q in _conversions(i)[0]]), 'small')),
+    ('transformations.quaternion_from_euler', (lambda i: cycling(
+        transformations.quaternion_from_euler, _conversions(i)[1]), 'small')),
+    ('transformations.euler_from_quaternion_batch', (lambda i: lambda: transformations.euler_from_quaternion_batch(
+        i.quaternions), 'huge')),
+    ('transformations.quaternion_from_euler_batch', (lambda i: lambda: transformations.quaternion_from_euler_batch(
+        i.angles), 'huge')),
+    ('planar_pose.yaw_from_quaternion', (lambda i: cycling(
+        planar_pose.yaw_from_quaternion, _conversions(i)[0]), 'small')),
+    ('planar_pose.quaternion_from_yaw', (lambda i: cycling(
+        planar_pose.quaternion_from_yaw, [(yaw,) for yaw in i.yaws[:100]]), 'small')),
+    ('planar_pose.yaws_from_quaternions', (lambda i: lambda: planar_pose.yaws_from_quaternions(i.quaternions),
+                                           'huge')),
+    ('planar_pose.quaternions_from_yaws', (lambda i: lambda: planar_pose.quaternions_from_yaws(i.yaws), 'huge')),
+])
+
+
+def measure(func, repeat=5, min_time=0.05):
+    """seconds per call of func, best and median of repeat runs of at least min_time seconds each
+
+    :return: (calls per run, best, median)
+    """
+    number = 1
+    while True:
+        start_time = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start_time
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed > min_time / 10 else 10
+    runs = [elapsed / number]
+    for _ in range(repeat - 1):
+        start_time = time.perf_counter()
+        for _ in range(number):
+            func()
+        runs.append((time.perf_counter() - start_time) / number)
+    return number, min(runs), float(np.median(runs))
+
+
+def environment():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__,
+            'transformations_accelerated': transformations.accelerated(),
+            'machine': platform.machine(), 'system': platform.system(), 'timestamp': time.time()}
+
+
+def run(size_names, selected=None, repeat=5, min_time=0.05, progress=None):
+    """time the selected benchmarks (all by default) on the inputs of every size
+
+    :param selected: substrings of the benchmark names to run
+    :return: list of result dicts
+    """
+    results = []
+    # the transformations benchmarks time the C implementations when the optional module is installed
+    transformations.accelerated()
+    directory = tempfile.mkdtemp(prefix='robotcontrol-bench-')
+    cache_dir, cache_enabled = cache.cache_dir, cache.enabled
+    # the warm start benchmarks read the cache of the temporary directory
+    cache.cache_dir = os.path.join(directory, 'cache')
+    cache.enabled = True
+    order = list(sizes)
+    try:
+        for size in size_names:
+            inputs = None
+            for name, (setup, max_size) in benchmarks.items():
+                if selected and not any(s in name for s in selected):
+                    continue
+                if order.index(size) > order.index(max_size):
+                    continue
+                if inputs is None:
+                    inputs = Inputs(directory, size)
+                func = setup(inputs)
+                # the first call fills the caches the benchmark is meant to hit
+                func()
+                number, best, median = measure(func, repeat=repeat, min_time=min_time)
+                result = {'benchmark': name, 'size': size, 'waypoints': inputs.waypoints, 'calls': number,
+                          'repeat': repeat, 'best': best, 'median': median}
+                results.append(result)
+                if progress is not None:
+                    progress(result)
+    finally:
+        cache.cache_dir, cache.enabled = cache_dir, cache_enabled
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def format_text(result):
+    return "{0:48s} {1:7s} {2:10.3f} us {3:10.3f} us".format(result['benchmark'], result['size'],
+                                                             result['best'] * 1e6, result['median'] * 1e6)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Microbenchmarks of the robotcontrol data path on synthetic inputs')
+    parser.add_argument('--sizes', nargs='+', choices=list(sizes), default=['small', 'medium', 'large'])
+    parser.add_argument('--filter', nargs='+', help='Only run the benchmarks whose names contain one of these')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.05, help='Minimum seconds of one timed run')
+    parser.add_argument('--format', choices=['text', 'json'], default='text')
+    parser.add_argument('--out', help='Write the results to this file instead of stdout')
+    args = parser.parse_args()
+
+    def progress(result):
+        sys.stderr.write(format_text(result) + '\n')
+
+    results = run(args.sizes, selected=args.filter, repeat=args.repeat, min_time=args.min_time,
+                  progress=progress if args.format == 'json' or args.out else None)
+    if args.format == 'json':
+        content = json.dumps({'version': 1, 'environment': environment(), 'results': results}, indent=2) + '\n'
+    else:
+        content = "{0:48s} {1:7s} {2:>13s} {3:>13s}\n".format('benchmark', 'size', 'best', 'median') + \
+                  ''.join(format_text(result) + '\n' for result in results)
+    if args.out:
+        with open(args.out, 'w') as out:
+            out.write(content)
+    else:
+        sys.stdout.write(content)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,26 +5,46 @@ import os
 import time
 import math
 import rospy
-import re
 from multiprocessing import Process
 from threading import Thread
 
 from robotcontrol.mapserver import MapServer
 from robotcontrol.instructions_db import InstructionDB
-from robotcontrol.bot_interface import ControlInterface
+from robotcontrol.instruction_generator import InstructionGenerator, replace_speed
+from robotcontrol.bot_interface import ControlInterface, battery_low_threshold
 from robotcontrol.configuration_db import ConfigurationDB
 from robotcontrol.battery_db import BatteryDB
+from robotcontrol.mission_planner import MissionPlanner
+from robotcontrol.energy_planner import EnergyPlanner
+from robotcontrol.reachability import ReachabilityTable
+from robotcontrol.mission_predictor import MissionPredictor
+from robotcontrol.duration_model import DurationModel
+from robotcontrol.mission_trace import MissionTraceWriter
+from robotcontrol import shared_db
 from robotcontrol.constants import AdaptationLevel
+from robotcontrol.instrumentation import timed
+from robotcontrol import memory_profile
+from robotcontrol import log
 
 
 map_file = os.path.expanduser("~/catkin_ws/src/cp1_base/maps/cp1_map.json")
 instructions_db_file = os.path.expanduser("~/catkin_ws/src/cp1_base/instructions/instructions-all.json")
 config_list = os.path.expanduser("~/cp1/config_list_true.json")
 world_file = os.path.expanduser("~/catkin_ws/src/cp1_base/worlds/p2-cp1-1.world")
+# fitted with python -m robotcontrol.duration_model, the model is fitted to the instruction db alone when it is missing
+duration_model_file = os.path.expanduser("~/cp1/duration_model.npz")
 
 battery_name = "brass_battery"
 sleep_interval = 5
 distance_threshold = 2
+# standard errors added to the measured discharge rate when it replaces the power model
+discharge_rate_confidence = 2.0
+# when set, the map, instruction and configuration databases are attached from shared memory (see shared_db)
+use_shared_databases = False
+# when set, the igcode of the pairs missing from the instruction db is generated from the map (see instruction_generator)
+synthesize_instructions = False
+# when set, the generated pairs are added to the journal of the instruction db
+instructions_write_back = False
 
 # for Rainbow integration
 current_target_waypoint = os.path.expanduser("~/cp1/current-target-waypoint")
@@ -35,16 +55,62 @@ def distance(loc1, loc2):
     return math.sqrt((loc1[0] - loc2[0]) ** 2 + (loc1[1] - loc2[1]) ** 2)
 
 
+def load_duration_model():
+    if os.path.exists(duration_model_file):
+        return DurationModel.load(duration_model_file)
+    return None
+
+
 class BotController:
 
-    def __init__(self):
-        self.map_server = MapServer(map_file)
-        self.instruction_server = InstructionDB(instructions_db_file)
-        self.config_server = ConfigurationDB(config_list)
-        self.robot_battery = BatteryDB(world_file, battery_name=battery_name)
-        self.gazebo = ControlInterface(self.config_server.get_default_config())
+    def __init__(self, map_server=None, instruction_server=None, config_server=None, robot_battery=None, gazebo=None,
+                 reachability=None, mission_predictor=None):
+        """the databases and the gazebo interface are loaded from the default locations unless they are given,
+        the databases and the reachability table are only read and can be shared between controllers"""
+        self.shared_databases = None
+        if use_shared_databases and map_server is None and instruction_server is None and config_server is None:
+            self.shared_databases = shared_db.load(map_file, instructions_db_file, config_list)
+            map_server = self.shared_databases.map_server
+            instruction_server = self.shared_databases.instruction_server
+            config_server = self.shared_databases.config_server
+        self.map_server = map_server if map_server is not None else MapServer(map_file)
+        self.instruction_server = instruction_server if instruction_server is not None else InstructionDB(instructions_db_file)
+        if synthesize_instructions and not isinstance(self.instruction_server, InstructionGenerator):
+            self.instruction_server = InstructionGenerator(
+                self.instruction_server, self.map_server,
+                write_back=instructions_write_back and self.instruction_server.writable)
+        self.config_server = config_server if config_server is not None else ConfigurationDB(config_list)
+        self.robot_battery = robot_battery if robot_battery is not None else BatteryDB(world_file, battery_name=battery_name)
+        self.gazebo = gazebo if gazebo is not None else ControlInterface(self.config_server.get_default_config())
         self.level = None
 
+        if mission_predictor is None:
+            mission_predictor = MissionPredictor(self.instruction_server, self.map_server, self.config_server,
+                                                 self.robot_battery, duration_model=load_duration_model())
+        self.mission_predictor = mission_predictor
+        # the planners predict travel times with the duration model of the predictor, it is only fitted (or the
+        # shared instruction db copied into it) once a travel time is needed
+        self.mission_planner = MissionPlanner(self.instruction_server, self.map_server,
+                                              mission_predictor=mission_predictor)
+        self.energy_planner = EnergyPlanner(self.mission_planner, self.map_server, self.robot_battery,
+                                            self.config_server, reserve=battery_low_threshold)
+        # when set, the reactive loops also go charging whenever the look-ahead plan schedules a stop right now
+        self.energy_planning = False
+
+        if reachability is None:
+            reachability = ReachabilityTable(self.map_server, self.config_server, self.robot_battery)
+        self.reachability = reachability
+        # updated on every battery update from the last observed location of the bot, the bot goes charging after
+        # the current task once it turns False
+        self.can_reach_charging = True
+        # when set, reachability checks use the measured discharge rate instead of the static power model
+        self.use_estimated_discharge = False
+        # when set, an IG goal is cancelled as soon as the charge cannot cover the rest of the task and a station
+        self.mid_task_preemption = False
+
+        # mission trace writer, see start_trace
+        self.trace = None
+
         # robot initialization including the battery, etc
         self.init_robot()
 
@@ -52,6 +118,7 @@ class BotController:
         self.gazebo.battery_capacity = self.robot_battery.capacity
         self.gazebo.charge_rate = self.robot_battery.charge_rate
         self.gazebo.battery_voltage = self.robot_battery.battery_voltage
+        self.gazebo.charge_callbacks.append(self.check_charging_reachability)
 
     def go_without_instructions(self, target):
         """bot goes directly from start to the target using move base
@@ -73,17 +140,16 @@ class BotController:
 
         return res
 
+    @timed('bot_controller.update_speed')
     def update_speed(self, igcode):
         """updates the speed in the instruction based on the current configuration of the robot,
         note the way how configuration affect speed as a proxy in cp1"""
         current_config = self.gazebo.get_current_configuration(current_or_historical=True)
         new_speed = self.config_server.get_speed(current_config)
-        matches = re.findall('MoveAbsH\(([-+]?\d*\.\d+), ([-+]?\d*\.\d+|\d+), ([-+]?\d*\.\d+|\d+)', igcode)
         # replace the third value in MoveAbsH with the new speed value
-        igcode_updated = igcode.replace(matches[0][2], str(new_speed))
-
-        return igcode_updated
+        return replace_speed(igcode, new_speed)
 
+    @timed('bot_controller.go_instructions')
     def go_instructions(self, start, target, wait=True, active_cb=None, done_cb=None):
         """bot execute the instructions and goes from start to the target with the directions instructed by the igcode
 
@@ -92,13 +158,31 @@ class BotController:
         :param wait:
         :return:
         """
+        task = self.prepare_task(start, target)
+        if task is None:
+            return False
+        igcode, updated_igcode = task
+
+        if wait:
+            res = self.gazebo.move_bot_with_igcode(updated_igcode, active_cb=active_cb, done_cb=done_cb)
+            return res
+        else:
+            self.gazebo.send_instructions(igcode=igcode, active_cb=active_cb, done_cb=done_cb)
+            return True
+
+    def prepare_task(self, start, target):
+        """everything the bot does before the igcode of the task from start to target is sent
+
+        :return: (igcode, igcode at the speed of the current configuration), None when the task is unknown
+        """
+        memory_profile.phase('task_start')
 
         # get the yaw (direction) where the robot is headed
         w = self.instruction_server.get_start_heading(start, target)
 
         if w == -1:
-            rospy.logerr("No information for {0} to {1}".format(start, target))
-            return False
+            log.error("No information for {0} to {1}", start, target)
+            return None
 
         if self.gazebo.ig_client is None:
             self.gazebo.connect_to_ig_action_server()
@@ -112,17 +196,93 @@ class BotController:
         # update the speed to reflect the influence of configuration
         updated_igcode = self.update_speed(igcode=igcode)
 
-        if wait:
-            res = self.gazebo.move_bot_with_igcode(updated_igcode, active_cb=active_cb, done_cb=done_cb)
-            return res
+        if self.mid_task_preemption:
+            self.gazebo.preemption_check = self.preemption_check(start, target)
         else:
-            self.gazebo.send_instructions(igcode=igcode, active_cb=active_cb, done_cb=done_cb)
-            return True
+            self.gazebo.preemption_check = None
+
+        return igcode, updated_igcode
+
+    def finish_task(self, current_start, target, success, bot_state, at_waypoint_cb=None):
+        """checks the reported outcome of a task against the position of the bot and records the task
+
+        :param success: whether the ig server (or Rainbow) reported the task done
+        :param bot_state: (x, y, w, v) of the bot once the task is over
+        :return: (the entry of the task in locs, the start of the next task)
+        """
+        start = current_start
+        x, y, w, v = bot_state
+        loc_target = self.map_server.waypoint_to_coords(target)
+
+        #  check robot distance to the target, if it is not then
+        d = distance([x, y], [loc_target['x'], loc_target['y']])
+        if d > distance_threshold and success:
+            log.warn(
+                "The robot is not close enough to the expected target, so we do not count this task done!")
+            start = target
+            success = False
+        elif d <= distance_threshold and not success:
+            log.warn(
+                "Apparently the robot could accomplish the task but ig_server reported differently!")
+            start = target
+            success = True
+
+        if at_waypoint_cb is not None:
+            at_waypoint_cb(target)
+
+        loc = {"start": current_start, "target": target, "x": x, "y": y, "task_accomplished": success,
+               "dist_to_target": d}
+        self.trace_task(loc)
+
+        if success:
+            log.info("A new task ({0}->{1}) has been accomplished", current_start, target)
+            start = target
+        else:
+            log.warn("The task ({0}->{1}) has been failed", current_start, target)
+
+        return loc, start
 
-    def start(self, start, targets, active_cb=None, done_cb=None, at_waypoint_cb=None, mission_done_cb=None):
+    def needs_charging(self, start, targets):
+        """whether the bot should go charging at start before the remaining targets
+
+        :return: (whether to go charging, the station chosen by the look-ahead plan or None for the closest one)
+        """
+        station = self.charging_stop(start, targets) if self.energy_planning else None
+        if not self.can_reach_charging:
+            log.warn("The charge may no longer cover the way to a charging station")
+        return self.gazebo.is_battery_low or self.gazebo.preempted or not self.can_reach_charging or \
+            station is not None, station
+
+    def recharge(self, charging_id=None, adaptation_level=None):
+        """go to a charging station, wait until the battery is full and undock
+
+        :param charging_id: the station to charge at, the closest one when it is not given
+        :param adaptation_level: adapt at this level first when the bot can reach the station
+        :return: the station the bot is at
+        """
+        bot_state = self.gazebo.get_bot_state()
+        loc = {"x": bot_state[0], "y": bot_state[1]}
+
+        # check whether an adaptation (e.g., change of configuration) is needed
+        if adaptation_level is not None and self.can_bot_reach_charging(loc):
+            self.adapt(adaptation_level)
+
+        res, charging_id = self.go_charging(loc, charging_id)
+        while not res:
+            res, charging_id = self.go_charging(loc, charging_id)
+        while not self.is_fully_charged():
+            time.sleep(sleep_interval)
+        self.undock()
+        self.gazebo.preempted = False
+        return charging_id
+
+    def start(self, start, targets, active_cb=None, done_cb=None, at_waypoint_cb=None, mission_done_cb=None, reorder=False):
         """this is an interface for the mission sequencer"""
 
-        rospy.loginfo("Starting the mission!")
+        log.info("Starting the mission!")
+
+        if reorder:
+            targets = self.plan_mission(start, targets)
 
         if self.level == "c":
             t = Thread(target=self.go_instructions_multiple_tasks_adaptive,
@@ -140,55 +300,25 @@ class BotController:
         :param targets:
         :return:
         """
-        rospy.loginfo("Reactive robot started the mission!")
+        log.info("Reactive robot started the mission!")
 
         number_of_tasks_accomplished = 0
         locs = []
+        self.trace_mission()
 
-        for target in targets:
-            rospy.loginfo("Starting a new task to get to: {}".format(target))
+        for i, target in enumerate(targets):
+            log.info("Starting a new task to get to: {}", target)
             current_start = start
             success = self.go_instructions(current_start, target, wait=True, active_cb=active_cb, done_cb=done_cb)
 
-            x, y, w, v = self.gazebo.get_bot_state()
-            loc_target = self.map_server.waypoint_to_coords(target)
-
-            #  check robot distance to the target, if it is not then
-            d = distance([x, y], [loc_target['x'], loc_target['y']])
-            if d > distance_threshold and success:
-                rospy.logwarn(
-                    "The robot is not close enough to the expected target, so we do not count this task done!")
-                start = target
-                success = False
-            elif d <= distance_threshold and not success:
-                rospy.logwarn(
-                    "Apparently the robot could accomplish the task but ig_server reported differently!")
-                start = target
-                success = True
-
-            if at_waypoint_cb is not None:
-                at_waypoint_cb(target)
-
-            locs.append({"start": current_start, "target": target, "x": x, "y": y, "task_accomplished": success, "dist_to_target": d})
-
-            if success:
-                rospy.loginfo("A new task ({0}->{1}) has been accomplished".format(current_start, target))
-                start = target
+            loc, start = self.finish_task(current_start, target, success, self.gazebo.get_bot_state(), at_waypoint_cb)
+            locs.append(loc)
+            if loc["task_accomplished"]:
                 number_of_tasks_accomplished += 1
-            else:
-                rospy.logwarn("The task ({0}->{1}) has been failed".format(current_start, target))
-
-            if self.gazebo.is_battery_low:
-                bot_state = self.gazebo.get_bot_state()
-                loc = {"x": bot_state[0], "y": bot_state[1]}
 
-                res, charging_id = self.go_charging(loc)
-                while not res:
-                    res, charging_id = self.go_charging(loc)
-                while not self.is_fully_charged():
-                    time.sleep(sleep_interval)
-                self.undock()
-                start = charging_id
+            charge_now, charging_id = self.needs_charging(start, targets[i + 1:])
+            if charge_now:
+                start = self.recharge(charging_id)
 
         if mission_done_cb is not None:
             mission_done_cb(number_of_tasks_accomplished, locs)
@@ -203,59 +333,25 @@ class BotController:
         :return:
         """
 
-        rospy.loginfo("Reactive robot (fancy) started the mission!")
+        log.info("Reactive robot (fancy) started the mission!")
 
         number_of_tasks_accomplished = 0
         locs = []
+        self.trace_mission()
 
-        for target in targets:
-            rospy.loginfo("Starting a new task to get to: {}".format(target))
+        for i, target in enumerate(targets):
+            log.info("Starting a new task to get to: {}", target)
             current_start = start
             success = self.go_instructions(current_start, target, wait=True, active_cb=active_cb, done_cb=done_cb)
 
-            x, y, w, v = self.gazebo.get_bot_state()
-            loc_target = self.map_server.waypoint_to_coords(target)
-
-            #  check robot distance to the target, if it is not then
-            d = distance([x, y], [loc_target['x'], loc_target['y']])
-            if d > distance_threshold and success:
-                rospy.logwarn(
-                    "The robot is not close enough to the expected target, so we do not count this task done!")
-                start = target
-                success = False
-            elif d <= distance_threshold and not success:
-                rospy.logwarn(
-                    "Apparently the robot could accomplish the task but ig_server reported differently!")
-                start = target
-                success = True
-
-            if at_waypoint_cb is not None:
-                at_waypoint_cb(target)
-
-            locs.append({"start": current_start, "target": target, "x": x, "y": y, "task_accomplished": success, "dist_to_target": d})
-
-            if success:
-                rospy.loginfo("A new task ({0}->{1}) has been accomplished".format(current_start, target))
-                start = target
+            loc, start = self.finish_task(current_start, target, success, self.gazebo.get_bot_state(), at_waypoint_cb)
+            locs.append(loc)
+            if loc["task_accomplished"]:
                 number_of_tasks_accomplished += 1
-            else:
-                rospy.logwarn("The task ({0}->{1}) has been failed".format(current_start, target))
-
-            if self.gazebo.is_battery_low:
-                bot_state = self.gazebo.get_bot_state()
-                loc = {"x": bot_state[0], "y": bot_state[1]}
 
-                # check whether an adaptation (e.g., change of configuration) is needed
-                if self.can_bot_reach_charging(loc):
-                    self.adapt(AdaptationLevel.BASELINE_C)
-
-                res, charging_id = self.go_charging(loc)
-                while not res:
-                    res, charging_id = self.go_charging(loc)
-                while not self.is_fully_charged():
-                    time.sleep(sleep_interval)
-                self.undock()
-                start = charging_id
+            charge_now, charging_id = self.needs_charging(start, targets[i + 1:])
+            if charge_now:
+                start = self.recharge(charging_id, adaptation_level=AdaptationLevel.BASELINE_C)
 
         if mission_done_cb is not None:
             mission_done_cb(number_of_tasks_accomplished, locs)
@@ -265,65 +361,79 @@ class BotController:
     def go_instructions_multiple_tasks_adaptive(self, start, targets, active_cb=None, done_cb=None, at_waypoint_cb=None, mission_done_cb=None):
         """this is for baseline c where the adaptation will be taken care of with Rainbow"""
 
-        rospy.loginfo("Adaptive robot started the mission!")
+        log.info("Adaptive robot started the mission!")
 
         number_of_tasks_accomplished = 0
         locs = []
+        self.trace_mission()
 
         for target in targets:
-            rospy.loginfo("Starting a new task to get to: {}".format(target))
+            log.info("Starting a new task to get to: {}", target)
             current_start = start
             self.update_current_target_waypoint_and_resetting_previous(current_waypoint=target)
             self.go_instructions(current_start, target, wait=False, active_cb=active_cb, done_cb=done_cb)
 
             success = self.wait_until_rainbow_is_done()
 
-            x, y, w, v = self.gazebo.get_bot_state()
-            loc_target = self.map_server.waypoint_to_coords(target)
-
-            #  check robot distance to the target, if it is not then
-            d = distance([x, y], [loc_target['x'], loc_target['y']])
-            if d > distance_threshold and success:
-                rospy.logwarn(
-                    "The robot is not close enough to the expected target, so we do not count this task done!")
-                start = target
-                success = False
-            elif d <= distance_threshold and not success:
-                rospy.logwarn(
-                    "Apparently the robot could accomplish the task but ig_server reported differently!")
-                start = target
-                success = True
-
-            if at_waypoint_cb is not None:
-                at_waypoint_cb(target)
-
-            locs.append({"start": current_start, "target": target, "x": x, "y": y, "task_accomplished": success,
-                         "dist_to_target": d})
-
-            if success:
-                rospy.loginfo("The task ({0}->{1}) has been accomplished".format(current_start, target))
-                start = target
+            loc, start = self.finish_task(current_start, target, success, self.gazebo.get_bot_state(), at_waypoint_cb)
+            locs.append(loc)
+            if loc["task_accomplished"]:
                 number_of_tasks_accomplished += 1
-            else:
-                rospy.logwarn("The task ({0}->{1}) has been failed".format(current_start, target))
 
         if mission_done_cb is not None:
             mission_done_cb(number_of_tasks_accomplished, locs)
 
         return number_of_tasks_accomplished, locs
 
+    def start_trace(self, trace_dir):
+        """stream the tasks, battery telemetry and observations of the following missions into a trace directory"""
+        self.trace = MissionTraceWriter(trace_dir, waypoint_ids=[wp['node-id'] for wp in self.map_server.waypoint_list])
+        self.gazebo.charge_callbacks.append(self.trace_telemetry)
+        self.gazebo.observation_cb = self.trace.record_observation
+
+    def stop_trace(self):
+        if self.trace is None:
+            return
+        self.gazebo.charge_callbacks.remove(self.trace_telemetry)
+        self.gazebo.observation_cb = None
+        self.trace.close()
+        self.trace = None
+
+    def trace_mission(self):
+        """the following tasks belong to a new mission of the trace"""
+        if self.trace is not None:
+            self.trace.begin_mission()
+
+    def trace_task(self, loc):
+        if self.trace is not None:
+            self.trace.record_task(loc["start"], loc["target"], loc["x"], loc["y"], loc["task_accomplished"],
+                                   loc["dist_to_target"], timestamp=rospy.get_time())
+
+    def trace_telemetry(self, charge):
+        if self.trace is not None:
+            timestamp, charge, charging, config_id = self.gazebo.telemetry.latest()
+            self.trace.record_telemetry(timestamp, charge, charging, config_id)
+
+    def rainbow_status(self):
+        """True or False once Rainbow reported the current task DONE or FAILED, None while it is not done"""
+        current_task_file = open(current_task_finished, "r")
+        res = current_task_file.read().replace('\n', '')
+        current_task_file.close()
+        if res == "DONE":
+            self.gazebo.observe('rainbow', 1)
+            return True
+        elif res == "FAILED":
+            self.gazebo.observe('rainbow', 0)
+            return False
+        return None
+
     def wait_until_rainbow_is_done(self):
         """Rainbow should indicate when it thinks it is done with the task"""
         while True:
-            current_task_file = open(current_task_finished, "r")
-            res = current_task_file.read().replace('\n', '')
-            current_task_file.close()
-            if res == "DONE":
-                return True
-            elif res == "FAILED":
-                return False
-            else:
-                time.sleep(sleep_interval)
+            res = self.rainbow_status()
+            if res is not None:
+                return res
+            time.sleep(sleep_interval)
 
     def update_current_target_waypoint_and_resetting_previous(self, current_waypoint):
         """update a shared file to inform rainbow about current waypoint"""
@@ -333,6 +443,8 @@ class BotController:
 
     def adapt(self, adaptation_level):
         """adaptation factory"""
+        memory_profile.phase('adaptation')
+        self.gazebo.observe('adapt', adaptation_level.value)
         if adaptation_level == AdaptationLevel.BASELINE_C:
             self.change_config_to_conservative()
 
@@ -340,49 +452,65 @@ class BotController:
         conservative_config = self.config_server.get_a_conservative_config()
         self.gazebo.set_current_configuration(config_id=conservative_config)
 
-    def go_charging(self, current_loc):
-        """bot goes to the closest charging station from the current waypoint it is on"""
-        rospy.logwarn("The bot is now heading to the nearest charging station")
-        current_waypoint = self.map_server.coords_to_waypoint(current_loc)['id']
-        path_to_charging = self.map_server.closest_charging_station(current_waypoint)
-        charging_id = path_to_charging[-1]
+    def go_charging(self, current_loc, charging_id=None):
+        """bot goes to the given charging station, by default to the closest one from the current waypoint it is on"""
+        charging_id = self.charging_station(current_loc, charging_id)
         res = self.go_without_instructions(charging_id)
         if res:
             self.dock()
         else:
-            rospy.logwarn("The instruction to go to the nearest charging station was failed")
+            log.warn("The instruction to go to the nearest charging station was failed")
         return res, charging_id
 
+    def charging_station(self, current_loc, charging_id=None):
+        """the charging station the bot heads to from current_loc, the closest one unless charging_id is given"""
+        memory_profile.phase('charging')
+        if charging_id is None:
+            log.warn("The bot is now heading to the nearest charging station")
+            current_waypoint = self.map_server.coords_to_waypoint(current_loc)['id']
+            path_to_charging = self.map_server.closest_charging_station(current_waypoint)
+            charging_id = path_to_charging[-1]
+        else:
+            log.warn("The bot is now heading to the charging station {0}", charging_id)
+        self.gazebo.observe('go_charging', self.map_server.waypoint_idx[charging_id])
+        return charging_id
+
     def is_fully_charged(self):
         if self.gazebo.battery_charge == self.gazebo.battery_capacity:
-            rospy.loginfo("Battery is fully charged.")
+            log.info("Battery is fully charged.")
             return True
         else:
             return False
 
     def dock(self):
         if self.gazebo.is_charging:
-            rospy.logwarn("The bot is currently docked")
+            log.warn("The bot is currently docked")
             return False
         else:
-            rospy.loginfo("The bot is docked and start charging")
+            log.info("The bot is docked and start charging")
             self.gazebo.set_charging(1)
             return True
 
     def undock(self):
         if self.gazebo.is_charging:
             self.gazebo.set_charging(0)
-            rospy.loginfo("The bot is now undocked")
+            log.info("The bot is now undocked")
             return True
         else:
-            rospy.loginfo("The bot is not docked")
+            log.info("The bot is not docked")
             return False
 
-    def predict_mission_time(self, start, targets):
+    def predict_mission_time(self, start, targets, config_id=None):
         """predict mission time in baseline A and B, a mission is comprised on several tasks
 
+        :param config_id: configuration the mission is driven in, the times of the instruction db are used as they are
+        when it is not given
         :return:
         """
+        if config_id is not None:
+            duration, energy = self.predict_missions([[start] + list(targets)], [config_id])
+            return float(duration[0, 0])
+
         mission_time = 0
         for target in targets:
             current_start = start
@@ -391,29 +519,84 @@ class BotController:
 
         return mission_time
 
+    def predict_missions(self, missions, config_ids):
+        """predicted time (s) and energy (Ah) of every mission under every configuration, see MissionPredictor
+
+        :param missions: lists of waypoint ids starting with the start, or an array already encoded by the predictor
+        :return: (time, energy), both (len(missions), len(config_ids)) arrays
+        """
+        if not hasattr(missions, 'dtype'):
+            missions = self.mission_predictor.encode(missions)
+        return self.mission_predictor.predict(missions, config_ids)
+
+    def plan_mission(self, start, targets):
+        """reorder the targets (when the mission allows any order) to minimise the predicted mission time"""
+        self.mission_planner.speed = self.config_server.get_speed(self.gazebo.current_config)
+        planned_targets = self.mission_planner.plan(start, targets)
+        log.info("The mission targets are reordered to {0}, predicted mission time: {1}",
+                 planned_targets, self.mission_planner.predict(start, planned_targets))
+        return planned_targets
+
+    def plan_charging_stops(self, start, targets):
+        """simulate the charge over the remaining targets and schedule the charging stops that minimise mission time
+
+        :return: (predicted mission time, list of (k, station) meaning charge after reaching [start] + targets at k)
+        """
+        self.mission_planner.speed = self.config_server.get_speed(self.gazebo.current_config)
+        return self.energy_planner.plan(start, targets, self.gazebo.battery_charge, self.gazebo.current_config)
+
+    def charging_stop(self, start, targets):
+        """the station where the look-ahead plan for the remaining targets charges first when that is right now
+
+        :return: the station, None when the plan carries on, there are no targets left or the charge is not known yet
+        """
+        if len(targets) == 0:
+            return None
+        self.mission_planner.speed = self.config_server.get_speed(self.gazebo.current_config)
+        return self.energy_planner.charging_stop(start, targets, self.gazebo.battery_charge,
+                                                 self.gazebo.current_config)
+
     def update_bot_configuration(self):
         """updates the gazebo bot configuration and the power consumption in one place"""
         pass
 
     def can_bot_reach_charging(self, current_loc):
         """use the power model to check whether the robot low on battery can reach the closest charging station"""
-        charge_level = self.gazebo.battery_charge
-        power_load = self.config_server.get_power_load(self.gazebo.current_config)
-        dischagre_time = self.robot_battery.time_to_fully_discharge(charge_level, power_load)
-
-        current_speed = self.config_server.get_speed(self.gazebo.current_config)
-        current_waypoint = self.map_server.coords_to_waypoint(current_loc)['id']
-        path_to_charging = self.map_server.closest_charging_station(current_waypoint)
-
-        next_loc = self.map_server.waypoint_to_coords(path_to_charging[0])
-        dist_to_charging = distance([current_loc['x'], current_loc['y']], [next_loc['x'], next_loc['y']])
-        for waypoint in path_to_charging[1:-1]:
-            next_loc = self.map_server.waypoint_to_coords(waypoint)
-            dist_to_charging += distance([current_loc['x'], current_loc['y']], [next_loc['x'], next_loc['y']])
-            current_loc = next_loc
-        travel_time_to_charging = dist_to_charging / current_speed
-
-        if dischagre_time >= travel_time_to_charging:
-            return True
-        else:
-            return False
+        return self.reachability.can_reach(current_loc, self.gazebo.battery_charge, self.gazebo.current_config,
+                                           rate=self.estimated_discharge_rate())
+
+    def check_charging_reachability(self, charge):
+        """battery update hook, checks reachability from the last observed location of the bot"""
+        if self.gazebo.last_loc is None:
+            return
+        self.can_reach_charging = self.reachability.can_reach(self.gazebo.last_loc, charge, self.gazebo.current_config,
+                                                              rate=self.estimated_discharge_rate())
+
+    def preemption_check(self, start, target):
+        """returns the check installed on the gazebo interface while the task start->target is running
+
+        the check is called with the charge on every battery update and feedback of the goal and returns True when
+        the charge cannot cover the predicted rest of the task plus the way from the target to a station
+        """
+        config_id = self.gazebo.current_config
+        self.mission_planner.speed = self.config_server.get_speed(config_id)
+        duration = self.mission_planner.travel_time(start, target)
+        to_station = self.reachability.required(target, config_id)
+        model_rate = self.robot_battery.discharge_rate(self.config_server.get_power_load(config_id))
+        started = rospy.get_time()
+
+        def check(charge):
+            remaining = max(duration - (rospy.get_time() - started), 0.0)
+            rate = self.estimated_discharge_rate()
+            if rate is None:
+                rate = model_rate
+            return charge < remaining * rate + to_station
+
+        return check
+
+    def estimated_discharge_rate(self):
+        """pessimistic measured discharge rate (Ah/s), None when the static power model should be used"""
+        estimator = self.gazebo.discharge_estimator
+        if not self.use_estimated_discharge or not estimator.ready:
+            return None
+        return estimator.rate + discharge_rate_confidence * estimator.rate_std
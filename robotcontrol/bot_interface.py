@@ -3,6 +3,7 @@
 """robot lop-level controller"""
 import math
 import json
+import time
 from threading import Lock
 import os
 
@@ -15,7 +16,11 @@ from geometry_msgs.msg import *
 from gazebo_msgs.msg import *
 from gazebo_msgs.srv import *
 import actionlib
-from robotcontrol.transformations import euler_from_quaternion, quaternion_from_euler
+from robotcontrol.planar_pose import yaw_from_quaternion, quaternion_from_yaw, identity_quaternion
+from robotcontrol.battery_telemetry import BatteryTelemetry
+from robotcontrol.discharge_estimator import DischargeEstimator
+from robotcontrol.instrumentation import timed, span, record
+from robotcontrol import log
 import ig_action_msgs.msg
 
 # importing battery services
@@ -26,8 +31,12 @@ from brass_gazebo_config_manager.srv import *
 # parameters and global variables
 ros_node = '/battery_monitor_client'
 model_name = '/battery_demo_model'
+# the name of the robot model in gazebo
+robot_model = 'mobile_base'
 map_name = 'map'
 max_waiting_time = 1200
+# number of battery updates kept in the telemetry ring buffer
+telemetry_capacity = 4096
 
 # the threshold below which the bot will go to the charging station
 battery_low_threshold = 0.10
@@ -37,6 +46,16 @@ conf_file = '../conf/conf.json'
 
 # This is the model for the obstacle
 obstacle = os.path.expanduser('~/catkin_ws/src/cp1_base/models/box')
+_obstacle_xml = None
+
+
+def obstacle_xml():
+    """the sdf of the obstacle model, read once and shared by all interfaces"""
+    global _obstacle_xml
+    if _obstacle_xml is None:
+        with open(obstacle + '.sdf') as obstacle_xml_file:
+            _obstacle_xml = obstacle_xml_file.read()
+    return _obstacle_xml
 
 
 # Here we manage the world, bot, and control interface
@@ -59,7 +78,13 @@ def status_translator(status):
 
 class ControlInterface:
 
-    def __init__(self, default_config):
+    def __init__(self, default_config, namespace='', robot_model=robot_model):
+        """
+        :param namespace: ros namespace of the robot (e.g. /robot1), its topics, actions and battery services live in it
+        :param robot_model: the name of the robot model in gazebo
+        """
+        self.namespace = namespace
+        self.robot_model = robot_model
 
         # standard Gazebo services
         self.get_model_state = rospy.ServiceProxy('/gazebo/get_model_state', GetModelState)
@@ -69,15 +94,25 @@ class ControlInterface:
         self.delete_model = rospy.ServiceProxy('/gazebo/delete_model', DeleteModel)
 
         # Battery plugin Gazebo services
-        self.set_charging_srv = rospy.ServiceProxy(ros_node + model_name + '/set_charging', SetCharging)
-        self.set_charge_rate_srv = rospy.ServiceProxy(ros_node + model_name + '/set_charge_rate', SetChargingRate)
-        self.set_charge_srv = rospy.ServiceProxy(ros_node + model_name + '/set_charge', SetCharge)
-        self.set_powerload_srv = rospy.ServiceProxy(ros_node + model_name + '/set_power_load', SetLoad)
-        self.get_configuration_srv = rospy.ServiceProxy(ros_node + model_name + '/get_robot_configuration', GetConfig)
-        self.set_configuration_srv = rospy.ServiceProxy(ros_node + model_name + '/set_robot_configuration', SetConfig)
+        self.set_charging_srv = rospy.ServiceProxy(self.resolve(ros_node + model_name + '/set_charging'), SetCharging)
+        self.set_charge_rate_srv = rospy.ServiceProxy(self.resolve(ros_node + model_name + '/set_charge_rate'), SetChargingRate)
+        self.set_charge_srv = rospy.ServiceProxy(self.resolve(ros_node + model_name + '/set_charge'), SetCharge)
+        self.set_powerload_srv = rospy.ServiceProxy(self.resolve(ros_node + model_name + '/set_power_load'), SetLoad)
+        self.get_configuration_srv = rospy.ServiceProxy(self.resolve(ros_node + model_name + '/get_robot_configuration'), GetConfig)
+        self.set_configuration_srv = rospy.ServiceProxy(self.resolve(ros_node + model_name + '/set_robot_configuration'), SetConfig)
 
         # AMCL topic
-        self.amcl = rospy.Publisher('initialpose', PoseWithCovarianceStamped, queue_size=10, latch=True)
+        self.amcl = rospy.Publisher(self.resolve('initialpose'), PoseWithCovarianceStamped, queue_size=10, latch=True)
+
+        self.obs_xml = obstacle_xml()
+
+        self.init_state(default_config, namespace=namespace, robot_model=robot_model)
+        self.connect_to_gazebo(timeout=30)
+
+    def init_state(self, default_config, namespace='', robot_model=robot_model):
+        """the state of the interface that does not depend on ros, shared with the offline replay"""
+        self.namespace = namespace
+        self.robot_model = robot_model
 
         self.battery_charge = -1
         self.battery_capacity = 1.2009
@@ -91,18 +126,38 @@ class ControlInterface:
 
         self.bot_conf = None
 
-        obstacle_xml_file = open(obstacle + '.sdf')
-        self.obs_xml = obstacle_xml_file.read()
-
         self.obstacles = []
         self.obstacle_seq = 0
         self.lock = Lock()
 
         self.battery_previous_update = self.battery_charge
+        # recent (timestamp, charge, charging, config id) history of the battery
+        self.telemetry = BatteryTelemetry(capacity=telemetry_capacity)
+        self.discharge_estimator = DischargeEstimator()
+        # functions called with the new charge on every battery update
+        self.charge_callbacks = []
+        # the last location observed with get_bot_state
+        self.last_loc = None
+        # called as observation_cb(kind, value, x, y, yaw, timestamp) with everything the controller observes
+        self.observation_cb = None
+
+        # called with the charge while an IG goal is active, returns True when the goal should be preempted
+        self.preemption_check = None
+        self.goal_active = False
+        self.preempted = False
+        # seconds from the battery update that triggered the last preemption to the cancel request and to the stop
+        self.preemption_started = None
+        self.preemption_latency = None
+        self.preemption_stop_latency = None
 
         # default configuration is zero id
         self.current_config = default_config
-        self.connect_to_gazebo(timeout=30)
+
+    def resolve(self, name):
+        """the name of a topic, action or service of this robot inside its namespace"""
+        if not self.namespace:
+            return name
+        return self.namespace.rstrip('/') + '/' + name.lstrip('/')
 
     def connect_to_gazebo(self, timeout):
 
@@ -126,15 +181,15 @@ class ControlInterface:
 
     def connect_to_navigation_server(self):
 
-        self.movebase_client = actionlib.SimpleActionClient("move_base", MoveBaseAction)
+        self.movebase_client = actionlib.SimpleActionClient(self.resolve("move_base"), MoveBaseAction)
 
         while not self.movebase_client.wait_for_server(rospy.Duration.from_sec(max_waiting_time)):
-            rospy.logwarn("Waiting for the navigation server")
+            log.warn("Waiting for the navigation server")
 
-        rospy.loginfo("Successfully connected to the action server")
+        log.info("Successfully connected to the action server")
         return True
 
-    def move_to_point(self, x, y):
+    def movebase_goal(self, x, y):
 
         goal = MoveBaseGoal()
 
@@ -148,26 +203,33 @@ class ControlInterface:
         goal.target_pose.pose.orientation.z = 0.0
         goal.target_pose.pose.orientation.w = 1.0
 
+        return goal
+
+    def move_to_point(self, x, y):
+
+        goal = self.movebase_goal(x, y)
         self.movebase_client.send_goal(goal)
         success = self.movebase_client.wait_for_result(rospy.Duration.from_sec(max_waiting_time))
 
         state = self.movebase_client.get_state()
 
         if success and state == GoalStatus.SUCCEEDED:
-            rospy.loginfo("Reached the destination")
+            log.info("Reached the destination")
+            self.observe('movebase_result', 1)
             return True
         else:
-            rospy.logwarn("Could not reached the destination")
+            log.warn("Could not reached the destination")
+            self.observe('movebase_result', 0)
             return False
 
     def connect_to_ig_action_server(self):
 
-        self.ig_client = actionlib.SimpleActionClient("ig_action_server", ig_action_msgs.msg.InstructionGraphAction)
+        self.ig_client = actionlib.SimpleActionClient(self.resolve("ig_action_server"), ig_action_msgs.msg.InstructionGraphAction)
 
         while not self.ig_client.wait_for_server(rospy.Duration.from_sec(max_waiting_time)):
-            rospy.logwarn("Waiting for the ig_action_server")
+            log.warn("Waiting for the ig_action_server")
 
-        rospy.loginfo("Successfully connected to the ig_action_server")
+        log.info("Successfully connected to the ig_action_server")
         return True
 
     def move_bot_with_ig(self, ig_file):
@@ -180,45 +242,64 @@ class ControlInterface:
 
             state = self.ig_client.get_state()
             if success and state == GoalStatus.SUCCEEDED:
-                rospy.loginfo("Successfully executed the instructions and reached the destination")
+                log.info("Successfully executed the instructions and reached the destination")
                 return True
             else:
-                rospy.logwarn("Could not execute the instructions")
+                log.warn("Could not execute the instructions")
                 return False
 
+    @timed('control_interface.move_bot_with_igcode')
     def move_bot_with_igcode(self, igcode, active_cb=None, done_cb=None):
 
         goal = ig_action_msgs.msg.InstructionGraphGoal(order=igcode)
-        self.ig_client.send_goal(goal=goal, done_cb=done_cb, active_cb=active_cb)
-        rospy.loginfo("Instructions was sent to the ig_server")
-        success = self.ig_client.wait_for_result(rospy.Duration.from_sec(max_waiting_time))
+        self.preempted = False
+        self.goal_active = True
+        self.ig_client.send_goal(goal=goal, done_cb=done_cb, active_cb=active_cb, feedback_cb=self.feedback_cb)
+        log.info("Instructions was sent to the ig_server")
+        with span('control_interface.ig_wait_for_result'):
+            success = self.ig_client.wait_for_result(rospy.Duration.from_sec(max_waiting_time))
+        self.goal_active = False
 
         state = self.ig_client.get_state()
 
+        if self.preempted:
+            self.preemption_stop_latency = time.time() - self.preemption_started
+            record('control_interface.preemption_stop_latency', self.preemption_stop_latency)
+            log.warn("The task was preempted for charging, the goal stopped {0:.3f}s after the battery update",
+                     self.preemption_stop_latency)
+
         if success and state == GoalStatus.SUCCEEDED:
-            rospy.loginfo("Successfully executed the instructions and reached the destination")
+            log.info("Successfully executed the instructions and reached the destination")
+            self.observe('ig_result', 1)
             return True
         else:
-            rospy.logwarn("Could not execute the instructions")
+            log.warn("Could not execute the instructions")
+            self.observe('ig_result', 0)
             return False
 
     def send_instructions(self, igcode, active_cb=None, done_cb=None):
 
-        rospy.loginfo("Received some instructions to execute")
+        log.info("Received some instructions to execute")
         goal = ig_action_msgs.msg.InstructionGraphGoal(order=igcode)
-        self.ig_client.send_goal(goal=goal, done_cb=done_cb, active_cb=active_cb)
+
+        def goal_done_cb(status, result):
+            self.goal_active = False
+            if done_cb is not None:
+                done_cb(status, result)
+
+        self.preempted = False
+        self.goal_active = True
+        self.ig_client.send_goal(goal=goal, done_cb=goal_done_cb, active_cb=active_cb, feedback_cb=self.feedback_cb)
 
     def set_bot_position(self, x, y, w):
 
         try:
-            tp = self.get_model_state('mobile_base', '')
+            tp = self.get_model_state(self.robot_model, '')
 
             tp.pose.position.x = x
             tp.pose.position.y = y
-            quat = (tp.pose.orientation.x, tp.pose.orientation.y, tp.pose.orientation.z, tp.pose.orientation.w)
-            (roll, pitch, yaw) = euler_from_quaternion(quat)
-            yaw = w
-            quat = quaternion_from_euler(roll, pitch, yaw)
+            # the floor is flat, the orientation is the rotation by w about z
+            quat = quaternion_from_yaw(w)
 
             tp.pose.orientation.x = quat[0]
             tp.pose.orientation.y = quat[1]
@@ -226,7 +307,7 @@ class ControlInterface:
             tp.pose.orientation.w = quat[3]
 
             ms = ModelState()
-            ms.model_name = "mobile_base"
+            ms.model_name = self.robot_model
             ms.pose = tp.pose
             ms.twist = tp.twist
 
@@ -244,35 +325,41 @@ class ControlInterface:
                 ip.pose.pose.orientation.z = tp.pose.orientation.z
                 ip.pose.pose.orientation.w = tp.pose.orientation.w
                 self.amcl.publish(ip)
-                rospy.loginfo("The bot is positioned in the new place at ({0}, {1})".format(x, y))
+                log.info("The bot is positioned in the new place at ({0}, {1})", x, y)
                 return True
             else:
-                rospy.logerr("Error occurred putting the bot in the position")
+                log.error("Error occurred putting the bot in the position")
                 return False
 
         except rospy.ServiceException as e:
-            rospy.logerr("Could not set the position of the bot")
-            rospy.logerr(e.message)
+            log.error("Could not set the position of the bot")
+            log.error("{0}", e)
 
+    @timed('control_interface.get_bot_state')
     def get_bot_state(self):
 
         try:
-            rospy.loginfo("A query to observe the current state of the robot has been issued")
-            tp = self.get_model_state('mobile_base', '')
-            quat = (tp.pose.orientation.x, tp.pose.orientation.y, tp.pose.orientation.z, tp.pose.orientation.w)
-            (roll, pitch, yaw) = euler_from_quaternion(quat)
+            log.info("A query to observe the current state of the robot has been issued")
+            with span('control_interface.get_model_state'):
+                tp = self.get_model_state(self.robot_model, '')
+            orientation = tp.pose.orientation
+            yaw = yaw_from_quaternion(orientation.x, orientation.y, orientation.z, orientation.w)
             v = math.sqrt(tp.twist.linear.x**2 + tp.twist.linear.y**2)
-            rospy.loginfo("The robot is at: x={0}, y={1}, yaw={2}, v={3}".format(tp.pose.position.x, tp.pose.position.y, yaw, v))
+            log.info("The robot is at: x={0}, y={1}, yaw={2}, v={3}", tp.pose.position.x, tp.pose.position.y, yaw, v)
+            self.last_loc = {"x": tp.pose.position.x, "y": tp.pose.position.y}
+            self.observe('pose', v, tp.pose.position.x, tp.pose.position.y, yaw)
             return tp.pose.position.x, tp.pose.position.y, yaw, v
 
         except rospy.ServiceException as se:
-            rospy.logerr("Error happened while getting bot position: %s", se)
+            log.error("Error happened while getting bot position: {0}", se)
             return None, None, None, None
 
+    @timed('control_interface.get_current_configuration')
     def get_current_configuration(self, current_or_historical):
         res = self.get_configuration_srv(current_or_historical)
         self.current_config = res.result
-        rospy.loginfo("New configuration id of the robot is: {0}".format(self.current_config))
+        log.info("New configuration id of the robot is: {0}", self.current_config)
+        self.observe('config', self.current_config)
         return self.current_config
 
     def set_current_configuration(self, config_id):
@@ -281,6 +368,11 @@ class ControlInterface:
             self.current_config = config_id
         return res
 
+    def observe(self, kind, value=0.0, x=0.0, y=0.0, yaw=0.0):
+        """hands an observation or decision of the controller to observation_cb, e.g. for recording a trace"""
+        if self.observation_cb is not None:
+            self.observation_cb(kind, value, x, y, yaw, timestamp=rospy.get_time())
+
     def set_charging(self, charging):
         self.is_charging = charging
         return self.set_charging_srv(charging)
@@ -295,7 +387,13 @@ class ControlInterface:
         return self.set_charge_rate_srv(charge_rate)
 
     def get_charge(self, msg):
-        self.battery_charge = msg.data
+        self.update_charge(msg.data, rospy.get_time())
+
+    def update_charge(self, charge, timestamp):
+        received = time.time()
+        self.battery_charge = charge
+        self.telemetry.append(timestamp, self.battery_charge, self.is_charging, self.current_config)
+        self.discharge_estimator.update(timestamp, self.battery_charge, charging=self.is_charging)
         #  determine whether the battery is low or not
         if self.battery_charge < battery_low_threshold * self.battery_capacity:
             self.is_battery_low = True
@@ -303,50 +401,69 @@ class ControlInterface:
             self.is_battery_low = False
 
         if abs(self.battery_charge - self.battery_previous_update) > self.battery_capacity*0.01:
-            rospy.loginfo("Battery charge: {0}Ah".format(self.battery_charge))
+            log.info("Battery charge: {0}Ah", self.battery_charge)
             if self.is_battery_low:
-                rospy.logwarn("Battery level is low")
+                log.warn("Battery level is low")
             self.battery_previous_update = self.battery_charge
 
+        for charge_cb in self.charge_callbacks:
+            charge_cb(self.battery_charge)
+
+        if self.goal_active:
+            self.check_preemption(received)
+
     def monitor_battery(self):
-        rospy.Subscriber("/mobile_base/commands/charge_level", Float64, self.get_charge)
+        rospy.Subscriber(self.resolve("/mobile_base/commands/charge_level"), Float64, self.get_charge)
         rospy.spin()
 
     def track_battery_charge(self):
         """starts monitoring battery and update battery_charge"""
         # rospy.init_node("battery_monitor_client")
-        rospy.Subscriber("/mobile_base/commands/charge_level", Float64, self.get_charge)
+        rospy.Subscriber(self.resolve("/mobile_base/commands/charge_level"), Float64, self.get_charge)
         return self.get_charge
 
     def active_cb(self):
-        rospy.loginfo("The issued plan is active!")
+        log.info("The issued plan is active!")
 
     def done_cb(self, status, result):
         # TODO: check this callback to see whether we are getting the right status
         if status == GoalStatus.SUCCEEDED:
-            rospy.loginfo("done_cb: Task succeeded!")
+            log.info("done_cb: Task succeeded!")
             # emulating rainbow, will need to remove later
             # subprocess.call("current-task-finished.sh 1", shell=True)
         else:
-            rospy.logwarn("done_cb: Unhandled Action response: {0}".format(status_translator(status)))
+            log.warn("done_cb: Unhandled Action response: {0}", status_translator(status))
             # subprocess.call("current-task-finished.sh 0", shell=True)
 
     def feedback_cb(self, feedback):
-        pass
         # first get the latest charge and then determine whether the bot should abort the task
-        # if self.battery_charge < battery_low_threshold * self.battery_capacity:
-        #     # self.ig_client.cancel_goal()
-        #     self.is_battery_low = True
-        #     rospy.logwarn("Battery level is low and the goal has been cancelled to send the robot to charge station")
-        # else:
-        #     self.is_battery_low = False
-        #     rospy.loginfo("Battery level is OK")
+        if self.goal_active:
+            self.check_preemption()
+
+    def check_preemption(self, started=None):
+        """cancel the active IG goal when preemption_check says the charge cannot cover the rest of the route"""
+        if started is None:
+            started = time.time()
+        if self.preemption_check is None or self.preempted:
+            return False
+        if not self.preemption_check(self.battery_charge):
+            return False
+
+        self.ig_client.cancel_goal()
+        self.preempted = True
+        self.preemption_started = started
+        self.preemption_latency = time.time() - started
+        record('control_interface.preemption_latency', self.preemption_latency)
+        log.warn("Battery charge {0}Ah cannot cover the rest of the route, the goal has been cancelled "
+                 "to send the robot to charge station ({1:.6f}s after the update)",
+                 self.battery_charge, self.preemption_latency)
+        return True
 
     def place_obstacle(self, x, y):
         """similar to phase 1"""
 
         pose = Pose()
-        zero_q = quaternion_from_euler(0, 0, 0)
+        zero_q = identity_quaternion
         pose.position.x = x
         pose.position.y = y
         pose.position.z = 0
@@ -371,10 +488,10 @@ class ControlInterface:
                     self.obstacles.append(obstacle_name)
                 return obstacle_name
             else:
-                rospy.logerr("Could not place obstacle. Message: {0}".format(res.status_message))
+                log.error("Could not place obstacle. Message: {0}", res.status_message)
                 return None
         except rospy.ServiceException as e:
-            rospy.logerr("Could not place obstacle. Message {0}".format(e))
+            log.error("Could not place obstacle. Message {0}", e)
             return None
 
     def remove_obstacle(self, obstacle_name, check=True):
@@ -382,7 +499,7 @@ class ControlInterface:
 
         with self.lock:
             if check and obstacle_name not in self.obstacles:
-                rospy.logerr('The obstacle could not find in the world: {0}'.format(obstacle_name))
+                log.error('The obstacle could not find in the world: {0}', obstacle_name)
                 return False
 
         req = DeleteModelRequest()
@@ -397,8 +514,8 @@ class ControlInterface:
 
                 return True
             else:
-                rospy.logerr("Could not remove obstacle. Message: {0}".format(res.status_message))
+                log.error("Could not remove obstacle. Message: {0}", res.status_message)
                 return False
         except rospy.ServiceException as e:
-            rospy.logerr("Could not place obstacle. Message {0}".format(e))
+            log.error("Could not place obstacle. Message {0}", e)
             return False
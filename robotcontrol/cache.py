@@ -0,0 +1,182 @@
+#! /usr/bin/env python
+
+"""warm-start cache of the parsed databases
+
+every loader stores its derived form under a key made of the hash of the source file content, the loader kind
+and its format version, so an edited file or a changed loader never reads a stale entry. Entries are written
+atomically and the least recently used ones are evicted once the directory grows past max_size.
+
+the cache is off unless ROBOTCONTROL_CACHE=1 is set in the environment, ROBOTCONTROL_CACHE_DIR moves it from
+~/.cache/robotcontrol
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+
+# the cache is only used when enabled, nothing is written to cache_dir otherwise
+enabled = os.environ.get('ROBOTCONTROL_CACHE', '0') not in ('', '0')
+cache_dir = os.path.expanduser(os.environ.get('ROBOTCONTROL_CACHE_DIR', '~/.cache/robotcontrol'))
+# bytes kept in the cache directory before the least recently used entries are evicted
+max_size = 64 * 1024 * 1024
+
+suffix = '.pickle'
+# left in place of an entry larger than max_size, so that it is not pickled again on every start
+oversized_suffix = '.oversized'
+
+
+def content_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def entry_path(kind, source_file, version=1, extra=''):
+    key = '{0}:{1}:{2}:{3}'.format(kind, version, extra, content_hash(source_file))
+    return os.path.join(cache_dir, '{0}-{1}{2}'.format(kind, hashlib.sha1(key.encode()).hexdigest(), suffix))
+
+
+def load(kind, source_file, build, version=1, extra=''):
+    """the derived form of source_file, built with build() and stored when it is not in the cache
+
+    :param kind: name of the loader, e.g. map
+    :param version: bumped whenever the derived form of the loader changes
+    :param extra: anything besides the file content the derived form depends on
+    """
+    if not enabled:
+        return build()
+
+    path = entry_path(kind, source_file, version=version, extra=extra)
+    try:
+        with open(path, 'rb') as entry:
+            value = pickle.load(entry)
+        # the modification time orders the entries for eviction
+        os.utime(path, None)
+        return value
+    except (OSError, EOFError, pickle.UnpicklingError):
+        pass
+
+    value = build()
+    if not os.path.exists(path + oversized_suffix):
+        store(path, value)
+    return value
+
+
+def store(path, value):
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        # write to a temporary file first so that a concurrent start never reads half of an entry
+        fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                pickle.dump(value, tmp_file, protocol=pickle.HIGHEST_PROTOCOL)
+            if os.path.getsize(tmp) > max_size:
+                # it would evict everything else and then itself
+                os.remove(tmp)
+                open(path + oversized_suffix, 'w').close()
+                return
+            os.replace(tmp, path)
+        except Exception:
+            os.remove(tmp)
+            raise
+    except OSError:
+        # a read-only home only costs the parsing on the next start
+        return
+    evict()
+
+
+def entries():
+    """(mtime, size, path) of the cache entries, least recently used first"""
+    found = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(suffix):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        found.append((st.st_mtime, st.st_size, path))
+    return sorted(found)
+
+
+def evict():
+    """remove the least recently used entries until the cache fits in max_size"""
+    found = entries()
+    total = sum(size for _, size, _ in found)
+    for _, size, path in found:
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+
+def clear():
+    if os.path.isdir(cache_dir):
+        for _, _, path in entries():
+            os.remove(path)
+        for name in os.listdir(cache_dir):
+            if name.endswith(oversized_suffix):
+                os.remove(os.path.join(cache_dir, name))
+
+
+def main():
+    import argparse
+    from robotcontrol import bot_controller
+    from robotcontrol.mapserver import MapServer
+    from robotcontrol.instructions_db import InstructionDB
+    from robotcontrol.configuration_db import ConfigurationDB
+    from robotcontrol.battery_db import BatteryDB
+    from robotcontrol.ready_db import ReadyDB
+
+    parser = argparse.ArgumentParser(description='Compare cold and warm starts of the database loaders')
+    parser.add_argument('--map', default=bot_controller.map_file)
+    parser.add_argument('--instructions', default=bot_controller.instructions_db_file)
+    parser.add_argument('--configurations', default=bot_controller.config_list)
+    parser.add_argument('--world', default=bot_controller.world_file)
+    parser.add_argument('--ready', help='The ready file of the mission')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    loaders = [
+        ('MapServer', lambda: MapServer(args.map)),
+        ('InstructionDB', lambda: InstructionDB(args.instructions)),
+        ('ConfigurationDB', lambda: ConfigurationDB(args.configurations)),
+        # the battery parameters are cached on their own, by the stat of the world file
+        ('BatteryDB', lambda: BatteryDB(args.world, battery_name=bot_controller.battery_name, use_cache=enabled)),
+    ]
+    if args.ready:
+        loaders.append(('ReadyDB', lambda: ReadyDB(args.ready)))
+
+    global enabled
+    total_cold = total_warm = 0.0
+    for name, loader in loaders:
+        enabled = False
+        cold = []
+        for _ in range(args.repeat):
+            start_time = time.perf_counter()
+            loader()
+            cold.append(time.perf_counter() - start_time)
+        enabled = True
+        # fill the cache, then time the warm starts
+        loader()
+        warm = []
+        for _ in range(args.repeat):
+            start_time = time.perf_counter()
+            loader()
+            warm.append(time.perf_counter() - start_time)
+        total_cold += min(cold)
+        total_warm += min(warm)
+        print("{0:16s} cold {1:.6f} s, warm {2:.6f} s".format(name, min(cold), min(warm)))
+    print("{0:16s} cold {1:.6f} s, warm {2:.6f} s".format('total', total_cold, total_warm))
+
+
+if __name__ == '__main__':
+    main()
@@ -17,6 +17,9 @@ from bot_controller import BotController
 from constants import AdaptationLevel
 from ready_db import ReadyDB
 from launch_utils import *
+from robotcontrol import instrumentation
+from robotcontrol import memory_profile
+from robotcontrol import log
 
 commands = ["place_obstacle", "remove_obstacle", "set_charge", "execute_task", "go_directly", "execute_task_reactive",
             "execute_task_reactive_fancy"]
@@ -34,6 +37,20 @@ def main():
 
     parser = argparse.ArgumentParser()
     parser.add_argument("command", choices=commands, help='The command to issue to Gazebo')
+    parser.add_argument("--metrics", help='Time the controller hot paths and write the metrics to this file')
+    parser.add_argument("--metrics-format", choices=["prometheus", "json"], default="prometheus",
+                        help='The format of the metrics file')
+    parser.add_argument("--memory-profile",
+                        help='Trace the allocations of every mission phase and write the top sites to this file')
+    parser.add_argument("--memory-interval", type=float, default=memory_profile.interval,
+                        help='Seconds between the memory snapshots taken within a phase, 0 for none')
+    parser.add_argument("--memory-top", type=int, default=memory_profile.top,
+                        help='Allocation sites reported per snapshot and per phase')
+    parser.add_argument("--trace", help='Record the mission tasks and battery telemetry into this directory')
+    parser.add_argument("--log-rate-limit", type=int, default=0,
+                        help='At most this many log messages per second from one place in the code, 0 for no limit')
+    parser.add_argument("--log-sample-rate", type=float, default=1.0,
+                        help='The fraction of the info and debug log messages that are written')
 
     po_parser = argparse.ArgumentParser(prog=parser.prog + " place_obstacle")
     po_parser.add_argument('x', type=float, help='The x location relative to the map to place the obstacle')
@@ -63,6 +80,20 @@ def main():
 
     args, extras = parser.parse_known_args()
 
+    log.rate_limit = args.log_rate_limit
+    log.sample_rate = args.log_sample_rate
+
+    if args.metrics:
+        instrumentation.enable()
+
+    if args.memory_profile:
+        memory_profile.interval = args.memory_interval
+        memory_profile.top = args.memory_top
+        memory_profile.start(args.memory_profile)
+
+    if args.trace:
+        bot.start_trace(args.trace)
+
     if args.command == "execute_task":
         pargs = et_parser.parse_args(extras)
 
@@ -133,6 +164,15 @@ def main():
         else:
             print('Obstacle was removed unsuccessfully')
 
+    if args.metrics:
+        instrumentation.write_metrics(args.metrics, fmt=args.metrics_format)
+
+    if args.memory_profile:
+        memory_profile.stop()
+
+    if args.trace:
+        bot.stop_trace()
+
 
 if __name__ == '__main__':
     main()
@@ -1,12 +1,17 @@
 import json
 
+from robotcontrol import cache
+
+
+def _parse(conf_db):
+    with open(conf_db) as db:
+        return json.load(db)['configurations']
+
 
 class ConfigurationDB:
 
     def __init__(self, conf_db):
-        with open(conf_db) as db:
-            data = json.load(db)
-        self.db = data['configurations']
+        self.db = cache.load('configurations', conf_db, lambda: _parse(conf_db))
 
     def get_power_load(self, conf_id):
         config = list(filter(lambda conf: conf['config_id'] == conf_id, self.db))
@@ -0,0 +1,91 @@
+#! /usr/bin/env python
+
+"""online estimate of the battery discharge rate from the charge level updates"""
+import math
+
+# minimum number of samples since the last reset before the estimate is used
+min_samples = 10
+
+
+class DischargeEstimator:
+    """exponentially weighted least squares fit of charge against time, updated in O(1) per sample
+
+    keeps the decayed weighted means and (co)variances of time and charge, the slope of the fit is
+    the negative discharge rate in Ah per second.
+    """
+
+    def __init__(self, forgetting=0.98):
+        self.forgetting = forgetting
+        self.reset()
+
+    def reset(self):
+        self.samples = 0
+        self.weight = 0.0
+        self.weight_sq = 0.0
+        self.t0 = None
+        self.mean_t = 0.0
+        self.mean_c = 0.0
+        self.var_t = 0.0
+        self.var_c = 0.0
+        self.cov_tc = 0.0
+
+    def update(self, timestamp, charge, charging=False):
+        """add a charge level sample, the fit restarts whenever the battery is being charged"""
+        if charging:
+            self.reset()
+            return
+        if self.t0 is None:
+            self.t0 = timestamp
+        t = timestamp - self.t0
+        lam = self.forgetting
+
+        self.samples += 1
+        self.weight = lam * self.weight + 1.0
+        self.weight_sq = lam * lam * self.weight_sq + 1.0
+        dt = t - self.mean_t
+        dc = charge - self.mean_c
+        self.mean_t += dt / self.weight
+        self.mean_c += dc / self.weight
+        self.var_t = lam * self.var_t + dt * (t - self.mean_t)
+        self.var_c = lam * self.var_c + dc * (charge - self.mean_c)
+        self.cov_tc = lam * self.cov_tc + dt * (charge - self.mean_c)
+
+    @property
+    def ready(self):
+        return self.samples >= min_samples and self.var_t > 0
+
+    @property
+    def rate(self):
+        """estimated discharge rate in Ah per second, None until enough samples are seen"""
+        if not self.ready:
+            return None
+        return -self.cov_tc / self.var_t
+
+    @property
+    def rate_std(self):
+        """standard error of the estimated discharge rate"""
+        if not self.ready:
+            return None
+        residual = max(self.var_c - self.cov_tc ** 2 / self.var_t, 0.0)
+        # effective number of samples under the exponential weights
+        n_eff = self.weight ** 2 / self.weight_sq
+        if n_eff <= 2:
+            return float('inf')
+        sigma_sq = residual / self.weight * n_eff / (n_eff - 2)
+        return math.sqrt(sigma_sq / self.var_t)
+
+    def power_load(self, voltage):
+        """the power load (in Watt) that explains the estimated discharge rate"""
+        rate = self.rate
+        if rate is None:
+            return None
+        return rate * voltage * 3600
+
+    def time_to_empty(self, charge):
+        """(time in seconds, standard deviation) until the charge runs out at the estimated rate"""
+        rate = self.rate
+        if rate is None:
+            return None, None
+        if rate <= 0:
+            return float('inf'), float('inf')
+        return charge / rate, charge * self.rate_std / rate ** 2
@@ -0,0 +1,210 @@
+#! /usr/bin/env python
+
+"""travel time of every waypoint pair under any configuration speed
+
+the time of a route is its distance driven at the speed of the configuration plus a fixed overhead (turns,
+acceleration, the action server), so the model is two (waypoints x waypoints) arrays and a prediction is
+distance * (1 / speed) + overhead
+"""
+import numpy as np
+
+from robotcontrol import instruction_generator
+
+
+def path_length(map_server, path):
+    coords = []
+    for wp in path:
+        loc = map_server.waypoint_list[map_server.waypoint_idx[wp]]['coords']
+        coords.append([loc['x'], loc['y']])
+    coords = np.array(coords, dtype=np.float64)
+    return float(np.hypot(*np.diff(coords, axis=0).T).sum())
+
+
+def trace_durations(reader, config_server):
+    """(start, target, speed, duration) of the traced tasks that were driven right after the previous one
+
+    the duration of a task is the time between its end and the end of the previous task, tasks after a failed
+    task, a detour or a charging stop are left out
+    """
+    speeds = dict((conf['config_id'], conf['speed']) for conf in config_server.db)
+    for mission in reader.missions():
+        tasks = reader.mission_tasks(mission)
+        telemetry = reader.mission_telemetry(mission)
+        observations = reader.mission_observations(mission)
+        charging = observations['timestamp'][observations['kind'] == b'go_charging']
+        for prev, task in zip(tasks[:-1], tasks[1:]):
+            if not (prev['task_accomplished'] and task['task_accomplished'] and prev['target'] == task['start']):
+                continue
+            if np.any((charging > prev['timestamp']) & (charging <= task['timestamp'])):
+                continue
+            # the configuration the robot was in when it finished the task
+            k = int(np.searchsorted(telemetry['timestamp'], task['timestamp'], side='right')) - 1
+            if k < 0 or int(telemetry['config_id'][k]) not in speeds:
+                continue
+            yield (task['start'].decode(), task['target'].decode(), speeds[int(telemetry['config_id'][k])],
+                   float(task['timestamp'] - prev['timestamp']))
+
+
+class DurationModel:
+    """the arrays are either given whole or filled a row at a time, each row from one single-source search of the
+    map, so a few sources of a large map never need the other rows"""
+
+    def __init__(self, waypoint_ids, distance=None, overhead=None, map_server=None, per_leg=0.0, observed=None):
+        """
+        :param distance: distance[i, j], meters driven from waypoint i to waypoint j, inf if there is no route
+        :param overhead: overhead[i, j], seconds spent on the route besides driving
+        :param map_server: the map the rows are searched in when the arrays are not given
+        :param per_leg: overhead per leg of the pairs that were never observed
+        :param observed: observed[i][j] = (distance, overhead) of the observed pairs
+        """
+        self.waypoint_ids = list(waypoint_ids)
+        self.waypoint_idx = dict((wp, i) for i, wp in enumerate(self.waypoint_ids))
+        self._distance = distance
+        self._overhead = overhead
+        self.map_server = map_server
+        self.per_leg = per_leg
+        self.observed = observed if observed is not None else {}
+        self.rows = {}
+
+    @classmethod
+    def fit(cls, instruction_server, map_server, traces=(), config_server=None, reference_speed=None):
+        """split the routes of the instruction db into distance and overhead
+
+        every pair of the db is one observation of its recorded time at reference_speed, every usable task of
+        the traces another one at the speed of its configuration; the overhead of a pair is the mean time left
+        after driving its distance, pairs that were never observed get the overhead per leg fitted over all
+        the observations
+
+        :param traces: MissionTraceReaders, they need the config_server
+        :param reference_speed: speed the times of the db were recorded at, the MoveAbsH speed by default
+        """
+        if reference_speed is None:
+            reference_speed = instruction_generator.speed
+        waypoint_ids = [wp['node-id'] for wp in map_server.waypoint_list]
+        idx = map_server.waypoint_idx
+        # (i, j) -> [distance, legs, residual, count]
+        pairs = {}
+        for key, row in instruction_server.db.items():
+            path = row['path']
+            if path[0] not in idx or path[-1] not in idx:
+                continue
+            # the robot drives the recorded path, not necessarily the shortest one
+            pair = pairs.setdefault((idx[path[0]], idx[path[-1]]), [path_length(map_server, path), len(path) - 1, 0.0, 0])
+            pair[2] += row['time'] - pair[0] / reference_speed
+            pair[3] += 1
+
+        searched = {}
+        for reader in traces:
+            for start, target, speed, duration in trace_durations(reader, config_server):
+                if start not in idx or target not in idx:
+                    continue
+                i, j = idx[start], idx[target]
+                if (i, j) not in pairs:
+                    if i not in searched:
+                        searched[i] = map_server.path_lengths(start)
+                    length, legs = searched[i][0][j], searched[i][1][j]
+                    if not np.isfinite(length):
+                        continue
+                    pairs[(i, j)] = [float(length), int(legs), 0.0, 0]
+                pair = pairs[(i, j)]
+                pair[2] += duration - pair[0] / speed
+                pair[3] += 1
+
+        observed = {}
+        numerator = denominator = 0.0
+        for (i, j), (length, legs, residual, count) in pairs.items():
+            if count == 0:
+                continue
+            observed.setdefault(i, {})[j] = (length, residual / count)
+            numerator += residual / count * legs
+            denominator += legs ** 2
+        per_leg = numerator / max(denominator, 1.0)
+        return cls(waypoint_ids, map_server=map_server, per_leg=per_leg, observed=observed)
+
+    def row(self, i):
+        """distance and overhead from waypoint i to every waypoint"""
+        if self._distance is not None:
+            return self._distance[i], self._overhead[i]
+        row = self.rows.get(i)
+        if row is None:
+            distance, legs = self.map_server.path_lengths(self.waypoint_ids[i])
+            overhead = np.where(np.isfinite(distance), np.maximum(legs, 0) * self.per_leg, 0.0)
+            for j, (length, pair_overhead) in self.observed.get(i, {}).items():
+                distance[j] = length
+                overhead[j] = pair_overhead
+            overhead[i] = 0.0
+            row = self.rows[i] = distance, overhead
+        return row
+
+    def _complete(self):
+        if self._distance is None:
+            rows = [self.row(i) for i in range(len(self.waypoint_ids))]
+            self._distance = np.array([distance for distance, _ in rows]).reshape(len(rows), len(rows))
+            self._overhead = np.array([overhead for _, overhead in rows]).reshape(len(rows), len(rows))
+            self.rows = {}
+
+    @property
+    def distance(self):
+        self._complete()
+        return self._distance
+
+    @property
+    def overhead(self):
+        self._complete()
+        return self._overhead
+
+    @classmethod
+    def load(cls, path):
+        arrays = np.load(path)
+        return cls([wp.decode() for wp in arrays['waypoint_ids'].tolist()], arrays['distance'], arrays['overhead'])
+
+    def save(self, path):
+        np.savez(path, waypoint_ids=np.array(self.waypoint_ids, dtype=np.bytes_), distance=self.distance,
+                 overhead=self.overhead)
+
+    def predict(self, src, tgt, inverse_speed):
+        """travel times for arrays of waypoint indices and 1 / speed, broadcast against each other"""
+        return self.distance[src, tgt] * inverse_speed + self.overhead[src, tgt]
+
+    def durations(self, wp_sources, wp_targets, speed):
+        """(len(wp_sources), len(wp_targets)) travel times at speed, one search of the map per source"""
+        targets = [self.waypoint_idx[wp] for wp in wp_targets]
+        times = np.empty((len(wp_sources), len(targets)))
+        for k, wp in enumerate(wp_sources):
+            distance, overhead = self.row(self.waypoint_idx[wp])
+            times[k] = distance[targets] / speed + overhead[targets]
+        return times
+
+    def duration(self, wp_src, wp_tgt, speed):
+        distance, overhead = self.row(self.waypoint_idx[wp_src])
+        j = self.waypoint_idx[wp_tgt]
+        return float(distance[j] / speed + overhead[j])
+
+
+def main():
+    import argparse
+    from robotcontrol import bot_controller
+    from robotcontrol.mapserver import MapServer
+    from robotcontrol.instructions_db import InstructionDB
+    from robotcontrol.configuration_db import ConfigurationDB
+    from robotcontrol.mission_trace import MissionTraceReader
+
+    parser = argparse.ArgumentParser(description='Fit the duration model to the instruction db and mission traces')
+    parser.add_argument('traces', nargs='*', help='Trace directories recorded with --trace')
+    parser.add_argument('--map', default=bot_controller.map_file)
+    parser.add_argument('--instructions', default=bot_controller.instructions_db_file)
+    parser.add_argument('--configurations', default=bot_controller.config_list)
+    parser.add_argument('--out', default=bot_controller.duration_model_file)
+    args = parser.parse_args()
+
+    model = DurationModel.fit(InstructionDB(args.instructions), MapServer(args.map),
+                              traces=[MissionTraceReader(trace) for trace in args.traces],
+                              config_server=ConfigurationDB(args.configurations))
+    model.save(args.out)
+    finite = np.isfinite(model.distance)
+    print("{0} pairs, mean overhead {1:.1f} s, written to {2}".format(
+        int(finite.sum()), float(model.overhead[finite].mean()), args.out))
+
+
+if __name__ == '__main__':
+    main()
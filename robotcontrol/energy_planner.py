@@ -0,0 +1,102 @@
+#! /usr/bin/env python
+
+"""look-ahead energy planner that schedules charging stops for a whole mission before it starts"""
+import numpy as np
+
+
+class EnergyPlanner:
+    """simulates the charge along the target sequence and inserts charging stops where they minimise mission time
+
+    a charging stop after node k means a detour from node k to its closest station, a full recharge,
+    and then heading from the station to node k+1 (node 0 is the start of the mission)
+    """
+
+    def __init__(self, mission_planner, map_server, battery, config_server, reserve=0.10):
+        self.mission_planner = mission_planner
+        self.map_server = map_server
+        self.battery = battery
+        self.config_server = config_server
+        # fraction of the capacity that should be left when arriving anywhere
+        self.reserve = reserve
+        self.station_cache = {}
+
+    def closest_station(self, waypoint):
+        """the station with the shortest predicted travel time from the waypoint"""
+        # the fallback travel times depend on the speed of the current configuration
+        key = (waypoint, self.mission_planner.speed)
+        if key not in self.station_cache:
+            stations = self.map_server.get_charging_stations()
+            times = [self.mission_planner.travel_time(waypoint, station) for station in stations]
+            k = int(np.argmin(times))
+            self.station_cache[key] = (stations[k], times[k])
+        return self.station_cache[key]
+
+    def plan(self, start, targets, charge, config_id):
+        """plan charging stops for visiting targets from start with the given charge (Ah) and configuration
+
+        :return: (predicted mission time, list of (k, station) meaning charge after node k),
+                 the time is inf if no feasible plan exists
+        """
+        nodes = [start] + list(targets)
+        n = len(targets)
+        if n == 0:
+            return 0.0, []
+
+        rate = self.battery.discharge_rate(self.config_server.get_power_load(config_id))
+        capacity = self.battery.capacity
+        reserve = self.reserve * capacity
+
+        leg = np.zeros(n + 1)
+        leg[1:] = [self.mission_planner.travel_time(a, b) for a, b in zip(nodes[:-1], nodes[1:])]
+        cum = np.cumsum(leg)
+
+        stations = [self.closest_station(wp) for wp in nodes[:-1]]
+        to_station = np.array([t for s, t in stations])
+        from_station = np.array([self.mission_planner.travel_time(s, wp) for (s, t), wp in zip(stations, nodes[1:])])
+
+        # best[k]: minimal time to be fully charged at the station after node k
+        best = np.full(n, np.inf)
+        parent = np.full(n, -1, dtype=int)
+
+        # the drive time of a segment starting right after a charge at node i and ending at node j is
+        # from_station[i] + cum[j] - cum[i+1], starting from the mission start it is simply cum[j]
+        for j in range(n):
+            drive = np.concatenate(([cum[j]], from_station[:j] + cum[j] - cum[1:j + 1])) + to_station[j]
+            start_charge = np.concatenate(([charge], np.full(j, capacity)))
+            arrival = start_charge - rate * drive
+            total = np.concatenate(([0.0], best[:j])) + drive + self.battery.time_to_fully_charge(arrival)
+            total[arrival < reserve] = np.inf
+            k = int(total.argmin())
+            best[j] = total[k]
+            parent[j] = k - 1
+
+        drive = np.concatenate(([cum[n]], from_station + cum[n] - cum[1:n + 1]))
+        start_charge = np.concatenate(([charge], np.full(n, capacity)))
+        total = np.concatenate(([0.0], best)) + drive
+        total[start_charge - rate * drive < reserve] = np.inf
+        k = int(total.argmin())
+        if not np.isfinite(total[k]):
+            return np.inf, []
+
+        stops = []
+        k -= 1
+        while k >= 0:
+            stops.append((k, stations[k][0]))
+            k = int(parent[k])
+        return float(total.min()), stops[::-1]
+
+    def charging_stop(self, start, targets, charge, config_id):
+        """the station of the charging stop the plan for the rest of the mission starts with at the current waypoint
+
+        :param charge: the current charge (Ah), negative while it is not known yet
+        :return: the station, None when the plan does not start with a charging stop or the charge is unknown
+        """
+        if charge < 0:
+            return None
+        mission_time, stops = self.plan(start, targets, charge, config_id)
+        if not np.isfinite(mission_time):
+            # the rest of the mission cannot be done on any plan, the best bet is topping up right away
+            return self.closest_station(start)[0]
+        if len(stops) > 0 and stops[0][0] == 0:
+            return stops[0][1]
+        return None
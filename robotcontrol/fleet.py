@@ -0,0 +1,109 @@
+#! /usr/bin/env python
+
+"""fleet mode: several robots in one process, each with its own namespaced ControlInterface,
+sharing a single set of read-only databases and one thread pool for their missions"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Empty
+from threading import Lock
+
+from robotcontrol import bot_controller, log
+from robotcontrol.bot_controller import BotController
+from robotcontrol.bot_interface import ControlInterface
+from robotcontrol.mapserver import MapServer
+from robotcontrol.instructions_db import InstructionDB
+from robotcontrol.instruction_generator import InstructionGenerator
+from robotcontrol.configuration_db import ConfigurationDB
+from robotcontrol.battery_db import BatteryDB
+from robotcontrol.reachability import ReachabilityTable
+from robotcontrol.mission_predictor import MissionPredictor
+
+
+class FleetController:
+    """one BotController per robot, the map, instructions, configurations, battery model and
+    reachability table are loaded once and only read by the robots, so adding a robot only adds its own state"""
+
+    def __init__(self, namespaces, robot_models=None, map_server=None, instruction_server=None, config_server=None,
+                 robot_battery=None, max_workers=None):
+        """
+        :param namespaces: ros namespaces of the robots, e.g. ['/robot1', '/robot2']
+        :param robot_models: gazebo model names of the robots, by default the namespaces without the slashes
+        :param max_workers: size of the mission thread pool, one thread per robot by default
+        """
+        self.map_server = map_server if map_server is not None else MapServer(bot_controller.map_file)
+        self.instruction_server = instruction_server if instruction_server is not None \
+            else InstructionDB(bot_controller.instructions_db_file)
+        if bot_controller.synthesize_instructions and not isinstance(self.instruction_server, InstructionGenerator):
+            # one cache of generated instructions for all the robots
+            self.instruction_server = InstructionGenerator(
+                self.instruction_server, self.map_server,
+                write_back=bot_controller.instructions_write_back and self.instruction_server.writable)
+        self.config_server = config_server if config_server is not None else ConfigurationDB(bot_controller.config_list)
+        self.robot_battery = robot_battery if robot_battery is not None \
+            else BatteryDB(bot_controller.world_file, battery_name=bot_controller.battery_name)
+        self.reachability = ReachabilityTable(self.map_server, self.config_server, self.robot_battery)
+        self.mission_predictor = MissionPredictor(self.instruction_server, self.map_server, self.config_server,
+                                                  self.robot_battery, duration_model=bot_controller.load_duration_model())
+
+        if robot_models is None:
+            robot_models = [namespace.strip('/') for namespace in namespaces]
+
+        self.bots = OrderedDict()
+        # a robot runs one mission at a time
+        self.bot_locks = {}
+        for namespace, model in zip(namespaces, robot_models):
+            gazebo = ControlInterface(self.config_server.get_default_config(), namespace=namespace, robot_model=model)
+            self.bots[namespace] = BotController(map_server=self.map_server, instruction_server=self.instruction_server,
+                                                 config_server=self.config_server, robot_battery=self.robot_battery,
+                                                 gazebo=gazebo, reachability=self.reachability,
+                                                 mission_predictor=self.mission_predictor)
+            self.bot_locks[namespace] = Lock()
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or max(len(self.bots), 1))
+
+    def track_battery_charge(self):
+        for bot in self.bots.values():
+            bot.gazebo.track_battery_charge()
+
+    def run(self, namespace, start, targets, active_cb=None, done_cb=None, at_waypoint_cb=None, mission_done_cb=None):
+        """run a mission on a robot in the calling thread with the mission loop of its adaptation level"""
+        bot = self.bots[namespace]
+        if bot.level == "c":
+            mission = bot.go_instructions_multiple_tasks_adaptive
+        else:
+            mission = bot.go_instructions_multiple_tasks_reactive
+        with self.bot_locks[namespace]:
+            log.info("Robot {0} started a mission from {1} to {2}", namespace, start, targets)
+            return mission(start, targets, active_cb, done_cb, at_waypoint_cb, mission_done_cb)
+
+    def submit(self, namespace, start, targets, **kwargs):
+        """schedule a mission on a robot, returns a future of (number of tasks accomplished, locs)"""
+        return self.executor.submit(self.run, namespace, start, targets, **kwargs)
+
+    def run_missions(self, missions):
+        """run the missions on the fleet, every robot takes the next mission as soon as it is free
+
+        :param missions: list of (start, targets)
+        :return: list of (namespace, number of tasks accomplished, locs) in the order of the missions
+        """
+        pending = Queue()
+        for k, mission in enumerate(missions):
+            pending.put((k, mission))
+        results = [None] * len(missions)
+
+        def worker(namespace):
+            while True:
+                try:
+                    k, (start, targets) = pending.get_nowait()
+                except Empty:
+                    return
+                number_of_tasks_accomplished, locs = self.run(namespace, start, targets)
+                results[k] = (namespace, number_of_tasks_accomplished, locs)
+
+        workers = [self.executor.submit(worker, namespace) for namespace in self.bots]
+        for future in workers:
+            future.result()
+        return results
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,148 @@
+#! /usr/bin/env python
+
+"""igcode for the start/target pairs missing from the instruction db
+
+the MoveAbsH program of a pair is built from the shortest path of the map on its first request and kept in a
+bounded cache, so the instruction db only needs the pairs that were tuned by hand
+"""
+import math
+import re
+from collections import OrderedDict
+from threading import Lock
+
+from robotcontrol.instrumentation import timed
+
+# speed written into the generated MoveAbsH instructions, the same as in instructions-all.json
+speed = 0.68
+# predicted duration of a path, least squares fit to the pairs of instructions-all.json (max error 3 s)
+seconds_per_meter = 1.73
+seconds_per_leg = 1.42
+# generated pairs kept in memory
+cache_size = 1024
+
+# x, y and speed of a MoveAbsH instruction
+_move = re.compile(r'MoveAbsH\(([-+]?\d*\.\d+), ([-+]?\d*\.\d+|\d+), ([-+]?\d*\.\d+|\d+)')
+
+
+def heading(loc1, loc2):
+    """heading of the MoveAbsH instructions, counterclockwise from the x axis"""
+    return math.atan2(loc2[1] - loc1[1], loc2[0] - loc1[0])
+
+
+def start_direction(loc1, loc2):
+    """start-dir of the instruction db, clockwise from the y axis"""
+    return math.atan2(loc2[0] - loc1[0], loc2[1] - loc1[1])
+
+
+def igcode(coords, move_speed=None):
+    """the MoveAbsH program visiting coords[1:], the robot faces the next leg at every waypoint
+    and keeps the heading of the last leg at the target
+
+    :param coords: [x, y] of every waypoint of the path, the start included
+    """
+    if move_speed is None:
+        move_speed = speed
+    n = len(coords)
+    moves = []
+    for i in range(1, n):
+        w = heading(coords[i], coords[i + 1]) if i + 1 < n else heading(coords[i - 1], coords[i])
+        moves.append("V({0}, do MoveAbsH({1:.2f}, {2:.2f}, {3:.2f}, {4:.4f}) then {5})".format(
+            i, coords[i][0], coords[i][1], move_speed, w, i + 1))
+    return "P({0},\n{1}V({2}, end)::\nnil)".format(moves[0], ''.join(m + '::\n' for m in moves[1:]), n)
+
+
+def replace_speed(igcode, move_speed):
+    """the igcode with the speed of every MoveAbsH instruction replaced by move_speed"""
+    def speed(match):
+        # the speed is the last group of the match, x and y are kept as they are
+        return match.group(0)[:match.start(3) - match.start()] + str(move_speed)
+    updated, count = _move.subn(speed, igcode)
+    if count == 0:
+        raise ValueError('No MoveAbsH instruction with a decimal x in the igcode')
+    return updated
+
+
+def predicted_duration(length, legs):
+    return int(round(seconds_per_meter * length + seconds_per_leg * legs))
+
+
+class InstructionGenerator:
+    """instruction server answering from the instruction db and generating the pairs it does not have"""
+
+    def __init__(self, instruction_server, map_server, write_back=False):
+        """
+        :param instruction_server: the InstructionDB asked first
+        :param write_back: add the generated pairs to the journal of the instruction db
+        """
+        self.instruction_server = instruction_server
+        self.map_server = map_server
+        self.write_back = write_back
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    @property
+    def db(self):
+        """the pairs of the instruction db, the generated ones are not included"""
+        return self.instruction_server.db
+
+    @timed('instruction_generator.generate')
+    def generate(self, wp_src, wp_tgt):
+        """the instruction db entry of the pair from the shortest path of the map,
+        None if the target cannot be reached from the start"""
+        if wp_src not in self.map_server.waypoint_idx or wp_tgt not in self.map_server.waypoint_idx \
+                or wp_src == wp_tgt:
+            return None
+        path, length = self.map_server.shortest_path(wp_src, wp_tgt)
+        if not path:
+            return None
+        coords = []
+        for wp in path:
+            loc = self.map_server.waypoint_to_coords(wp)
+            coords.append([loc['x'], loc['y']])
+        return {'path': path, 'start-dir': start_direction(coords[0], coords[1]),
+                'time': predicted_duration(length, len(path) - 1), 'instructions': igcode(coords)}
+
+    def get_entry(self, wp_src, wp_tgt):
+        key = "%s_to_%s" % (wp_src, wp_tgt)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+        entry = self.generate(wp_src, wp_tgt)
+        with self.lock:
+            self.entries[key] = entry
+            if len(self.entries) > cache_size:
+                self.entries.popitem(last=False)
+        if entry is not None and self.write_back:
+            self.instruction_server.put(wp_src, wp_tgt, entry)
+        return entry
+
+    def get_path(self, wp_src, wp_tgt):
+        path = self.instruction_server.get_path(wp_src, wp_tgt)
+        if path is not None:
+            return path
+        entry = self.get_entry(wp_src, wp_tgt)
+        return None if entry is None else entry['path']
+
+    def get_instructions(self, wp_src, wp_tgt):
+        instructions = self.instruction_server.get_instructions(wp_src, wp_tgt)
+        if instructions is not None:
+            return instructions
+        entry = self.get_entry(wp_src, wp_tgt)
+        return None if entry is None else entry['instructions']
+
+    def get_predicted_duration(self, wp_src, wp_tgt):
+        duration = self.instruction_server.get_predicted_duration(wp_src, wp_tgt)
+        if duration != -1:
+            return duration
+        entry = self.get_entry(wp_src, wp_tgt)
+        return -1 if entry is None else entry['time']
+
+    def get_start_heading(self, wp_src, wp_tgt):
+        w = self.instruction_server.get_start_heading(wp_src, wp_tgt)
+        if w != -1:
+            return w
+        entry = self.get_entry(wp_src, wp_tgt)
+        return -1 if entry is None else entry['start-dir']
+
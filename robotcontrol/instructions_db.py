@@ -2,39 +2,225 @@
 
 """ utility functions for working with waypoints and maps """
 # imports
+import fcntl
 import json
+import os
+import tempfile
+import time
+from threading import Thread, Lock
+
+from robotcontrol import cache
+from robotcontrol.instrumentation import timed
+
+# journal records after which put and delete start a background compaction, 0 disables it
+compact_after = 10000
+# seconds between the lookups that check the journal for records of other processes, 0 disables the check
+refresh_interval = 5.0
+
+
+def _parse(instruction_db):
+    with open(instruction_db) as db:
+        return json.load(db)
+
+
+def _identity(path):
+    """tells the snapshots apart, a compaction replaces the file and a new journal may reuse the inode of the old"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+class _JournalLock:
+    """inter-process lock of a journal, serialises the appends with the compaction"""
+
+    def __init__(self, journal):
+        self.path = journal + '.lock'
+
+    def __enter__(self):
+        self.file = open(self.path, 'a')
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+        return False
 
 
 class InstructionDB:
 
-    def __init__(self, instruction_db):
-        with open(instruction_db) as db:
-            data = json.load(db)
-        self.db = data
+    # the pairs can be changed with put and delete
+    writable = True
+
+    def __init__(self, instruction_db, journal=None):
+        """
+        :param instruction_db: the json snapshot of the pairs
+        :param journal: append-only file of the upserts and deletes made since the snapshot,
+        <instruction_db>.journal by default
+        """
+        self.instruction_db = instruction_db
+        self.journal = journal if journal is not None else instruction_db + '.journal'
+        self.lock = Lock()
+        self.compaction = None
+        self.load()
+
+    def load(self):
+        """read the snapshot and replay the whole journal over it"""
+        with self.lock:
+            # taken before reading, a compaction in between is noticed by the next refresh
+            self.snapshot = _identity(self.instruction_db)
+            self.db = cache.load('instructions', self.instruction_db, lambda: _parse(self.instruction_db))
+            self.journal_inode = None
+            self.journal_offset = 0
+            self.journal_records = 0
+        self.refresh()
+
+    def __refresh_if_due(self):
+        now = time.time()
+        if refresh_interval and now - self.refreshed >= refresh_interval:
+            self.refresh()
+
+    def refresh(self):
+        """apply the records appended to the journal since the last refresh, by this or another process
+
+        :return: number of records applied
+        """
+        self.refreshed = time.time()
+        try:
+            journal = open(self.journal, 'rb')
+        except OSError:
+            journal = None
+        with self.lock:
+            st = os.fstat(journal.fileno()) if journal is not None else None
+            # the snapshot is replaced before the old journal is removed, so a journal opened before the check
+            # belongs to the snapshot unless the snapshot changed
+            compacted = _identity(self.instruction_db) != self.snapshot or \
+                self.journal_inode is not None and (st is None or st.st_ino != self.journal_inode or
+                                                    st.st_size < self.journal_offset)
+        if compacted or journal is None:
+            if journal is not None:
+                journal.close()
+            if compacted:
+                # the journal was merged into a new snapshot
+                self.load()
+                return self.journal_records
+            return 0
+
+        applied = 0
+        with self.lock, journal:
+            journal.seek(self.journal_offset)
+            for line in journal:
+                # a record still being written is read on the next refresh
+                if not line.endswith(b'\n'):
+                    break
+                self.journal_offset += len(line)
+                self.__apply(json.loads(line.decode('utf-8')))
+                applied += 1
+            self.journal_inode = st.st_ino
+            self.journal_records += applied
+        return applied
+
+    def __apply(self, record):
+        if record['op'] == 'put':
+            self.db[record['key']] = record['entry']
+        else:
+            self.db.pop(record['key'], None)
+
+    def __append(self, record):
+        line = (json.dumps(record) + '\n').encode('utf-8')
+        with _JournalLock(self.journal):
+            # catch up first, so the offset stays at the end of what this db has applied
+            self.refresh()
+            with open(self.journal, 'ab') as journal:
+                journal.write(line)
+            with self.lock:
+                self.__apply(record)
+                self.journal_offset += len(line)
+                self.journal_inode = os.stat(self.journal).st_ino
+                self.journal_records += 1
+        if compact_after and self.journal_records >= compact_after:
+            self.compact_in_background()
+
+    def put(self, wp_src, wp_tgt, entry):
+        """add or replace the entry of a pair, written to the journal only
+
+        :param entry: {"path": [...], "start-dir": ..., "time": ..., "instructions": ...}
+        """
+        self.__append({'op': 'put', 'key': self.__form_key(wp_src, wp_tgt), 'entry': entry})
+
+    def delete(self, wp_src, wp_tgt):
+        self.__append({'op': 'delete', 'key': self.__form_key(wp_src, wp_tgt)})
+
+    def compact(self):
+        """merge the journal into a new snapshot and start an empty journal
+
+        the snapshot is replaced before the journal is removed, a reader in between replays records
+        the snapshot already has, which leaves the same pairs
+        """
+        with _JournalLock(self.journal):
+            self.refresh()
+            if self.journal_records == 0:
+                return
+            with self.lock:
+                data = dict(self.db)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.instruction_db)), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as tmp_file:
+                    json.dump(data, tmp_file)
+                os.replace(tmp, self.instruction_db)
+            except Exception:
+                os.remove(tmp)
+                raise
+            os.remove(self.journal)
+            with self.lock:
+                self.snapshot = _identity(self.instruction_db)
+                self.journal_inode = None
+                self.journal_offset = 0
+                self.journal_records = 0
+
+    def compact_in_background(self):
+        """compact in a daemon thread unless a compaction is already running"""
+        with self.lock:
+            if self.compaction is not None and self.compaction.is_alive():
+                return self.compaction
+            self.compaction = Thread(target=self.compact, name='instruction-db-compaction')
+            self.compaction.daemon = True
+            self.compaction.start()
+            return self.compaction
 
     def __form_key(self, wp_src, wp_tgt):
         key = "%s_to_%s" % (wp_src, wp_tgt)
         return key
 
+    @timed('instruction_db.get_path')
     def get_path(self, wp_src, wp_tgt):
+        self.__refresh_if_due()
         key = self.__form_key(wp_src, wp_tgt)
         if key not in self.db:
             return None
         return self.db[key]["path"]
 
+    @timed('instruction_db.get_instructions')
     def get_instructions(self, wp_src, wp_tgt):
+        self.__refresh_if_due()
         key = self.__form_key(wp_src, wp_tgt)
         if key not in self.db:
             return None
         return self.db[key]["instructions"]
 
+    @timed('instruction_db.get_predicted_duration')
     def get_predicted_duration(self, wp_src, wp_tgt):
+        self.__refresh_if_due()
         key = self.__form_key(wp_src, wp_tgt)
         if key not in self.db:
             return -1
         return self.db[key]["time"]
 
+    @timed('instruction_db.get_start_heading')
     def get_start_heading(self, wp_src, wp_tgt):
+        self.__refresh_if_due()
         key = self.__form_key(wp_src, wp_tgt)
         if key not in self.db:
             return -1
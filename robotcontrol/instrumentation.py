@@ -0,0 +1,168 @@
+#! /usr/bin/env python
+
+"""low-overhead timing spans for the controller hot paths, exported as Prometheus text or json"""
+import bisect
+import json
+import time
+from functools import wraps
+from threading import Lock
+
+# spans are only timed when instrumentation is enabled
+enabled = False
+
+# upper bounds (in seconds) of the histogram buckets, the last bucket is +Inf
+buckets = (0.000001, 0.00001, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0, 300.0, 1200.0)
+
+metric_name = 'robotcontrol_span_seconds'
+
+
+class Histogram:
+
+    def __init__(self):
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.lock = Lock()
+
+    def observe(self, value):
+        k = bisect.bisect_left(buckets, value)
+        with self.lock:
+            self.counts[k] += 1
+            self.count += 1
+            self.sum += value
+
+    def cumulative_counts(self):
+        total = 0
+        cumulative = []
+        for c in self.counts:
+            total += c
+            cumulative.append(total)
+        return cumulative
+
+
+_histograms = {}
+_registry_lock = Lock()
+
+
+def histogram(name):
+    hist = _histograms.get(name)
+    if hist is None:
+        with _registry_lock:
+            hist = _histograms.setdefault(name, Histogram())
+    return hist
+
+
+class _Span:
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        histogram(self.name).observe(time.perf_counter() - self.start)
+        return False
+
+
+class _NoSpan:
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+
+_no_span = _NoSpan()
+
+
+def span(name):
+    """context manager timing the enclosed block under name"""
+    if not enabled:
+        return _no_span
+    return _Span(name)
+
+
+def record(name, value):
+    """record a duration measured by the caller under name"""
+    if enabled:
+        histogram(name).observe(value)
+
+
+def timed(name):
+    """decorator timing every call of the function under name"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram(name).observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    with _registry_lock:
+        _histograms.clear()
+
+
+def to_prometheus():
+    """all span histograms in the Prometheus text exposition format"""
+    lines = ['# HELP {0} Time spent in instrumented robotcontrol spans.'.format(metric_name),
+             '# TYPE {0} histogram'.format(metric_name)]
+    for name in sorted(_histograms):
+        hist = _histograms[name]
+        cumulative = hist.cumulative_counts()
+        for bound, count in zip(buckets, cumulative):
+            lines.append('{0}_bucket{{span="{1}",le="{2}"}} {3}'.format(metric_name, name, bound, count))
+        lines.append('{0}_bucket{{span="{1}",le="+Inf"}} {2}'.format(metric_name, name, cumulative[-1]))
+        lines.append('{0}_sum{{span="{1}"}} {2}'.format(metric_name, name, repr(hist.sum)))
+        lines.append('{0}_count{{span="{1}"}} {2}'.format(metric_name, name, hist.count))
+    return '\n'.join(lines) + '\n'
+
+
+def to_json():
+    """all span histograms as a json document"""
+    spans = {}
+    for name in sorted(_histograms):
+        hist = _histograms[name]
+        spans[name] = {
+            'count': hist.count,
+            'sum': hist.sum,
+            'mean': hist.sum / hist.count if hist.count else 0.0,
+            'buckets': list(buckets) + ['+Inf'],
+            'counts': list(hist.counts),
+        }
+    return json.dumps({'spans': spans}, indent=2)
+
+
+def write_metrics(path, fmt='prometheus'):
+    """write the span histograms to path, fmt is either prometheus or json"""
+    if fmt == 'prometheus':
+        content = to_prometheus()
+    elif fmt == 'json':
+        content = to_json()
+    else:
+        raise ValueError('Unknown metrics format: {0}'.format(fmt))
+    with open(path, 'w') as metrics_file:
+        metrics_file.write(content)
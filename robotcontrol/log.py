@@ -0,0 +1,142 @@
+#! /usr/bin/env python
+
+"""asynchronous logging for the controller hot paths
+
+log.info("The robot is at: x={0}, y={1}", x, y) checks the level, the rate limit and the sampling of its call
+site and only formats the messages that pass, while the arguments still hold their values at the call; a background
+thread hands the formatted messages to rospy, or to the logging module where ROS is not installed
+"""
+import atexit
+import logging
+import random
+import sys
+import time
+from queue import Queue, Full
+from threading import Thread, Lock
+
+# the levels of rospy
+DEBUG = 1
+INFO = 2
+WARN = 4
+ERROR = 8
+
+# messages below this level are dropped before anything is formatted
+level = INFO
+# at most this many messages per second from one call site, 0 disables the limit
+rate_limit = 0
+# fraction of the debug and info messages that are written, warnings and errors are never sampled
+sample_rate = 1.0
+
+# messages waiting for the writer, new messages are dropped when it is full
+_queue = Queue(maxsize=10000)
+_writer = None
+_writer_lock = Lock()
+# call site -> [start of the current second, messages in it, messages suppressed since the last written one]
+_sites = {}
+# the call sites log from the mission, battery and action client threads
+_sites_lock = Lock()
+dropped = 0
+
+
+def _log_functions():
+    """the log functions of rospy, imported by the writer so that the modules logging through here do not need ROS"""
+    try:
+        import rospy
+        return {DEBUG: rospy.logdebug, INFO: rospy.loginfo, WARN: rospy.logwarn, ERROR: rospy.logerr}
+    except ImportError:
+        logger = logging.getLogger('robotcontrol')
+        return {DEBUG: logger.debug, INFO: logger.info, WARN: logger.warning, ERROR: logger.error}
+
+
+def _write_loop():
+    writers = _log_functions()
+    reported = 0
+    while True:
+        lvl, message, suppressed = _queue.get()
+        try:
+            if suppressed:
+                message = "{0} ({1} similar messages suppressed)".format(message, suppressed)
+            writers[lvl](message)
+            if dropped > reported:
+                writers[WARN]("{0} log messages were dropped, the log queue was full".format(dropped - reported))
+                reported = dropped
+        except Exception as e:
+            sys.stderr.write("Could not write the log message {0!r}: {1}\n".format(message, e))
+        finally:
+            _queue.task_done()
+
+
+def _start_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = Thread(target=_write_loop, name='robotcontrol-log')
+            _writer.daemon = True
+            _writer.start()
+
+
+def _log(lvl, message, args):
+    global dropped
+    if lvl < level:
+        return
+    site = sys._getframe(2)
+    key = (site.f_code, site.f_lineno)
+    with _sites_lock:
+        state = _sites.get(key)
+        if state is None:
+            state = _sites[key] = [0.0, 0, 0]
+
+        if lvl <= INFO and sample_rate < 1.0 and random.random() >= sample_rate:
+            state[2] += 1
+            return
+        if rate_limit:
+            now = time.time()
+            if now - state[0] >= 1.0:
+                state[0] = now
+                state[1] = 0
+            if state[1] >= rate_limit:
+                state[2] += 1
+                return
+            state[1] += 1
+
+        suppressed = state[2]
+        state[2] = 0
+
+    if args:
+        try:
+            message = message.format(*args)
+        except Exception as e:
+            sys.stderr.write("Could not format the log message {0!r}: {1}\n".format(message, e))
+            return
+    if _writer is None:
+        _start_writer()
+    try:
+        _queue.put_nowait((lvl, message, suppressed))
+    except Full:
+        with _sites_lock:
+            dropped += 1
+
+
+def debug(message, *args):
+    _log(DEBUG, message, args)
+
+
+def info(message, *args):
+    _log(INFO, message, args)
+
+
+def warn(message, *args):
+    _log(WARN, message, args)
+
+
+def error(message, *args):
+    _log(ERROR, message, args)
+
+
+def flush():
+    """wait until every enqueued message is written"""
+    if _writer is not None:
+        _queue.join()
+
+
+atexit.register(flush)
@@ -7,6 +7,8 @@ import heapq
 from operator import itemgetter
 import random
 
+from robotcontrol import cache
+
 
 def distance(loc1, loc2):
     return math.sqrt((loc1[0] - loc2[0]) ** 2 + (loc1[1] - loc2[1]) ** 2)
@@ -15,6 +17,16 @@ def distance(loc1, loc2):
 class MapServer:
 
     def __init__(self, map_file):
+        state = cache.load('map', map_file, lambda: self.parse(map_file))
+        self.waypoint_list = state['waypoint_list']
+        self.waypoint_idx = state['waypoint_idx']
+        if 'stations' in state:
+            self.stations = state['stations']
+        self.adj_matrix = state['adj_matrix']
+        self.waypoints = self.get_waypoints()
+
+    def parse(self, map_file):
+        """the waypoints, their index and the adjacency matrix of the map file"""
         with open(map_file) as db:
             data = json.load(db)
         self.waypoint_list = data["map"]
@@ -22,11 +34,11 @@ class MapServer:
         for i in range(len(self.waypoint_list)):
             self.waypoint_idx[self.waypoint_list[i]['node-id']] = i
 
+        state = {'waypoint_list': self.waypoint_list, 'waypoint_idx': self.waypoint_idx,
+                 'adj_matrix': self.get_adjacency_matrix()}
         if 'stations' in data:
-            self.stations = data["stations"]
-
-        self.adj_matrix = self.get_adjacency_matrix()
-        self.waypoints = self.get_waypoints()
+            state['stations'] = data["stations"]
+        return state
 
     def waypoint_to_coords(self, waypoint_id):
         """ given a way point, produce its coordinates """
@@ -135,6 +147,100 @@ class MapServer:
 
         return shortest_path
 
+    def shortest_path(self, start, goal):
+        """Dijkstra over the waypoint graph weighted by the euclidean length of the edges
+
+        :param start: start waypoint id
+        :param goal: goal waypoint id
+        :return: (path, length), path is empty and length is inf if the goal is not reachable
+        """
+        coords = [[wp['coords']['x'], wp['coords']['y']] for wp in self.waypoint_list]
+        src = self.waypoint_idx[start]
+        dst = self.waypoint_idx[goal]
+        dist = {src: 0.0}
+        prev = {}
+        queue = [(0.0, src)]
+        visited = set()
+        while queue:
+            d, i = heapq.heappop(queue)
+            if i in visited:
+                continue
+            visited.add(i)
+            if i == dst:
+                break
+            for j in np.flatnonzero(self.adj_matrix[i]).tolist():
+                nd = d + distance(coords[i], coords[j])
+                if nd < dist.get(j, float('inf')):
+                    dist[j] = nd
+                    prev[j] = i
+                    heapq.heappush(queue, (nd, j))
+
+        if dst not in visited:
+            return [], float('inf')
+        path = [dst]
+        while path[-1] != src:
+            path.append(prev[path[-1]])
+        return [self.waypoint_list[i]['node-id'] for i in reversed(path)], dist[dst]
+
+    def edges(self):
+        """(neighbour index, length) of the outgoing edges of every waypoint, built from the adjacency matrix once"""
+        # the shared map server is not built by __init__
+        if getattr(self, '_edges', None) is None:
+            coords = [[wp['coords']['x'], wp['coords']['y']] for wp in self.waypoint_list]
+            self._edges = [[(j, distance(coords[i], coords[j])) for j in np.flatnonzero(row).tolist()]
+                           for i, row in enumerate(self.adj_matrix)]
+        return self._edges
+
+    def path_lengths(self, start):
+        """length and number of edges of the shortest path from the start to every waypoint
+
+        :param start: start waypoint id
+        :return: (length, legs), arrays indexed like waypoint_list, inf length and -1 legs where it is not reachable
+        """
+        edges = self.edges()
+        inf = float('inf')
+        dist = [inf] * len(self.waypoint_list)
+        legs = [-1] * len(self.waypoint_list)
+        src = self.waypoint_idx[start]
+        dist[src] = 0.0
+        legs[src] = 0
+        queue = [(0.0, src)]
+        while queue:
+            d, i = heapq.heappop(queue)
+            if d > dist[i]:
+                continue
+            for j, length in edges[i]:
+                nd = d + length
+                if nd < dist[j]:
+                    dist[j] = nd
+                    legs[j] = legs[i] + 1
+                    heapq.heappush(queue, (nd, j))
+        return np.array(dist), np.array(legs, dtype=int)
+
+    def distances_to_stations(self):
+        """length of the shortest path from every waypoint to its closest charging station
+
+        multi-source Dijkstra from all stations over the reversed edges
+        :return: array indexed like waypoint_list, inf for waypoints that cannot reach any station
+        """
+        coords = [[wp['coords']['x'], wp['coords']['y']] for wp in self.waypoint_list]
+        dist = np.full(len(self.waypoint_list), np.inf)
+        queue = []
+        for station in self.stations:
+            dist[self.waypoint_idx[station]] = 0.0
+            queue.append((0.0, self.waypoint_idx[station]))
+        heapq.heapify(queue)
+        while queue:
+            d, j = heapq.heappop(queue)
+            if d > dist[j]:
+                continue
+            for i in np.flatnonzero(self.adj_matrix[:, j]).tolist():
+                nd = d + distance(coords[i], coords[j])
+                if nd < dist[i]:
+                    dist[i] = nd
+                    heapq.heappush(queue, (nd, i))
+        return dist
+
     def get_two_closest_waypoints(self, x, y):
         distances_to_locs = {}
         for waypoint in self.waypoints:
@@ -0,0 +1,139 @@
+#! /usr/bin/env python
+
+"""opt-in tracemalloc profiling of long missions, the growth of memory is attributed to the mission phases
+
+the controller marks the phases (task start, charging, adaptation) with phase(); while profiling, every mark and
+every interval seconds within a phase takes a snapshot and diffs it with the previous one, the allocation sites that
+grew the most are written to the report, which ends with the top sites of every phase over the whole run
+"""
+import time
+import tracemalloc
+from threading import Event, Lock, Thread
+
+# snapshots are only taken while a profile is running
+enabled = False
+
+# allocation sites reported per snapshot and per phase in the summary
+top = 10
+# frames kept per allocation, the sites are reported by their innermost frame
+frames = 1
+# seconds between the snapshots taken within a phase, 0 only snapshots at the phase marks
+interval = 60.0
+
+_lock = Lock()
+_report = None
+_phase = None
+_phase_start = None
+_previous = None
+_totals = {}
+_stop_event = None
+
+
+def _format_size(size):
+    if abs(size) < 1024:
+        return '{0} B'.format(size)
+    for unit in ('KiB', 'MiB'):
+        size /= 1024.0
+        if abs(size) < 1024:
+            return '{0:.1f} {1}'.format(size, unit)
+    return '{0:.1f} GiB'.format(size / 1024.0)
+
+
+def _site(size, count, frame):
+    return '  {0:>12}  {1:>+8} blocks  {2}\n'.format(('+' if size > 0 else '') + _format_size(size), count, frame)
+
+
+def _snapshot():
+    # the allocations of the profiling itself are left out
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ))
+
+
+def _take_snapshot(label):
+    """diff a new snapshot with the previous one and charge the difference to the current phase"""
+    global _previous
+    snapshot = _snapshot()
+    stats = snapshot.compare_to(_previous, 'lineno')
+    _previous = snapshot
+
+    totals = _totals.setdefault(_phase, {})
+    for stat in stats:
+        if stat.size_diff or stat.count_diff:
+            site = totals.get(stat.traceback[0], (0, 0))
+            totals[stat.traceback[0]] = (site[0] + stat.size_diff, site[1] + stat.count_diff)
+
+    current, peak = tracemalloc.get_traced_memory()
+    grown = [stat for stat in stats if stat.size_diff > 0][:top]
+    _report.write('{0} {1} ({2}) after {3:.1f} s: {4} traced, {5} peak, {6} since the last snapshot\n'.format(
+        time.strftime('%H:%M:%S'), _phase, label, time.time() - _phase_start, _format_size(current),
+        _format_size(peak), _format_size(sum(stat.size_diff for stat in stats))))
+    _report.write(''.join(_site(stat.size_diff, stat.count_diff, stat.traceback[0]) for stat in grown))
+    _report.flush()
+
+
+def _periodic(stop_event):
+    while not stop_event.wait(interval):
+        with _lock:
+            if enabled:
+                _take_snapshot('periodic')
+
+
+def start(path):
+    """start tracing allocations and write the report to path"""
+    global enabled, _report, _phase, _phase_start, _previous, _stop_event
+    with _lock:
+        if enabled:
+            return
+        tracemalloc.start(frames)
+        _report = open(path, 'w')
+        _phase = 'start'
+        _phase_start = time.time()
+        _previous = _snapshot()
+        _totals.clear()
+        enabled = True
+    if interval > 0:
+        _stop_event = Event()
+        thread = Thread(target=_periodic, args=(_stop_event,))
+        thread.daemon = True
+        thread.start()
+
+
+def phase(name):
+    """mark the start of a mission phase, the memory allocated until the next mark is charged to it"""
+    global _phase, _phase_start
+    if not enabled:
+        return
+    with _lock:
+        if not enabled:
+            return
+        _take_snapshot('end')
+        _phase = name
+        _phase_start = time.time()
+
+
+def stop():
+    """take the last snapshot, write the top sites of every phase and stop tracing"""
+    global enabled, _report, _previous, _stop_event
+    with _lock:
+        if not enabled:
+            return
+        _take_snapshot('end')
+        enabled = False
+        if _stop_event is not None:
+            _stop_event.set()
+            _stop_event = None
+
+        _report.write('\ntop allocation sites per phase\n')
+        for name in sorted(_totals):
+            sites = sorted(_totals[name].items(), key=lambda site: site[1][0], reverse=True)[:top]
+            _report.write('{0}: {1} in total\n'.format(
+                name, _format_size(sum(size for size, _ in _totals[name].values()))))
+            for traceback, (size, count) in sites:
+                if size > 0:
+                    _report.write(_site(size, count, traceback))
+        _report.close()
+        _report = None
+        _previous = None
+        tracemalloc.stop()
@@ -0,0 +1,237 @@
+#! /usr/bin/env python
+
+"""reorders the targets of a mission so that the predicted mission time is minimal"""
+import numpy as np
+
+from robotcontrol import instruction_generator
+from robotcontrol.duration_model import DurationModel
+
+# missions with up to this many targets are solved exactly with Held-Karp, larger ones with 2-opt/or-opt
+exact_limit = 15
+# longest segment that or-opt tries to relocate
+or_opt_segment = 3
+_eps = 1e-9
+
+
+def path_time(times, order):
+    """predicted time of visiting the nodes in order, starting from node 0
+
+    :param times: (n+1)x(n+1) travel time matrix, node 0 is the start of the mission
+    :param order: sequence of node indices in 1..n
+    :return:
+    """
+    tour = np.concatenate(([0], order)).astype(int)
+    return float(times[tour[:-1], tour[1:]].sum())
+
+
+def held_karp(times):
+    """exact dynamic programming over subsets of targets (open path from node 0)
+
+    the dp table is filled one subset size at a time, vectorized over all subsets of that size
+
+    :param times: (n+1)x(n+1) travel time matrix, node 0 is the start of the mission
+    :return: optimal order of the nodes 1..n
+    """
+    n = times.shape[0] - 1
+    if n == 0:
+        return np.zeros(0, dtype=int)
+    t = times[1:, 1:]
+    full = 1 << n
+    dp = np.full((full, n), np.inf)
+    parent = np.full((full, n), -1, dtype=np.int16)
+    bits = 1 << np.arange(n)
+    dp[bits, np.arange(n)] = times[0, 1:]
+
+    masks = np.arange(full)
+    popcount = np.zeros(full, dtype=np.int8)
+    for j in range(n):
+        popcount += (masks >> j) & 1
+
+    for size in range(2, n + 1):
+        layer = masks[popcount == size]
+        for j in range(n):
+            sel = layer[(layer & bits[j]) != 0]
+            cost = dp[sel ^ bits[j]] + t[:, j]
+            best = cost.argmin(axis=1)
+            dp[sel, j] = cost[np.arange(len(sel)), best]
+            parent[sel, j] = best
+
+    mask = full - 1
+    last = int(dp[mask].argmin())
+    order = []
+    while last >= 0:
+        order.append(last)
+        prev = int(parent[mask, last])
+        mask ^= 1 << last
+        last = prev
+    return np.array(order[::-1]) + 1
+
+
+def nearest_neighbour(times):
+    """greedy construction: always head to the closest unvisited target"""
+    n = times.shape[0] - 1
+    visited = np.zeros(n + 1, dtype=bool)
+    visited[0] = True
+    order = np.empty(n, dtype=int)
+    current = 0
+    for k in range(n):
+        row = np.where(visited, np.inf, times[current])
+        current = int(row.argmin())
+        visited[current] = True
+        order[k] = current
+    return order
+
+
+def _prefix_times(times, tour):
+    """cumulative travel time along the tour and along the reversed tour"""
+    fwd = np.concatenate(([0.0], np.cumsum(times[tour[:-1], tour[1:]])))
+    bwd = np.concatenate(([0.0], np.cumsum(times[tour[1:], tour[:-1]])))
+    return fwd, bwd
+
+
+def two_opt(times, order):
+    """reverses segments of the path as long as this shortens the predicted time
+
+    works with asymmetric travel times, reversed segments are priced with the backward edges
+
+    :param times: (n+1)x(n+1) travel time matrix, node 0 is the start of the mission
+    :param order: initial order of the nodes 1..n
+    :return: improved order
+    """
+    tour = np.concatenate(([0], order)).astype(int)
+    n = len(tour)
+    improved = True
+    while improved:
+        improved = False
+        fwd, bwd = _prefix_times(times, tour)
+        for i in range(1, n - 1):
+            j = np.arange(i + 1, n)
+            a = tour[i - 1]
+            # edge leaving the segment, the last node of an open path has no successor
+            nxt = np.append(tour[i + 2:], -1)
+            has_next = nxt >= 0
+            nxt = np.where(has_next, nxt, 0)
+            old = times[a, tour[i]] + fwd[j] - fwd[i] + np.where(has_next, times[tour[j], nxt], 0.0)
+            new = times[a, tour[j]] + bwd[j] - bwd[i] + np.where(has_next, times[tour[i], nxt], 0.0)
+            delta = new - old
+            k = int(delta.argmin())
+            if delta[k] < -_eps:
+                tour[i:j[k] + 1] = tour[i:j[k] + 1][::-1]
+                fwd, bwd = _prefix_times(times, tour)
+                improved = True
+    return tour[1:]
+
+
+def or_opt(times, order):
+    """moves segments of up to or_opt_segment consecutive targets to a better place in the path
+
+    :param times: (n+1)x(n+1) travel time matrix, node 0 is the start of the mission
+    :param order: initial order of the nodes 1..n
+    :return: improved order
+    """
+    tour = np.concatenate(([0], order)).astype(int)
+    n = len(tour)
+    improved = True
+    while improved:
+        improved = False
+        for length in range(1, or_opt_segment + 1):
+            i = 1
+            while i + length <= n:
+                seg = tour[i:i + length]
+                s, e = seg[0], seg[-1]
+                p = tour[i - 1]
+                if i + length < n:
+                    q = tour[i + length]
+                    removal_gain = times[p, s] + times[e, q] - times[p, q]
+                else:
+                    removal_gain = times[p, s]
+                rest = np.concatenate((tour[:i], tour[i + length:]))
+                # insert between rest[k] and rest[k+1], or after the last node
+                a = rest
+                b = np.append(rest[1:], -1)
+                has_next = b >= 0
+                b = np.where(has_next, b, 0)
+                insert_cost = times[a, s] + np.where(has_next, times[e, b] - times[a, b], 0.0)
+                insert_cost[i - 1] = np.inf
+                k = int(insert_cost.argmin())
+                if insert_cost[k] - removal_gain < -_eps:
+                    tour = np.concatenate((rest[:k + 1], seg, rest[k + 1:]))
+                    improved = True
+                i += 1
+    return tour[1:]
+
+
+def solve(times):
+    """order of the targets 1..n that minimises the predicted time of the mission"""
+    n = times.shape[0] - 1
+    if n <= 1:
+        return np.arange(1, n + 1)
+    # unreachable pairs are priced high instead of inf so that the local search deltas stay finite
+    finite = np.isfinite(times)
+    if not finite.all():
+        times = np.where(finite, times, 1e3 * (times[finite].max() + 1))
+    if n <= exact_limit:
+        return held_karp(times)
+
+    order = nearest_neighbour(times)
+    best = path_time(times, order)
+    while True:
+        order = or_opt(times, two_opt(times, order))
+        cost = path_time(times, order)
+        if cost >= best - _eps:
+            return order
+        best = cost
+
+
+class MissionPlanner:
+    """plans the visiting order of mission targets over predicted travel times"""
+
+    def __init__(self, instruction_server, map_server, speed=None, duration_model=None, mission_predictor=None):
+        """
+        :param speed: speed of the current configuration, the travel times are predicted for it
+        :param duration_model: fitted to the instruction db and the map on first use unless it is given
+        :param mission_predictor: when given, the planner shares its duration model, which is fitted on first use
+        """
+        self.instruction_server = instruction_server
+        self.map_server = map_server
+        self.speed = speed
+        self._duration_model = duration_model
+        self.mission_predictor = mission_predictor
+
+    @property
+    def duration_model(self):
+        if self._duration_model is None:
+            if self.mission_predictor is not None:
+                self._duration_model = self.mission_predictor.duration_model
+            else:
+                self._duration_model = DurationModel.fit(self.instruction_server, self.map_server)
+        return self._duration_model
+
+    def travel_time(self, wp_src, wp_tgt):
+        """predicted travel time at the current speed, the db times are recorded at the MoveAbsH speed"""
+        if wp_src == wp_tgt:
+            return 0.0
+        return self.duration_model.duration(wp_src, wp_tgt, self.speed or instruction_generator.speed)
+
+    def travel_time_matrix(self, start, targets):
+        """builds the (n+1)x(n+1) travel time matrix, node 0 is the start of the mission"""
+        nodes = [start] + list(targets)
+        unique = list(set(nodes))
+        pos = dict((wp, k) for k, wp in enumerate(unique))
+        pairwise = self.duration_model.durations(unique, unique, self.speed or instruction_generator.speed)
+        np.fill_diagonal(pairwise, 0.0)
+        idx = np.array([pos[wp] for wp in nodes])
+        return pairwise[np.ix_(idx, idx)]
+
+    def plan(self, start, targets):
+        """returns the targets in the order that minimises the predicted mission time"""
+        if len(targets) <= 1:
+            return list(targets)
+        times = self.travel_time_matrix(start, targets)
+        order = solve(times)
+        return [targets[k - 1] for k in order]
+
+    def predict(self, start, targets):
+        """predicted time of the mission visiting the targets in the given order"""
+        times = self.travel_time_matrix(start, targets)
+        return path_time(times, np.arange(1, len(targets) + 1))
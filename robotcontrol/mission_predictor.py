@@ -0,0 +1,98 @@
+#! /usr/bin/env python
+
+"""predicted time and energy of many candidate missions under many configurations at once
+
+a mission is a row of waypoint indices, the start first, padded with -1; the distances and overheads of its legs
+are gathered from the duration model and summed, the time under a configuration is then distance / speed + overhead
+"""
+import numpy as np
+
+from robotcontrol.duration_model import DurationModel
+
+
+class MissionPredictor:
+    """the duration model is fitted on the first prediction unless it is given, after that a batch is a few array
+    operations"""
+
+    def __init__(self, instruction_server, map_server, config_server, battery, duration_model=None):
+        self.instruction_server = instruction_server
+        self.map_server = map_server
+        self.waypoint_ids = [wp['node-id'] for wp in map_server.waypoint_list]
+        self.waypoint_idx = dict((wp, i) for i, wp in enumerate(self.waypoint_ids))
+
+        config_ids = [conf['config_id'] for conf in config_server.db]
+        self.config_idx = dict((conf_id, k) for k, conf_id in enumerate(config_ids))
+        self.config_ids = np.array(config_ids)
+        self.inverse_speed = 1.0 / np.array([config_server.get_speed(conf_id) for conf_id in config_ids],
+                                            dtype=np.float64)
+        # Ah drawn per second under each configuration
+        self.rate = np.array([battery.discharge_rate(config_server.get_power_load(conf_id)) for conf_id in config_ids],
+                             dtype=np.float64)
+        if duration_model is not None and duration_model.waypoint_ids != self.waypoint_ids:
+            raise ValueError('the duration model was fitted to another map')
+        self._duration_model = duration_model
+        self._legs = None
+
+    @property
+    def duration_model(self):
+        if self._duration_model is None:
+            self._duration_model = DurationModel.fit(self.instruction_server, self.map_server)
+        return self._duration_model
+
+    @property
+    def legs(self):
+        """distance and overhead of the model with an extra zero row and column, the leg to the -1 padding"""
+        if self._legs is None:
+            model = self.duration_model
+            n = len(self.waypoint_ids)
+            distance = np.zeros((n + 1, n + 1))
+            overhead = np.zeros((n + 1, n + 1))
+            distance[:n, :n] = model.distance
+            overhead[:n, :n] = model.overhead
+            self._legs = distance, overhead
+        return self._legs
+
+    def encode(self, missions):
+        """(len(missions), longest + 1) array of waypoint indices, -1 after the end of the shorter missions
+
+        :param missions: lists of waypoint ids, each starting with the start of the mission
+        """
+        encoded = np.full((len(missions), max(len(mission) for mission in missions)), -1, dtype=np.intp)
+        for m, mission in enumerate(missions):
+            encoded[m, :len(mission)] = [self.waypoint_idx[wp] for wp in mission]
+        return encoded
+
+    def config_indices(self, config_ids):
+        config_ids = np.asarray(config_ids)
+        order = np.argsort(self.config_ids)
+        k = np.searchsorted(self.config_ids, config_ids, sorter=order)
+        k = order[np.minimum(k, len(order) - 1)]
+        if np.any(self.config_ids[k] != config_ids):
+            raise KeyError('unknown configuration in {0}'.format(config_ids[self.config_ids[k] != config_ids]))
+        return k
+
+    def route_sums(self, missions):
+        """total distance and total overhead of the legs of every mission
+
+        :param missions: (M, L) integer array of waypoint indices as built by encode
+        """
+        missions = np.asarray(missions, dtype=np.intp)
+        n = len(self.waypoint_ids)
+        distance, overhead = self.legs
+        # -1 becomes the padding row and column, and the legs become flat indices into the padded arrays
+        missions = np.where(missions < 0, n, missions)
+        flat = missions[:, :-1] * (n + 1) + missions[:, 1:]
+        return distance.take(flat).sum(axis=1), overhead.take(flat).sum(axis=1)
+
+    def predict(self, missions, config_ids):
+        """predicted time (s) and energy (Ah) of every mission under every configuration
+
+        :param missions: (M, L) integer array of waypoint indices as built by encode
+        :param config_ids: (C,) array of configuration ids
+        :return: (time, energy), both (M, C) arrays, inf for missions with a pair that has no route
+        """
+        c = self.config_indices(np.atleast_1d(config_ids))
+        distance, overhead = self.route_sums(missions)
+        time = distance[:, None] * self.inverse_speed[c][None, :] + overhead[:, None]
+        energy = time * self.rate[c][None, :]
+        return time, energy
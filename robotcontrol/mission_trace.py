@@ -0,0 +1,201 @@
+#! /usr/bin/env python
+
+"""columnar mission traces: append-only fixed-schema record files and an mmap-backed reader
+
+a trace is a directory with a schema file (trace.json) and one binary file per record kind,
+each holding back to back fixed-size records, so a crash loses at most the unflushed chunk
+"""
+import json
+import os
+import time
+from threading import Lock
+
+import numpy as np
+
+schema_file = 'trace.json'
+# bytes of the start and target fields of a new trace, widened to the longest waypoint id of the map
+waypoint_size = 32
+
+
+def task_dtype(size=waypoint_size):
+    return np.dtype([('timestamp', '<f8'), ('mission', '<i4'), ('task', '<i4'),
+                     ('start', 'S{0}'.format(size)), ('target', 'S{0}'.format(size)), ('x', '<f8'), ('y', '<f8'),
+                     ('task_accomplished', '?'), ('dist_to_target', '<f8')])
+
+
+TASK_DTYPE = task_dtype()
+
+TELEMETRY_DTYPE = np.dtype([('timestamp', '<f8'), ('mission', '<i4'), ('charge', '<f8'),
+                            ('charging', '?'), ('config_id', '<i4')])
+
+# what the controller observed (action results, poses, Rainbow signals) and decided (charging, adapt)
+OBSERVATION_DTYPE = np.dtype([('timestamp', '<f8'), ('mission', '<i4'), ('kind', 'S16'), ('value', '<f8'),
+                              ('x', '<f8'), ('y', '<f8'), ('yaw', '<f8')])
+
+record_kinds = {
+    'tasks': TASK_DTYPE,
+    'telemetry': TELEMETRY_DTYPE,
+    'observations': OBSERVATION_DTYPE,
+}
+
+
+def _describe(dtype):
+    return [[name, dtype.fields[name][0].str] for name in dtype.names]
+
+
+class _ColumnFile:
+    """buffers records of one kind in a preallocated chunk and appends full chunks to the file"""
+
+    def __init__(self, path, dtype, chunk_size):
+        self.file = open(path, 'ab')
+        # drop a partial record left by a crash so that the appended records stay aligned
+        size = self.file.tell()
+        if size % dtype.itemsize:
+            self.file.truncate(size - size % dtype.itemsize)
+        self.chunk = np.zeros(chunk_size, dtype=dtype)
+        self.size = 0
+
+    def append(self, values):
+        self.chunk[self.size] = values
+        self.size += 1
+        if self.size == len(self.chunk):
+            self.flush()
+
+    def flush(self):
+        if self.size:
+            self.file.write(self.chunk[:self.size].tobytes())
+            self.size = 0
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class MissionTraceWriter:
+    """streams per-task and per-telemetry records of missions into a trace directory
+
+    the records come from the mission thread and the battery subscriber thread, every method takes the lock
+    """
+
+    def __init__(self, path, chunk_size=256, flush_interval=10.0, waypoint_ids=()):
+        """
+        :param waypoint_ids: the waypoints of the map, the start and target fields of a new trace fit the longest
+        """
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        if os.path.exists(os.path.join(path, schema_file)):
+            # appending to an existing trace keeps its record layout
+            existing = MissionTraceReader(path)
+            self.dtypes = dict((kind, existing.dtypes.get(kind, dtype)) for kind, dtype in record_kinds.items())
+            tasks = existing.tasks
+        else:
+            size = max([waypoint_size] + [len(wp.encode()) for wp in waypoint_ids])
+            self.dtypes = dict(record_kinds, tasks=task_dtype(size))
+            tasks = ()
+        schema = dict((kind, _describe(dtype)) for kind, dtype in self.dtypes.items())
+        with open(os.path.join(path, schema_file), 'w') as schema_json:
+            json.dump({'version': 1, 'records': schema}, schema_json)
+        self.waypoint_size = self.dtypes['tasks']['start'].itemsize
+
+        self.columns = dict((kind, _ColumnFile(os.path.join(path, kind + '.bin'), dtype, chunk_size))
+                            for kind, dtype in self.dtypes.items())
+        # flush at least every flush_interval seconds even if the chunks are not full
+        self.flush_interval = flush_interval
+        self.last_flush = time.time()
+        # appending to an existing trace continues its mission numbering
+        self.mission = int(tasks['mission'].max()) if len(tasks) else -1
+        self.task = 0
+        self.lock = Lock()
+
+    def begin_mission(self):
+        with self.lock:
+            self.mission += 1
+            self.task = 0
+            return self.mission
+
+    def record_task(self, start, target, x, y, task_accomplished, dist_to_target, timestamp=None):
+        for wp in (start, target):
+            if len(wp.encode()) > self.waypoint_size:
+                raise ValueError('waypoint id {0} is longer than the {1} bytes of the trace'.format(
+                    wp, self.waypoint_size))
+        if timestamp is None:
+            timestamp = time.time()
+        with self.lock:
+            self.columns['tasks'].append((timestamp, self.mission, self.task, start, target, x, y,
+                                          task_accomplished, dist_to_target))
+            self.task += 1
+            self._maybe_flush()
+
+    def record_telemetry(self, timestamp, charge, charging, config_id):
+        with self.lock:
+            self.columns['telemetry'].append((timestamp, self.mission, charge, charging, config_id))
+            self._maybe_flush()
+
+    def record_observation(self, kind, value=0.0, x=0.0, y=0.0, yaw=0.0, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        with self.lock:
+            self.columns['observations'].append((timestamp, self.mission, kind, value, x, y, yaw))
+            self._maybe_flush()
+
+    def _maybe_flush(self):
+        if time.time() - self.last_flush > self.flush_interval:
+            self._flush()
+
+    def _flush(self):
+        for column in self.columns.values():
+            column.flush()
+        self.last_flush = time.time()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        with self.lock:
+            for column in self.columns.values():
+                column.close()
+
+
+class MissionTraceReader:
+    """memory maps the record files of a trace, columns are read lazily without parsing"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, schema_file)) as schema_json:
+            schema = json.load(schema_json)['records']
+        self.dtypes = dict((kind, np.dtype([tuple(field) for field in fields])) for kind, fields in schema.items())
+        self.tasks = self._map('tasks')
+        self.telemetry = self._map('telemetry')
+        self.observations = self._map('observations')
+
+    def _map(self, kind):
+        dtype = self.dtypes.get(kind, record_kinds[kind])
+        file_path = os.path.join(self.path, kind + '.bin')
+        if not os.path.exists(file_path):
+            return np.zeros(0, dtype=dtype)
+        # a crash may leave a partially written record at the end, it is ignored
+        count = os.path.getsize(file_path) // dtype.itemsize
+        if count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(file_path, dtype=dtype, mode='r', shape=(count,))
+
+    def missions(self):
+        return np.unique(self.tasks['mission'])
+
+    def mission_tasks(self, mission):
+        return self.tasks[self.tasks['mission'] == mission]
+
+    def mission_telemetry(self, mission):
+        return self.telemetry[self.telemetry['mission'] == mission]
+
+    def mission_observations(self, mission):
+        return self.observations[self.observations['mission'] == mission]
+
+    def locs(self, mission):
+        """the tasks of a mission in the list of dicts form returned by the mission loops"""
+        return [{"start": t['start'].decode(), "target": t['target'].decode(), "x": float(t['x']), "y": float(t['y']),
+                 "task_accomplished": bool(t['task_accomplished']), "dist_to_target": float(t['dist_to_target'])}
+                for t in self.mission_tasks(mission)]
@@ -0,0 +1,43 @@
+#! /usr/bin/env python
+
+"""yaw-only pose conversions for a robot on a flat floor
+
+closed-form equivalents of the sxyz conversions in transformations.py for rotations about z only,
+for single values and for arrays
+"""
+import math
+
+import numpy as np
+
+# (x, y, z, w) of the rotation by zero
+identity_quaternion = (0.0, 0.0, 0.0, 1.0)
+
+
+def yaw_from_quaternion(x, y, z, w):
+    """yaw of the quaternion, the same as the third sxyz euler angle whenever the pitch is not +-pi/2"""
+    return math.atan2(2.0 * (w * z + x * y), w * w + x * x - y * y - z * z)
+
+
+def quaternion_from_yaw(yaw):
+    """(x, y, z, w) of the rotation by yaw about z"""
+    half = 0.5 * yaw
+    return 0.0, 0.0, math.sin(half), math.cos(half)
+
+
+def yaws_from_quaternions(quaternions, out=None):
+    """yaw of every (x, y, z, w) row of the (..., 4) array"""
+    q = np.asarray(quaternions, dtype=np.float64)
+    x, y, z, w = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    return np.arctan2(2.0 * (w * z + x * y), w * w + x * x - y * y - z * z, out=out)
+
+
+def quaternions_from_yaws(yaws, out=None):
+    """(..., 4) array of the (x, y, z, w) rotations by the yaws about z"""
+    half = 0.5 * np.asarray(yaws, dtype=np.float64)
+    if out is None:
+        out = np.empty(half.shape + (4, ), dtype=np.float64)
+    out[..., 0] = 0.0
+    out[..., 1] = 0.0
+    np.sin(half, out=out[..., 2])
+    np.cos(half, out=out[..., 3])
+    return out
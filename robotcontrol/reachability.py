@@ -0,0 +1,48 @@
+#! /usr/bin/env python
+
+"""precomputed table of the charge needed to reach a charging station from every waypoint under every configuration"""
+import numpy as np
+
+
+class ReachabilityTable:
+    """built once per (map, configuration list, battery), the runtime check is an array lookup and a comparison"""
+
+    def __init__(self, map_server, config_server, battery):
+        self.waypoint_ids = [wp['node-id'] for wp in map_server.waypoint_list]
+        self.waypoint_idx = dict(map_server.waypoint_idx)
+        self.coords = np.array([[wp['coords']['x'], wp['coords']['y']] for wp in map_server.waypoint_list])
+
+        config_ids = [conf['config_id'] for conf in config_server.db]
+        self.config_idx = dict((conf_id, k) for k, conf_id in enumerate(config_ids))
+        speed = np.array([config_server.get_speed(conf_id) for conf_id in config_ids])
+        rate = np.array([battery.discharge_rate(config_server.get_power_load(conf_id)) for conf_id in config_ids])
+        self.speed = speed
+
+        # Ah needed per meter under each configuration
+        self.charge_per_meter = rate / speed
+        self.dist_to_station = map_server.distances_to_stations()
+        # required_charge[w, c]: minimum charge (Ah) to get from waypoint w to a station under configuration c
+        self.required_charge = self.dist_to_station[:, None] * self.charge_per_meter[None, :]
+
+    def nearest_waypoint(self, x, y):
+        """index of the waypoint closest to the location"""
+        return int(((self.coords[:, 0] - x) ** 2 + (self.coords[:, 1] - y) ** 2).argmin())
+
+    def required(self, waypoint_id, config_id):
+        """minimum charge (Ah) to reach a station from the waypoint under the configuration"""
+        return self.required_charge[self.waypoint_idx[waypoint_id], self.config_idx[config_id]]
+
+    def margin(self, loc, charge, config_id, rate=None):
+        """charge (Ah) left over after driving from loc, through its closest waypoint, to a station
+
+        :param rate: measured discharge rate (Ah/s) to use instead of the one from the power model
+        """
+        w = self.nearest_waypoint(loc['x'], loc['y'])
+        c = self.config_idx[config_id]
+        to_waypoint = np.hypot(self.coords[w, 0] - loc['x'], self.coords[w, 1] - loc['y'])
+        if rate is None:
+            return charge - self.required_charge[w, c] - to_waypoint * self.charge_per_meter[c]
+        return charge - (self.dist_to_station[w] + to_waypoint) * rate / self.speed[c]
+
+    def can_reach(self, loc, charge, config_id, rate=None):
+        return self.margin(loc, charge, config_id, rate=rate) >= 0
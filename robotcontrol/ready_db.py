@@ -1,12 +1,16 @@
 import json
+from robotcontrol import cache
 from robotcontrol.constants import AdaptationLevel
 
 
+def _parse(ready_db):
+    with open(ready_db) as db:
+        return json.load(db)
+
+
 class ReadyDB:
     def __init__(self, ready_db):
-        with open(ready_db) as db:
-            data = json.load(db)
-        self.db = data
+        self.db = cache.load('ready', ready_db, lambda: _parse(ready_db))
 
     def get_budget(self):
         return self.db["discharge-budget"]
@@ -0,0 +1,224 @@
+#! /usr/bin/env python
+
+"""offline replay of recorded missions through the mission loops of BotController, without gazebo"""
+import time
+from collections import deque
+
+from robotcontrol.bot_controller import BotController
+from robotcontrol.bot_interface import ControlInterface
+from robotcontrol.mission_trace import MissionTraceReader
+
+# observations the controller reads from the world, everything else in a trace is a decision it took
+observed_kinds = ('ig_result', 'movebase_result', 'pose', 'config', 'rainbow')
+decision_kinds = ('adapt', 'go_charging')
+
+
+class ReplayDivergence(RuntimeError):
+    """the replayed controller asked for an observation the recorded mission does not have"""
+    pass
+
+
+class ReplayInterface(ControlInterface):
+    """stands in for ControlInterface and serves the observations and battery telemetry of a recorded mission
+
+    the battery telemetry is applied in timestamp order up to the observation that is served next,
+    so battery driven decisions see the same charge they saw when the mission was recorded
+    """
+
+    def __init__(self, observations, telemetry, default_config):
+        self.init_state(default_config)
+
+        # the action clients are never used, any non-None value skips connecting to the servers
+        self.movebase_client = 'replay'
+        self.ig_client = 'replay'
+
+        self.queues = dict((kind, deque()) for kind in observed_kinds)
+        for obs in observations:
+            kind = obs['kind'].decode()
+            if kind in self.queues:
+                self.queues[kind].append(obs)
+        self.recorded_telemetry = telemetry
+        self.telemetry_pos = 0
+        self.clock = telemetry[0]['timestamp'] if len(telemetry) else 0.0
+        self.decisions = []
+
+    def advance(self, timestamp):
+        """apply the recorded battery updates up to timestamp"""
+        telemetry = self.recorded_telemetry
+        while self.telemetry_pos < len(telemetry) and telemetry[self.telemetry_pos]['timestamp'] <= timestamp:
+            record = telemetry[self.telemetry_pos]
+            self.update_charge(float(record['charge']), float(record['timestamp']))
+            self.telemetry_pos += 1
+        self.clock = max(self.clock, timestamp)
+
+    def advance_until_charged(self):
+        """apply the recorded battery updates until the battery is full, the recorded mission waited for them"""
+        telemetry = self.recorded_telemetry
+        while self.battery_charge != self.battery_capacity:
+            if self.telemetry_pos >= len(telemetry):
+                raise ReplayDivergence("The recorded battery was not fully charged at t={0}".format(self.clock))
+            self.advance(telemetry[self.telemetry_pos]['timestamp'])
+
+    def next_observation(self, kind):
+        if not self.queues[kind]:
+            raise ReplayDivergence("No recorded {0} observation left at t={1}".format(kind, self.clock))
+        obs = self.queues[kind].popleft()
+        self.advance(obs['timestamp'])
+        return obs
+
+    def remaining_observations(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def observe(self, kind, value=0.0, x=0.0, y=0.0, yaw=0.0):
+        if kind in decision_kinds:
+            self.decisions.append((kind, value))
+
+    def connect_to_gazebo(self, timeout):
+        return True
+
+    def connect_to_navigation_server(self):
+        return True
+
+    def connect_to_ig_action_server(self):
+        return True
+
+    def move_to_point(self, x, y):
+        return bool(self.next_observation('movebase_result')['value'])
+
+    def move_bot_with_igcode(self, igcode, active_cb=None, done_cb=None):
+        return bool(self.next_observation('ig_result')['value'])
+
+    def send_instructions(self, igcode, active_cb=None, done_cb=None):
+        pass
+
+    def get_bot_state(self):
+        obs = self.next_observation('pose')
+        self.last_loc = {"x": float(obs['x']), "y": float(obs['y'])}
+        return float(obs['x']), float(obs['y']), float(obs['yaw']), float(obs['value'])
+
+    def get_current_configuration(self, current_or_historical):
+        self.current_config = int(self.next_observation('config')['value'])
+        return self.current_config
+
+    def set_current_configuration(self, config_id):
+        self.current_config = config_id
+        return True
+
+    def set_charging(self, charging):
+        self.is_charging = charging
+        return True
+
+    def set_charge(self, charge):
+        return True
+
+    def set_power_load(self, load):
+        return True
+
+    def set_charging_rate(self, charge_rate):
+        return True
+
+
+class ReplayController(BotController):
+    """BotController whose Rainbow signals and charging waits come from the recorded mission"""
+
+    def wait_until_rainbow_is_done(self):
+        return bool(self.gazebo.next_observation('rainbow')['value'])
+
+    def update_current_target_waypoint_and_resetting_previous(self, current_waypoint):
+        pass
+
+    def is_fully_charged(self):
+        # the recorded mission went on once the battery was full, the recorded updates until then are applied at once
+        self.gazebo.advance_until_charged()
+        return BotController.is_fully_charged(self)
+
+
+mission_loops = {
+    'reactive': 'go_instructions_multiple_tasks_reactive',
+    'reactive_fancy': 'go_instructions_multiple_tasks_reactive_fancy',
+    'adaptive': 'go_instructions_multiple_tasks_adaptive',
+}
+
+
+def replay_mission(reader, mission, loop, map_server, instruction_server, config_server, robot_battery):
+    """run a recorded mission through a mission loop and check that the same decisions come out
+
+    :param reader: MissionTraceReader of the recorded trace
+    :param loop: one of mission_loops
+    :return: dict with the replayed tasks and decisions, the mismatches and the replay time
+    """
+    tasks = reader.mission_tasks(mission)
+    observations = reader.mission_observations(mission)
+    recorded_locs = reader.locs(mission)
+    recorded_decisions = [(o['kind'].decode(), float(o['value'])) for o in observations
+                          if o['kind'].decode() in decision_kinds]
+    if len(tasks) == 0:
+        raise ValueError('The mission {0} has no recorded tasks'.format(mission))
+
+    gazebo = ReplayInterface(observations, reader.mission_telemetry(mission), config_server.get_default_config())
+    bot = ReplayController(map_server=map_server, instruction_server=instruction_server,
+                           config_server=config_server, robot_battery=robot_battery, gazebo=gazebo)
+    bot.level = 'c' if loop == 'adaptive' else None
+
+    start = recorded_locs[0]["start"]
+    targets = [loc["target"] for loc in recorded_locs]
+
+    mismatches = []
+    start_time = time.time()
+    try:
+        number_of_tasks_accomplished, locs = getattr(bot, mission_loops[loop])(start, targets)
+    except ReplayDivergence as e:
+        mismatches.append(str(e))
+        locs = []
+    elapsed = time.time() - start_time
+
+    for k, (recorded, replayed) in enumerate(zip(recorded_locs, locs)):
+        if recorded["task_accomplished"] != replayed["task_accomplished"] or recorded["start"] != replayed["start"]:
+            mismatches.append("Task {0}: recorded {1}->{2} {3}, replayed {4}->{5} {6}".format(
+                k, recorded["start"], recorded["target"], recorded["task_accomplished"],
+                replayed["start"], replayed["target"], replayed["task_accomplished"]))
+    if len(locs) != len(recorded_locs) and locs:
+        mismatches.append("Recorded {0} tasks, replayed {1}".format(len(recorded_locs), len(locs)))
+    if [(kind, value) for kind, value in gazebo.decisions] != recorded_decisions:
+        mismatches.append("Recorded decisions {0}, replayed {1}".format(recorded_decisions, gazebo.decisions))
+    if gazebo.remaining_observations():
+        mismatches.append("{0} recorded observations were not consumed".format(gazebo.remaining_observations()))
+
+    return {"mission": int(mission), "tasks": locs, "decisions": gazebo.decisions,
+            "matches": len(mismatches) == 0, "mismatches": mismatches, "elapsed": elapsed}
+
+
+def replay_trace(trace_dir, loop, map_server, instruction_server, config_server, robot_battery):
+    """replay every mission of a trace directory"""
+    reader = MissionTraceReader(trace_dir)
+    return [replay_mission(reader, mission, loop, map_server, instruction_server, config_server, robot_battery)
+            for mission in reader.missions()]
+
+
+def main():
+    import argparse
+    from robotcontrol import bot_controller
+    from robotcontrol.mapserver import MapServer
+    from robotcontrol.instructions_db import InstructionDB
+    from robotcontrol.configuration_db import ConfigurationDB
+    from robotcontrol.battery_db import BatteryDB
+
+    parser = argparse.ArgumentParser(description='Replay recorded missions through the mission loops')
+    parser.add_argument('trace', help='The trace directory recorded with --trace')
+    parser.add_argument('--loop', choices=sorted(mission_loops), default='reactive', help='The mission loop to replay')
+    args = parser.parse_args()
+
+    results = replay_trace(args.trace, args.loop,
+                           MapServer(bot_controller.map_file),
+                           InstructionDB(bot_controller.instructions_db_file),
+                           ConfigurationDB(bot_controller.config_list),
+                           BatteryDB(bot_controller.world_file, battery_name=bot_controller.battery_name))
+    for res in results:
+        print("Mission {0}: {1} in {2:.6f} seconds".format(res["mission"], "same decisions" if res["matches"] else "diverged",
+                                                           res["elapsed"]))
+        for mismatch in res["mismatches"]:
+            print("    " + mismatch)
+
+
+if __name__ == '__main__':
+    main()
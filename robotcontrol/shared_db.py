@@ -0,0 +1,418 @@
+#! /usr/bin/env python
+
+"""publishes the map, instruction and configuration databases in shared memory once per host
+
+the compact forms (waypoint ids, coordinates, adjacency, instruction metadata and text, configuration columns)
+are written into one multiprocessing.shared_memory block per database, other controller processes attach to the
+blocks and read them through numpy views without parsing or copying. Every block keeps a reference count of the
+processes attached to it and the last one to close it removes it.
+"""
+import atexit
+import fcntl
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import time
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+from robotcontrol.mapserver import MapServer
+from robotcontrol.instructions_db import InstructionDB
+from robotcontrol.configuration_db import ConfigurationDB
+from robotcontrol.instrumentation import timed
+
+# each block starts with the reference count and the length of the json header describing its arrays
+_preamble = struct.Struct('<qq')
+_align = 8
+block_suffixes = {'map': '_m', 'instructions': '_i', 'configurations': '_c'}
+
+
+def shared_name(map_file, instructions_file, config_file):
+    """name prefix of the blocks of a set of database files, it changes whenever one of the files changes"""
+    digest = hashlib.md5()
+    for path in (map_file, instructions_file, config_file):
+        st = os.stat(path)
+        digest.update('{0}:{1}:{2};'.format(os.path.abspath(path), st.st_mtime_ns, st.st_size).encode())
+    return 'rc_' + digest.hexdigest()[:16]
+
+
+class _Lock:
+    """inter-process lock of a block, guards its reference count"""
+
+    def __init__(self, name):
+        self.path = os.path.join(tempfile.gettempdir(), name + '.lock')
+
+    def __enter__(self):
+        self.file = open(self.path, 'a')
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+        return False
+
+
+def _open(name, create=False, size=0):
+    """the reference count decides when a block is removed, not the resource tracker of whichever process exits first"""
+    try:
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    except TypeError:
+        # before python 3.13 every attached block is registered with the resource tracker
+        shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class SharedBlock:
+    """a shared memory block holding named numpy arrays"""
+
+    def __init__(self, shm, lock):
+        self.shm = shm
+        self.lock = lock
+        header_size = _preamble.unpack_from(shm.buf, 0)[1]
+        header = json.loads(bytes(shm.buf[_preamble.size:_preamble.size + header_size]).decode())
+        self.arrays = {}
+        for name, (dtype, shape, offset) in header.items():
+            self.arrays[name] = np.ndarray(tuple(shape), dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            self.arrays[name].flags.writeable = False
+
+    @classmethod
+    def create(cls, name, arrays):
+        layout = {}
+        offset = 0
+        for key, array in arrays.items():
+            layout[key] = [array.dtype.str, list(array.shape), offset]
+            offset += (array.nbytes + _align - 1) // _align * _align
+        # the header holds the absolute offsets, so its length must be known before they are fixed
+        header_size = len(json.dumps(layout)) + 64
+        start = (_preamble.size + header_size + _align - 1) // _align * _align
+        for key in layout:
+            layout[key][2] += start
+        header = json.dumps(layout).encode()
+
+        shm = _open(name, create=True, size=max(start + offset, 1))
+        _preamble.pack_into(shm.buf, 0, 1, len(header))
+        shm.buf[_preamble.size:_preamble.size + len(header)] = header
+        for key, array in arrays.items():
+            _, shape, array_offset = layout[key]
+            np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf, offset=array_offset)[...] = array
+        return cls(shm, _Lock(name))
+
+    @classmethod
+    def attach(cls, name):
+        lock = _Lock(name)
+        with lock:
+            shm = _open(name)
+            refs = _preamble.unpack_from(shm.buf, 0)[0]
+            struct.pack_into('<q', shm.buf, 0, refs + 1)
+        return cls(shm, lock)
+
+    def close(self):
+        """detach from the block, it is removed when the last process detaches"""
+        self.arrays = {}
+        with self.lock:
+            refs = _preamble.unpack_from(self.shm.buf, 0)[0] - 1
+            struct.pack_into('<q', self.shm.buf, 0, refs)
+            if refs <= 0:
+                if getattr(self.shm, '_track', True):
+                    # unlink unregisters the block from the resource tracker, which _open already did
+                    resource_tracker.register(self.shm._name, 'shared_memory')
+                self.shm.unlink()
+        try:
+            self.shm.close()
+        except BufferError:
+            # views of the block are still referenced, the mapping goes away with them
+            pass
+
+
+def _strings(values):
+    """utf-8 blob and offsets of a list of strings, string k is blob[offsets[k]:offsets[k + 1]]"""
+    encoded = [value.encode() for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8).copy(), offsets
+
+
+def _string(blob, offsets, k):
+    return blob[offsets[k]:offsets[k + 1]].tobytes().decode()
+
+
+def map_arrays(map_server):
+    ids = [wp['node-id'] for wp in map_server.waypoint_list]
+    return {
+        'ids': np.array(ids, dtype=np.bytes_),
+        'coords': np.array([[wp['coords']['x'], wp['coords']['y']] for wp in map_server.waypoint_list],
+                           dtype=np.float64).reshape(len(ids), 2),
+        'adj': map_server.adj_matrix.astype(np.uint8),
+        'stations': np.array([map_server.waypoint_idx[s] for s in getattr(map_server, 'stations', [])], dtype=np.int32),
+    }
+
+
+def instruction_arrays(instruction_server):
+    keys = sorted(instruction_server.db)
+    rows = [instruction_server.db[key] for key in keys]
+    instructions, instruction_offsets = _strings([row['instructions'] for row in rows])
+    paths, path_offsets = _strings(['\n'.join(row['path']) for row in rows])
+    return {
+        'keys': np.array(keys, dtype=np.bytes_),
+        'time': np.array([row['time'] for row in rows], dtype=np.float64),
+        'start_dir': np.array([row['start-dir'] for row in rows], dtype=np.float64),
+        'instructions': instructions,
+        'instruction_offsets': instruction_offsets,
+        'paths': paths,
+        'path_offsets': path_offsets,
+    }
+
+
+def configuration_arrays(config_server):
+    return {
+        'config_id': np.array([conf['config_id'] for conf in config_server.db], dtype=np.int64),
+        'speed': np.array([conf['speed'] for conf in config_server.db], dtype=np.float64),
+        'power_load_w': np.array([conf['power_load_w'] for conf in config_server.db], dtype=np.float64),
+        'power_load': np.array([conf.get('power_load', 0.0) for conf in config_server.db], dtype=np.float64),
+    }
+
+
+class SharedMapServer(MapServer):
+    """MapServer reading the waypoints and the adjacency matrix from a shared block"""
+
+    def __init__(self, block):
+        arrays = block.arrays
+        self.coords = arrays['coords']
+        self.adj_matrix = arrays['adj']
+        self.ids = [wp.decode() for wp in arrays['ids'].tolist()]
+        self.waypoint_idx = dict((wp, i) for i, wp in enumerate(self.ids))
+        self.stations = [self.ids[i] for i in arrays['stations'].tolist()]
+        self.waypoints = self.waypoint_idx.keys()
+        self._waypoint_list = None
+
+    @property
+    def waypoint_list(self):
+        # only built for the methods that walk the json form of the map
+        if self._waypoint_list is None:
+            self._waypoint_list = [{'node-id': wp,
+                                    'coords': {'x': float(self.coords[i, 0]), 'y': float(self.coords[i, 1])},
+                                    'connected-to': [self.ids[j] for j in np.flatnonzero(self.adj_matrix[i]).tolist()]}
+                                   for i, wp in enumerate(self.ids)]
+        return self._waypoint_list
+
+    def waypoint_to_coords(self, waypoint_id):
+        if waypoint_id not in self.waypoint_idx:
+            raise KeyError('The specified waypointID does not exist')
+        i = self.waypoint_idx[waypoint_id]
+        return {'x': float(self.coords[i, 0]), 'y': float(self.coords[i, 1])}
+
+    def is_waypoint(self, waypoint_id):
+        return waypoint_id in self.waypoint_idx
+
+    def idx_to_waypoint(self, idx):
+        return self.ids[idx]
+
+
+class SharedInstructionDB(InstructionDB):
+    """InstructionDB looking the keys up with a binary search over the shared sorted key column, it is read-only"""
+
+    writable = False
+
+    def __init__(self, block):
+        self.arrays = block.arrays
+        self.keys = self.arrays['keys']
+        self._db = None
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = dict((self.keys[k].decode(), self._row(k)) for k in range(len(self.keys)))
+        return self._db
+
+    def _row(self, k):
+        return {'path': self._path(k), 'start-dir': float(self.arrays['start_dir'][k]),
+                'time': float(self.arrays['time'][k]), 'instructions': self._instructions(k)}
+
+    def _find(self, wp_src, wp_tgt):
+        key = ("%s_to_%s" % (wp_src, wp_tgt)).encode()
+        k = int(np.searchsorted(self.keys, key))
+        if k < len(self.keys) and self.keys[k] == key:
+            return k
+        return -1
+
+    def _path(self, k):
+        return _string(self.arrays['paths'], self.arrays['path_offsets'], k).split('\n')
+
+    def _instructions(self, k):
+        return _string(self.arrays['instructions'], self.arrays['instruction_offsets'], k)
+
+    @timed('instruction_db.get_path')
+    def get_path(self, wp_src, wp_tgt):
+        k = self._find(wp_src, wp_tgt)
+        if k == -1:
+            return None
+        return self._path(k)
+
+    @timed('instruction_db.get_instructions')
+    def get_instructions(self, wp_src, wp_tgt):
+        k = self._find(wp_src, wp_tgt)
+        if k == -1:
+            return None
+        return self._instructions(k)
+
+    @timed('instruction_db.get_predicted_duration')
+    def get_predicted_duration(self, wp_src, wp_tgt):
+        k = self._find(wp_src, wp_tgt)
+        if k == -1:
+            return -1
+        return float(self.arrays['time'][k])
+
+    @timed('instruction_db.get_start_heading')
+    def get_start_heading(self, wp_src, wp_tgt):
+        k = self._find(wp_src, wp_tgt)
+        if k == -1:
+            return -1
+        return float(self.arrays['start_dir'][k])
+
+    def put(self, wp_src, wp_tgt, entry):
+        raise RuntimeError('The shared instruction db is read-only, cannot put {0}_to_{1}'.format(wp_src, wp_tgt))
+
+    def delete(self, wp_src, wp_tgt):
+        raise RuntimeError('The shared instruction db is read-only, cannot delete {0}_to_{1}'.format(wp_src, wp_tgt))
+
+    def compact(self):
+        raise RuntimeError('The shared instruction db is read-only, it has no journal to compact')
+
+
+class SharedConfigurationDB(ConfigurationDB):
+    """ConfigurationDB reading the shared configuration columns"""
+
+    def __init__(self, block):
+        self.arrays = block.arrays
+        self._db = None
+
+    @property
+    def db(self):
+        if self._db is None:
+            arrays = self.arrays
+            self._db = [{'config_id': int(arrays['config_id'][k]), 'speed': float(arrays['speed'][k]),
+                         'power_load_w': float(arrays['power_load_w'][k]), 'power_load': float(arrays['power_load'][k])}
+                        for k in range(len(arrays['config_id']))]
+        return self._db
+
+    def _index(self, conf_id):
+        return int(np.flatnonzero(self.arrays['config_id'] == conf_id)[0])
+
+    def get_power_load(self, conf_id):
+        return float(self.arrays['power_load_w'][self._index(conf_id)])
+
+    def get_speed(self, conf_id):
+        return float(self.arrays['speed'][self._index(conf_id)])
+
+
+class SharedDatabases:
+    """the map, instruction and configuration databases of one process, backed by shared blocks"""
+
+    def __init__(self, blocks):
+        self.blocks = blocks
+        self.map_server = SharedMapServer(blocks['map'])
+        self.instruction_server = SharedInstructionDB(blocks['instructions'])
+        self.config_server = SharedConfigurationDB(blocks['configurations'])
+        # a process that exits without closing still releases its references, a killed one leaks them
+        atexit.register(self.close)
+
+    def close(self):
+        self.map_server = self.instruction_server = self.config_server = None
+        for block in self.blocks.values():
+            block.close()
+        self.blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
+
+
+def publish(map_file, instructions_file, config_file, name=None):
+    """parse the databases and place them in new shared blocks"""
+    if name is None:
+        name = shared_name(map_file, instructions_file, config_file)
+    arrays = {
+        'map': map_arrays(MapServer(map_file)),
+        'instructions': instruction_arrays(InstructionDB(instructions_file)),
+        'configurations': configuration_arrays(ConfigurationDB(config_file)),
+    }
+    blocks = {}
+    try:
+        for kind, suffix in block_suffixes.items():
+            blocks[kind] = SharedBlock.create(name + suffix, arrays[kind])
+    except Exception:
+        for block in blocks.values():
+            block.close()
+        raise
+    return SharedDatabases(blocks)
+
+
+def attach(name):
+    """attach to the blocks published under name"""
+    blocks = {}
+    try:
+        for kind, suffix in block_suffixes.items():
+            blocks[kind] = SharedBlock.attach(name + suffix)
+    except Exception:
+        for block in blocks.values():
+            block.close()
+        raise
+    return SharedDatabases(blocks)
+
+
+def load(map_file, instructions_file, config_file):
+    """attach to the shared databases of the files, publishing them first if no process did yet"""
+    name = shared_name(map_file, instructions_file, config_file)
+    with _Lock(name):
+        try:
+            return attach(name)
+        except FileNotFoundError:
+            return publish(map_file, instructions_file, config_file, name=name)
+
+
+def main():
+    import argparse
+    import tracemalloc
+    from robotcontrol import bot_controller
+
+    parser = argparse.ArgumentParser(description='Compare parsing the databases with attaching to the shared ones')
+    parser.add_argument('--map', default=bot_controller.map_file)
+    parser.add_argument('--instructions', default=bot_controller.instructions_db_file)
+    parser.add_argument('--configurations', default=bot_controller.config_list)
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    parsed = (MapServer(args.map), InstructionDB(args.instructions), ConfigurationDB(args.configurations))
+    parse_time = time.perf_counter() - start_time
+    parse_memory = tracemalloc.get_traced_memory()[0]
+    del parsed
+    tracemalloc.stop()
+
+    owner = publish(args.map, args.instructions, args.configurations)
+    name = owner.blocks['map'].shm.name[:-len(block_suffixes['map'])]
+    # the first attach of a process may also start the resource tracker, the following ones are what a child pays
+    attach(name).close()
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    shared = attach(name)
+    attach_time = time.perf_counter() - start_time
+    attach_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print("parse:  {0:.6f} seconds, {1} bytes".format(parse_time, parse_memory))
+    print("attach: {0:.6f} seconds, {1} bytes".format(attach_time, attach_memory))
+    shared.close()
+    owner.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+#! /usr/bin/env python
+
+"""synthetic maps and instruction dbs in the cp1 formats, for sizing deployments far beyond the bundled map
+
+a layout computes the coordinates and the neighbours of any waypoint from its index alone, so the map file is
+streamed waypoint by waypoint and the routes of the sampled pairs are searched over neighbours generated on demand;
+nothing holds the whole graph:
+    python -m robotcontrol.synthetic grid --waypoints 1000000 --pairs 1000 --out /tmp/big
+"""
+import bisect
+import heapq
+import json
+import math
+import os
+import random
+from collections import OrderedDict
+
+from robotcontrol import instruction_generator
+
+# default seed of the layouts and the sampled pairs
+seed = 1
+# cells of a random geometric layout (or jittered waypoints of a grid) kept in memory, routes of far apart pairs
+# visit many of them
+cell_cache = 100000
+
+
+def waypoint_id(i):
+    return 'l{0}'.format(i + 1)
+
+
+class Grid:
+    """rows x cols waypoints connected to their 4 neighbours, a station every station_every waypoints along the
+    first row"""
+
+    def __init__(self, rows, cols, spacing=4.0, jitter=0.0, station_every=50, seed=seed):
+        self.seed = seed
+        self.rows = rows
+        self.cols = cols
+        self.count = rows * cols
+        self.spacing = spacing
+        self.jitter = jitter
+        self.station_every = station_every
+        # seeding a generator per waypoint dominates the searches, the jittered coordinates are kept
+        self.jittered = OrderedDict()
+
+    def coords(self, i):
+        if self.jitter:
+            point = self.jittered.get(i)
+            if point is not None:
+                return point
+        row, col = divmod(i, self.cols)
+        x, y = col * self.spacing, row * self.spacing
+        if self.jitter:
+            rnd = random.Random(self.seed * 1000003 + i)
+            x += rnd.uniform(-self.jitter, self.jitter)
+            y += rnd.uniform(-self.jitter, self.jitter)
+            self.jittered[i] = (x, y)
+            if len(self.jittered) > cell_cache:
+                self.jittered.popitem(last=False)
+        return x, y
+
+    def connected(self, row, col, row2, col2):
+        return 0 <= row2 < self.rows and 0 <= col2 < self.cols
+
+    def neighbours(self, i):
+        row, col = divmod(i, self.cols)
+        return [row2 * self.cols + col2 for row2, col2 in ((row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1))
+                if self.connected(row, col, row2, col2)]
+
+    def estimate(self, i, j):
+        """lower bound of the route length from i to j"""
+        if self.jitter:
+            (x, y), (x2, y2) = self.coords(i), self.coords(j)
+            return math.hypot(x2 - x, y2 - y)
+        (row, col), (row2, col2) = divmod(i, self.cols), divmod(j, self.cols)
+        return (abs(row2 - row) + abs(col2 - col)) * self.spacing
+
+    def stations(self):
+        return list(range(0, self.cols, self.station_every)) or [0]
+
+
+class Aisles(Grid):
+    """a warehouse: every column is an aisle of rows waypoints, the aisles are only joined by the cross aisles on
+    the first and the last row and on every cross_every-th row in between; the stations are on the first row"""
+
+    def __init__(self, rows, cols, spacing=2.0, cross_every=20, station_every=10, seed=seed):
+        Grid.__init__(self, rows, cols, spacing=spacing, station_every=station_every, seed=seed)
+        self.cross_every = cross_every
+
+    def connected(self, row, col, row2, col2):
+        if not Grid.connected(self, row, col, row2, col2):
+            return False
+        # moving along an aisle is always possible, across only on the cross aisles
+        return col == col2 or row == 0 or row == self.rows - 1 or (self.cross_every and row % self.cross_every == 0)
+
+
+class RandomGeometric:
+    """waypoints scattered over a square, connected to every waypoint within radius
+
+    the square is cut into radius x radius cells, the waypoints of a cell are drawn from a generator seeded with the
+    cell, so the neighbours of a waypoint only need the 3 x 3 cells around it; density is the mean number of
+    waypoints per cell, around 2 gives a mean degree of about 6
+    """
+
+    def __init__(self, count, radius=5.0, density=2.0, stations=None, seed=seed):
+        self.seed = seed
+        self.radius = radius
+        self.side = max(1, int(math.ceil(math.sqrt(count / density))))
+        # waypoints of every cell, spread so that the total is exactly count
+        base, extra = divmod(count, self.side * self.side)
+        rnd = random.Random(seed)
+        self.cell_counts = [base] * (self.side * self.side)
+        for cell in rnd.sample(range(self.side * self.side), extra):
+            self.cell_counts[cell] += 1
+        self.cell_starts = [0]
+        for n in self.cell_counts:
+            self.cell_starts.append(self.cell_starts[-1] + n)
+        self.count = count
+        self.station_count = stations if stations is not None else max(1, count // 2500)
+        self.cells = OrderedDict()
+
+    def cell_points(self, cell):
+        points = self.cells.get(cell)
+        if points is None:
+            rnd = random.Random(self.seed * 1000003 + cell)
+            cy, cx = divmod(cell, self.side)
+            points = [((cx + rnd.random()) * self.radius, (cy + rnd.random()) * self.radius)
+                      for _ in range(self.cell_counts[cell])]
+            self.cells[cell] = points
+            # the cells of three rows cover the neighbours of a whole row of cells
+            if len(self.cells) > max(4 * self.side + 16, cell_cache):
+                self.cells.popitem(last=False)
+        return points
+
+    def cell_of(self, i):
+        return bisect.bisect_right(self.cell_starts, i) - 1
+
+    def coords(self, i):
+        cell = self.cell_of(i)
+        return self.cell_points(cell)[i - self.cell_starts[cell]]
+
+    def neighbours(self, i):
+        cell = self.cell_of(i)
+        x, y = self.cell_points(cell)[i - self.cell_starts[cell]]
+        cy, cx = divmod(cell, self.side)
+        limit = self.radius ** 2
+        found = []
+        for ny in range(max(cy - 1, 0), min(cy + 2, self.side)):
+            for nx in range(max(cx - 1, 0), min(cx + 2, self.side)):
+                other = ny * self.side + nx
+                for k, (x2, y2) in enumerate(self.cell_points(other)):
+                    j = self.cell_starts[other] + k
+                    if j != i and (x2 - x) ** 2 + (y2 - y) ** 2 <= limit:
+                        found.append(j)
+        return found
+
+    def estimate(self, i, j):
+        (x, y), (x2, y2) = self.coords(i), self.coords(j)
+        return math.hypot(x2 - x, y2 - y)
+
+    def stations(self):
+        step = self.count // self.station_count
+        return [k * step for k in range(self.station_count)]
+
+
+def write_map(path, layout):
+    """stream the map of the layout in the MapServer json schema"""
+    with open(path, 'w') as map_json:
+        map_json.write('{"map": [')
+        for i in range(layout.count):
+            x, y = layout.coords(i)
+            waypoint = {'node-id': waypoint_id(i), 'coords': {'x': x, 'y': y},
+                        'connected-to': [waypoint_id(j) for j in layout.neighbours(i)]}
+            map_json.write(',\n' if i else '\n')
+            map_json.write(json.dumps(waypoint))
+        map_json.write('\n], "stations": ')
+        map_json.write(json.dumps([waypoint_id(i) for i in layout.stations()]))
+        map_json.write('}\n')
+
+
+def route(layout, src, tgt):
+    """A* over the neighbours of the layout
+
+    :return: (waypoint indices from src to tgt, length), ([], inf) when tgt cannot be reached
+    """
+    dist = {src: 0.0}
+    prev = {}
+    # among equal estimates the waypoint farthest from src goes first, on a grid this heads straight to tgt
+    queue = [(layout.estimate(src, tgt), 0.0, src)]
+    done = set()
+    while queue:
+        _, _, i = heapq.heappop(queue)
+        if i in done:
+            continue
+        if i == tgt:
+            path = [tgt]
+            while path[-1] != src:
+                path.append(prev[path[-1]])
+            return path[::-1], dist[tgt]
+        done.add(i)
+        x, y = layout.coords(i)
+        for j in layout.neighbours(i):
+            x2, y2 = layout.coords(j)
+            d = dist[i] + math.hypot(x2 - x, y2 - y)
+            if d < dist.get(j, float('inf')):
+                dist[j] = d
+                prev[j] = i
+                heapq.heappush(queue, (d + layout.estimate(j, tgt), -d, j))
+    return [], float('inf')
+
+
+def sample_pairs(layout, pairs, max_distance=None, seed=seed):
+    """distinct (src, tgt) index pairs, at most max_distance apart in a straight line when it is given"""
+    rnd = random.Random(seed)
+    found = set()
+    attempts = 0
+    while len(found) < pairs and attempts < 100 * pairs:
+        attempts += 1
+        src = rnd.randrange(layout.count)
+        tgt = rnd.randrange(layout.count)
+        if src == tgt:
+            continue
+        if max_distance is not None:
+            (x, y), (x2, y2) = layout.coords(src), layout.coords(tgt)
+            if math.hypot(x2 - x, y2 - y) > max_distance:
+                continue
+        found.add((src, tgt))
+    return sorted(found)
+
+
+def write_instructions(path, layout, pairs):
+    """stream the instructions-all.json entries of the reachable pairs
+
+    :return: number of entries written
+    """
+    written = 0
+    with open(path, 'w') as db_json:
+        db_json.write('{')
+        for src, tgt in pairs:
+            indices, length = route(layout, src, tgt)
+            if not indices:
+                continue
+            coords = [layout.coords(i) for i in indices]
+            entry = {'path': [waypoint_id(i) for i in indices],
+                     'start-dir': instruction_generator.start_direction(coords[0], coords[1]),
+                     'time': instruction_generator.predicted_duration(length, len(indices) - 1),
+                     'instructions': instruction_generator.igcode(coords)}
+            db_json.write(',\n' if written else '\n')
+            db_json.write('{0}: {1}'.format(json.dumps('{0}_to_{1}'.format(waypoint_id(src), waypoint_id(tgt))),
+                                            json.dumps(entry)))
+            written += 1
+        db_json.write('\n}\n')
+    return written
+
+
+def layout_for(kind, waypoints, **kwargs):
+    """a grid or aisles layout of about the given number of waypoints, or a random geometric one of exactly that"""
+    if kind == 'random':
+        return RandomGeometric(waypoints, **kwargs)
+    side = max(1, int(round(math.sqrt(waypoints))))
+    if kind == 'grid':
+        return Grid(side, max(1, waypoints // side), **kwargs)
+    if kind == 'aisles':
+        return Aisles(side, max(1, waypoints // side), **kwargs)
+    raise ValueError('Unknown layout: {0}'.format(kind))
+
+
+def main():
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Generate a map and an instruction db in the cp1 formats')
+    parser.add_argument('layout', choices=['grid', 'aisles', 'random'])
+    parser.add_argument('--waypoints', type=int, default=10000)
+    parser.add_argument('--pairs', type=int, default=1000, help='Pairs sampled for the instruction db')
+    parser.add_argument('--max-pair-distance', type=float,
+                        help='Only sample pairs at most this far apart (in meters, in a straight line)')
+    parser.add_argument('--out', default='.', help='Directory of the map.json and instructions-all.json files')
+    parser.add_argument('--seed', type=int, default=seed)
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.out):
+        os.makedirs(args.out)
+    layout = layout_for(args.layout, args.waypoints, seed=args.seed)
+
+    start_time = time.time()
+    write_map(os.path.join(args.out, 'map.json'), layout)
+    print("{0} waypoints written in {1:.1f} s".format(layout.count, time.time() - start_time))
+    start_time = time.time()
+    written = write_instructions(os.path.join(args.out, 'instructions-all.json'), layout,
+                                 sample_pairs(layout, args.pairs, max_distance=args.max_pair_distance, seed=args.seed))
+    print("{0} pairs written in {1:.1f} s".format(written, time.time() - start_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -16,6 +16,7 @@ import roslaunch
 from bot_controller import BotController
 from constants import AdaptationLevel
 from ready_db import ReadyDB
+from robotcontrol import memory_profile
 
 commands = ["baseline_a", "baseline_b", "baseline_c", "place_obstacle", "remove_obstacle"]
 rosnode = "cp1_node"
@@ -185,6 +186,20 @@ def baselineC(bot, start, targets):
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Run the baseline of the ready file')
+    parser.add_argument("--memory-profile",
+                        help='Trace the allocations of every mission phase and write the top sites to this file')
+    parser.add_argument("--memory-interval", type=float, default=memory_profile.interval,
+                        help='Seconds between the memory snapshots taken within a phase, 0 for none')
+    parser.add_argument("--memory-top", type=int, default=memory_profile.top,
+                        help='Allocation sites reported per snapshot and per phase')
+    args = parser.parse_args()
+
+    if args.memory_profile:
+        memory_profile.interval = args.memory_interval
+        memory_profile.top = args.memory_top
+        memory_profile.start(args.memory_profile)
+
     ready = ReadyDB(ready_db=ready_json)
     baseline = ready.get_baseline()
     start = ready.get_start_location()
@@ -204,6 +219,9 @@ def main():
     elif baseline == AdaptationLevel.BASELINE_C:
         baselineC(bot, start, targets)
 
+    if args.memory_profile:
+        memory_profile.stop()
+
 
 if __name__ == '__main__':
     main()
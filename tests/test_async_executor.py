@@ -0,0 +1,115 @@
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+
+try:
+    import rospy
+    from actionlib_msgs.msg import GoalStatus
+    from robotcontrol.async_executor import MissionEngine
+    from robotcontrol.bot_controller import BotController
+except ImportError:
+    raise unittest.SkipTest('the mission engine drives actionlib goals, which need ROS')
+
+from test_replay import Battery, Simulation, databases
+
+
+class ActionClient:
+    """finishes every goal from another thread like actionlib does, or holds it until it is cancelled"""
+
+    def __init__(self, gazebo, hold=False):
+        self.gazebo = gazebo
+        self.hold = hold
+        self.sent = threading.Event()
+        self.cancelled = threading.Event()
+
+    def send_goal(self, goal, done_cb=None, active_cb=None):
+        self.sent.set()
+        if self.hold:
+            return
+
+        def finish():
+            order = getattr(goal, 'order', None)
+            if order is not None:
+                x, y = re.findall(r'MoveAbsH\(([-\d.]+), ([-\d.]+)', order)[-1]
+                self.gazebo.pos = (float(x), float(y))
+                self.gazebo.tick(0.35)
+            else:
+                position = goal.target_pose.pose.position
+                self.gazebo.pos = (position.x, position.y)
+            done_cb(GoalStatus.SUCCEEDED, None)
+        threading.Timer(0.01, finish).start()
+
+    def cancel_goal(self):
+        self.cancelled.set()
+
+
+def async_bot(directory, hold=False):
+    map_server, instruction_server, config_server = databases(directory)
+    gazebo = Simulation(config_server.get_default_config())
+    gazebo.ig_client = ActionClient(gazebo, hold=hold)
+    gazebo.movebase_client = ActionClient(gazebo)
+    gazebo.update_charge(1.0, 0.0)
+    return BotController(map_server, instruction_server, config_server, Battery(), gazebo)
+
+
+def test_mission_future_completes():
+    directory = tempfile.mkdtemp()
+    rospy.rostime.set_rostime_initialized(True)
+    engine = MissionEngine()
+    engine.start()
+    try:
+        bot = async_bot(directory)
+        future = engine.run_mission(bot, 'l1', ['l2', 'l4', 'l9', 'l5'])
+        tasks, locs = future.result(timeout=10)
+        assert tasks == 4
+        # the battery ran low after the third task, the robot charged at l1 and headed on from there
+        assert [(loc['start'], loc['target']) for loc in locs] == [('l1', 'l2'), ('l2', 'l4'), ('l4', 'l9'),
+                                                                   ('l1', 'l5')]
+        # undocked with a full battery before the last task
+        assert abs(bot.gazebo.battery_charge - 0.65) < 1e-9 and not bot.gazebo.is_charging
+    finally:
+        engine.stop()
+        shutil.rmtree(directory)
+
+
+def test_cancelling_the_mission_cancels_the_goal():
+    directory = tempfile.mkdtemp()
+    rospy.rostime.set_rostime_initialized(True)
+    engine = MissionEngine()
+    engine.start()
+    try:
+        bot = async_bot(directory, hold=True)
+        future = engine.run_mission(bot, 'l1', ['l2', 'l4'])
+        assert bot.gazebo.ig_client.sent.wait(5)
+        assert bot.gazebo.goal_active
+        future.cancel()
+        assert bot.gazebo.ig_client.cancelled.wait(5)
+        assert future.cancelled()
+    finally:
+        engine.stop()
+        shutil.rmtree(directory)
+
+
+def test_battery_threshold():
+    directory = tempfile.mkdtemp()
+    engine = MissionEngine()
+    engine.start()
+    try:
+        bot = async_bot(directory)
+        robot = engine.async_bot(bot)
+        below = engine.submit(robot.battery_below(0.5))
+        bot.gazebo.update_charge(0.6, 1.0)
+        assert not below.done()
+        bot.gazebo.update_charge(0.4, 2.0)
+        assert below.result(timeout=5) == 0.4
+        # a charge that already satisfies the predicate resolves at once
+        assert engine.submit(robot.battery_below(0.5)).result(timeout=5) == 0.4
+        full = engine.submit(robot.battery_full())
+        bot.gazebo.update_charge(1.0, 3.0)
+        assert full.result(timeout=5) == 1.0
+        assert robot.charge_watchers == []
+    finally:
+        engine.stop()
+        shutil.rmtree(directory)
@@ -0,0 +1,44 @@
+import os
+import shutil
+import tempfile
+
+from robotcontrol import battery_db, cache
+from robotcontrol.battery_db import BatteryDB
+
+world = '''<sdf version="1.5"><world name="default">
+<model name="filler"><link name="body"><battery name="other"><voltage>1.0</voltage></battery></link></model>
+<model name="mobile_base"><link name="body"><battery name="brass_battery"><voltage>{0}</voltage></battery></link>
+<plugin name="battery" filename="libbattery_discharge.so"><charge_rate>0.2</charge_rate><capacity>1.2009</capacity>
+</plugin></model>
+</world></sdf>
+'''
+
+
+def test_parameters_are_cached_by_the_stat_of_the_world_file():
+    directory = tempfile.mkdtemp()
+    cache_dir = cache.cache_dir
+    cache.cache_dir = os.path.join(directory, 'cache')
+    read_battery_parameters = battery_db.read_battery_parameters
+    try:
+        world_file = os.path.join(directory, 'p2-cp1-1.world')
+        with open(world_file, 'w') as world_xml:
+            world_xml.write(world.format('12.592'))
+        battery = BatteryDB(world_file, battery_name='brass_battery')
+        assert (battery.battery_voltage, battery.charge_rate, battery.capacity) == (12.592, 0.2, 1.2009)
+
+        # a warm start does not read the world file
+        def fail(*args):
+            raise AssertionError('the world file was parsed')
+        battery_db.read_battery_parameters = fail
+        assert BatteryDB(world_file, battery_name='brass_battery').battery_voltage == 12.592
+        battery_db.read_battery_parameters = read_battery_parameters
+
+        # an edited world file is parsed again
+        with open(world_file, 'w') as world_xml:
+            world_xml.write(world.format('11.5'))
+        assert BatteryDB(world_file, battery_name='brass_battery').battery_voltage == 11.5
+        assert BatteryDB(world_file, battery_name='brass_battery', use_cache=False).battery_voltage == 11.5
+    finally:
+        battery_db.read_battery_parameters = read_battery_parameters
+        cache.cache_dir = cache_dir
+        shutil.rmtree(directory)
@@ -0,0 +1,67 @@
+import math
+
+import numpy as np
+
+from robotcontrol import discharge_estimator
+from robotcontrol.discharge_estimator import DischargeEstimator
+
+
+def discharge(estimator, rate, samples, start=100.0, charge=1.0, noise=0.0, seed=0):
+    """feed a linear discharge sampled every 2 s"""
+    rng = np.random.RandomState(seed)
+    for k in range(samples):
+        estimator.update(start + 2.0 * k, charge - rate * 2.0 * k + (rng.normal(0.0, noise) if noise else 0.0))
+
+
+def test_converges_on_a_linear_discharge():
+    estimator = DischargeEstimator()
+    discharge(estimator, 2e-4, discharge_estimator.min_samples - 1)
+    assert estimator.rate is None and estimator.rate_std is None
+    discharge(estimator, 2e-4, 1, start=118.0, charge=1.0 - 2e-4 * 18.0)
+    assert abs(estimator.rate - 2e-4) < 1e-12
+    assert abs(estimator.power_load(12.0) - 2e-4 * 12.0 * 3600) < 1e-6
+
+    noisy = DischargeEstimator()
+    discharge(noisy, 2e-4, 300, noise=1e-4)
+    assert abs(noisy.rate - 2e-4) < 3 * noisy.rate_std
+
+
+def test_rate_std_shrinks_with_the_samples():
+    for forgetting in (0.98, 1.0):
+        stds = []
+        for samples in (15, 30, 60, 120):
+            estimator = DischargeEstimator(forgetting=forgetting)
+            discharge(estimator, 2e-4, samples, noise=1e-4)
+            stds.append(estimator.rate_std)
+        assert all(a > b for a, b in zip(stds[:-1], stds[1:]))
+
+    # without forgetting it is the standard error of the least squares slope
+    estimator = DischargeEstimator(forgetting=1.0)
+    discharge(estimator, 2e-4, 100, noise=1e-4)
+    times = 2.0 * np.arange(100)
+    expected = 1e-4 / math.sqrt(((times - times.mean()) ** 2).sum())
+    assert 0.7 * expected < estimator.rate_std < 1.3 * expected
+
+
+def test_fit_restarts_while_charging():
+    estimator = DischargeEstimator()
+    discharge(estimator, 2e-4, 50)
+    estimator.update(200.0, 0.9, charging=True)
+    assert estimator.samples == 0 and estimator.rate is None
+    # the next discharge is fitted on its own, the samples before the charge are forgotten
+    discharge(estimator, 5e-4, 20, start=300.0, charge=1.0)
+    assert abs(estimator.rate - 5e-4) < 1e-12
+
+
+def test_time_to_empty():
+    estimator = DischargeEstimator()
+    assert estimator.time_to_empty(0.5) == (None, None)
+    discharge(estimator, 2e-4, 100, noise=1e-4)
+    time_to_empty, std = estimator.time_to_empty(0.5)
+    assert abs(time_to_empty - 0.5 / estimator.rate) < 1e-9
+    assert abs(std - 0.5 * estimator.rate_std / estimator.rate ** 2) < 1e-9
+    assert abs(time_to_empty - 2500.0) < 3 * std
+
+    charging = DischargeEstimator()
+    discharge(charging, -1e-4, 20)
+    assert charging.time_to_empty(0.5) == (float('inf'), float('inf'))
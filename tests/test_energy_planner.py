@@ -0,0 +1,117 @@
+import itertools
+
+import numpy as np
+
+from robotcontrol.energy_planner import EnergyPlanner
+
+
+class Planner:
+    """travel times between named waypoints, from a random symmetric matrix"""
+
+    speed = 0.5
+
+    def __init__(self, waypoints, seed):
+        rng = np.random.RandomState(seed)
+        times = rng.uniform(20.0, 150.0, (len(waypoints), len(waypoints)))
+        self.times = times + times.T
+        self.idx = dict((wp, k) for k, wp in enumerate(waypoints))
+
+    def travel_time(self, a, b):
+        return 0.0 if a == b else float(self.times[self.idx[a], self.idx[b]])
+
+
+class Map:
+
+    def __init__(self, stations):
+        self.stations = stations
+
+    def get_charging_stations(self):
+        return self.stations
+
+
+class Battery:
+    capacity = 1.0
+
+    def discharge_rate(self, power_load):
+        return power_load / (12.0 * 3600)
+
+    def time_to_fully_charge(self, charge_level):
+        return (self.capacity - charge_level) / 2.0 * 3600
+
+
+class Configurations:
+
+    def get_power_load(self, config_id):
+        return [20.0, 40.0][config_id]
+
+
+def energy_planner(seed):
+    targets = ['l{0}'.format(k) for k in range(1, 8)]
+    stations = ['s1', 's2']
+    planner = Planner(['l0'] + targets + stations, seed)
+    return EnergyPlanner(planner, Map(stations), Battery(), Configurations(), reserve=0.1), targets
+
+
+def simulate(energy_planner, start, targets, charge, config_id, stops):
+    """mission time with a charging stop after every node in stops, inf if the charge drops below the reserve"""
+    battery = energy_planner.battery
+    planner = energy_planner.mission_planner
+    rate = battery.discharge_rate(energy_planner.config_server.get_power_load(config_id))
+    reserve = energy_planner.reserve * battery.capacity
+    nodes = [start] + list(targets)
+    total = 0.0
+    for k in range(len(targets)):
+        here = nodes[k]
+        if k in stops:
+            station, to_station = energy_planner.closest_station(here)
+            charge -= rate * to_station
+            if charge < reserve:
+                return np.inf
+            total += to_station + battery.time_to_fully_charge(charge)
+            charge = battery.capacity
+            here = station
+        leg = planner.travel_time(here, nodes[k + 1])
+        charge -= rate * leg
+        if charge < reserve:
+            return np.inf
+        total += leg
+    return total
+
+
+def test_plan_matches_brute_force():
+    stopped = set()
+    for seed in range(4):
+        planner, targets = energy_planner(seed)
+        for charge in (1.0, 0.6, 0.4):
+            for config_id in (0, 1):
+                mission_time, stops = planner.plan('l0', targets, charge, config_id)
+                best = min(simulate(planner, 'l0', targets, charge, config_id, set(combo))
+                           for r in range(len(targets) + 1) for combo in itertools.combinations(range(len(targets)), r))
+                assert np.isfinite(best)
+                assert abs(mission_time - best) < 1e-6
+                stopped.add(len(stops))
+                assert abs(simulate(planner, 'l0', targets, charge, config_id, set(k for k, _ in stops)) - best) < 1e-6
+                for k, station in stops:
+                    assert station == planner.closest_station((['l0'] + targets)[k])[0]
+    # the missions range from no stop to several
+    assert 0 in stopped and max(stopped) >= 2
+
+
+def test_no_stop_when_the_charge_lasts():
+    planner, targets = energy_planner(0)
+    # a hundred times the capacity never runs low on this mission
+    planner.battery.capacity = 100.0
+    mission_time, stops = planner.plan('l0', targets, 100.0, 0)
+    assert stops == []
+    legs = zip(['l0'] + targets[:-1], targets)
+    assert abs(mission_time - sum(planner.mission_planner.travel_time(a, b) for a, b in legs)) < 1e-6
+    assert planner.charging_stop('l0', targets, 100.0, 0) is None
+    # the charge is not known yet
+    assert planner.charging_stop('l0', targets, -1.0, 0) is None
+
+
+def test_charge_right_away_when_no_plan_is_feasible():
+    planner, targets = energy_planner(0)
+    mission_time, stops = planner.plan('l0', targets, 0.105, 1)
+    assert mission_time == np.inf and stops == []
+    assert planner.charging_stop('l0', targets, 0.105, 1) == planner.closest_station('l0')[0]
@@ -0,0 +1,127 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+
+from robotcontrol import instruction_generator
+from robotcontrol.instruction_generator import InstructionGenerator, igcode, replace_speed
+from robotcontrol.mapserver import MapServer
+
+
+def test_replace_speed_only_changes_the_speed():
+    code = igcode([[10.0, 20.0], [12.0, 20.68], [12.68, 0.68]])
+    assert 'MoveAbsH(12.00, 20.68, 0.68, ' in code
+    updated = replace_speed(code, 0.25)
+    assert 'MoveAbsH(12.00, 20.68, 0.25, ' in updated
+    assert 'MoveAbsH(12.68, 0.68, 0.25, ' in updated
+    assert updated.count('0.25') == 2
+
+
+def test_replace_speed_without_moves():
+    try:
+        replace_speed('P(V(1, end)::\nnil)', 0.25)
+    except ValueError:
+        pass
+    else:
+        assert False, 'an igcode without MoveAbsH was accepted'
+
+
+db_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'instructions', 'instructions-all.json')
+
+
+def shipped_map(directory):
+    """the map of the shipped db: the coordinates come from its MoveAbsH instructions, the connections from its
+    paths"""
+    with open(db_file) as db_json:
+        db = json.load(db_json)
+    coords = {}
+    connected = {}
+    for entry in db.values():
+        moves = re.findall(r'MoveAbsH\(([-\d.]+), ([-\d.]+),', entry['instructions'])
+        for wp, (x, y) in zip(entry['path'][1:], moves):
+            coords[wp] = {'x': float(x), 'y': float(y)}
+        for a, b in zip(entry['path'][:-1], entry['path'][1:]):
+            connected.setdefault(a, set()).add(b)
+    waypoints = [{'node-id': wp, 'coords': coords[wp], 'connected-to': sorted(connected.get(wp, ()))}
+                 for wp in sorted(coords)]
+    path = os.path.join(directory, 'map.json')
+    with open(path, 'w') as map_json:
+        json.dump({'map': waypoints, 'stations': ['l1']}, map_json)
+    return db, MapServer(path)
+
+
+class Instructions:
+    """an instruction server without entries, that records the entries put into it"""
+
+    def __init__(self):
+        self.db = {}
+        self.puts = []
+
+    def get_instructions(self, wp_src, wp_tgt):
+        return None
+
+    def put(self, wp_src, wp_tgt, entry):
+        self.puts.append((wp_src, wp_tgt, entry))
+
+
+def test_generated_entries_match_the_shipped_db():
+    directory = tempfile.mkdtemp()
+    try:
+        db, map_server = shipped_map(directory)
+        generator = InstructionGenerator(Instructions(), map_server)
+        for key in ('l1_to_l3', 'l7_to_l4', 'l4_to_l9', 'l11_to_l10'):
+            entry = generator.generate(*key.split('_to_'))
+            assert entry['path'] == db[key]['path']
+            assert entry['instructions'] == db[key]['instructions']
+            assert abs(entry['start-dir'] - db[key]['start-dir']) < 1e-2
+            # the duration is a fit to the whole db
+            assert abs(entry['time'] - db[key]['time']) <= 3
+        assert generator.generate('l1', 'l1') is None
+        assert generator.generate('l1', 'l99') is None
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_generated_entries_are_kept_in_a_bounded_cache():
+    directory = tempfile.mkdtemp()
+    cache_size = instruction_generator.cache_size
+    instruction_generator.cache_size = 2
+    try:
+        _, map_server = shipped_map(directory)
+        generator = InstructionGenerator(Instructions(), map_server)
+        generated = []
+        generate = generator.generate
+        generator.generate = lambda wp_src, wp_tgt: generated.append((wp_src, wp_tgt)) or generate(wp_src, wp_tgt)
+
+        for pair in (('l1', 'l3'), ('l7', 'l4'), ('l1', 'l3'), ('l4', 'l9')):
+            assert generator.get_instructions(*pair) is not None
+        # the second l1 to l3 was a hit and made l7 to l4 the least recently used pair
+        assert generated == [('l1', 'l3'), ('l7', 'l4'), ('l4', 'l9')]
+        assert list(generator.entries) == ['l1_to_l3', 'l4_to_l9']
+        generator.get_instructions('l7', 'l4')
+        assert generated[-1] == ('l7', 'l4')
+        assert len(generator.entries) == 2
+    finally:
+        instruction_generator.cache_size = cache_size
+        shutil.rmtree(directory)
+
+
+def test_write_back_puts_the_generated_entries():
+    directory = tempfile.mkdtemp()
+    try:
+        _, map_server = shipped_map(directory)
+        instructions = Instructions()
+        generator = InstructionGenerator(instructions, map_server, write_back=True)
+        code = generator.get_instructions('l1', 'l3')
+        generator.get_instructions('l1', 'l3')
+        generator.get_instructions('l1', 'l99')
+        # one put per generated pair, none for the cache hit and the unknown waypoint
+        assert [(wp_src, wp_tgt) for wp_src, wp_tgt, _ in instructions.puts] == [('l1', 'l3')]
+        assert instructions.puts[0][2]['instructions'] == code
+
+        instructions = Instructions()
+        InstructionGenerator(instructions, map_server).get_instructions('l1', 'l3')
+        assert instructions.puts == []
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,130 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from robotcontrol import instructions_db
+from robotcontrol.instructions_db import InstructionDB
+
+
+def entry(time):
+    return {'path': ['l1', 'l2'], 'start-dir': 0.0, 'time': time, 'instructions': 'MoveAbsH(1, 2, 0.68, 0)'}
+
+
+def write_snapshot(directory, pairs):
+    path = os.path.join(directory, 'instructions.json')
+    with open(path, 'w') as db_json:
+        json.dump(dict(('{0}_to_{1}'.format(src, tgt), entry(time)) for (src, tgt), time in pairs.items()), db_json)
+    return path
+
+
+def test_put_and_delete_are_replayed_from_the_journal():
+    directory = tempfile.mkdtemp()
+    try:
+        path = write_snapshot(directory, {('l1', 'l2'): 10, ('l2', 'l3'): 20})
+        db = InstructionDB(path)
+        db.put('l3', 'l4', entry(30))
+        db.put('l1', 'l2', entry(11))
+        db.delete('l2', 'l3')
+        db.delete('l9', 'l10')
+
+        reopened = InstructionDB(path)
+        assert reopened.db == db.db
+        assert reopened.get_predicted_duration('l1', 'l2') == 11
+        assert reopened.get_predicted_duration('l3', 'l4') == 30
+        assert reopened.get_predicted_duration('l2', 'l3') == -1
+        # the snapshot itself is only rewritten by a compaction
+        with open(path) as db_json:
+            assert sorted(json.load(db_json)) == ['l1_to_l2', 'l2_to_l3']
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_lookups_see_the_records_of_another_writer():
+    directory = tempfile.mkdtemp()
+    refresh_interval = instructions_db.refresh_interval
+    try:
+        path = write_snapshot(directory, {('l1', 'l2'): 10})
+        reader = InstructionDB(path)
+        writer = InstructionDB(path)
+
+        instructions_db.refresh_interval = 3600.0
+        writer.put('l2', 'l3', entry(20))
+        assert reader.get_predicted_duration('l2', 'l3') == -1
+
+        instructions_db.refresh_interval = 1e-9
+        assert reader.get_predicted_duration('l2', 'l3') == 20
+        writer.delete('l1', 'l2')
+        assert reader.get_instructions('l1', 'l2') is None
+        # a partially written record is left for the next refresh
+        with open(writer.journal, 'ab') as journal:
+            journal.write(b'{"op": "put", "key": "l5_to_l6", ')
+        assert reader.refresh() == 0
+        with open(writer.journal, 'ab') as journal:
+            journal.write(json.dumps({'entry': entry(50)})[1:].encode() + b'\n')
+        assert reader.refresh() == 1
+        assert reader.get_predicted_duration('l5', 'l6') == 50
+    finally:
+        instructions_db.refresh_interval = refresh_interval
+        shutil.rmtree(directory)
+
+
+def test_refresh_after_a_compaction_and_new_records():
+    directory = tempfile.mkdtemp()
+    try:
+        path = write_snapshot(directory, {('l0', 'l1'): 1})
+        writer = InstructionDB(path)
+        reader = InstructionDB(path)
+        for k in range(1, 30):
+            writer.put('l{0}'.format(k), 'l{0}'.format(k + 1), entry(k + 1))
+            if k in (5, 10):
+                # from the second compaction on, the new journal may get the inode of the removed one and grow
+                # past the offset the reader is at
+                reader.refresh()
+                writer.compact()
+        reader.refresh()
+        assert reader.db == writer.db
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_compaction_while_another_db_reads():
+    directory = tempfile.mkdtemp()
+    refresh_interval = instructions_db.refresh_interval
+    instructions_db.refresh_interval = 1e-9
+    try:
+        path = write_snapshot(directory, {('l0', 'l1'): 1})
+        writer = InstructionDB(path)
+        reader = InstructionDB(path)
+        stop = threading.Event()
+        missing = []
+
+        def read():
+            while not stop.is_set():
+                for k in range(20):
+                    if reader.get_predicted_duration('l{0}'.format(k), 'l{0}'.format(k + 1)) != k + 1:
+                        missing.append(k)
+
+        for k in range(1, 20):
+            writer.put('l{0}'.format(k), 'l{0}'.format(k + 1), entry(k + 1))
+        reader.refresh()
+        thread = threading.Thread(target=read)
+        thread.start()
+        try:
+            for k in range(20, 200):
+                writer.put('l{0}'.format(k), 'l{0}'.format(k + 1), entry(k + 1))
+                if k % 10 == 0:
+                    writer.compact()
+        finally:
+            stop.set()
+            thread.join()
+
+        assert missing == []
+        assert not os.path.exists(writer.journal) or writer.journal_records < 10
+        reader.refresh()
+        assert reader.db == writer.db
+        assert InstructionDB(path).db == writer.db
+    finally:
+        instructions_db.refresh_interval = refresh_interval
+        shutil.rmtree(directory)
@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+import tempfile
+
+from robotcontrol import instrumentation
+
+
+def test_values_fall_in_the_le_bucket():
+    hist = instrumentation.Histogram()
+    for value in (0.0, instrumentation.buckets[0], 0.0002, instrumentation.buckets[-1], 5000.0):
+        hist.observe(value)
+    # a value on a bound belongs to that bucket, anything past the last bound to +Inf
+    assert hist.counts[0] == 2
+    assert hist.counts[instrumentation.buckets.index(0.0005)] == 1
+    assert hist.counts[len(instrumentation.buckets) - 1] == 1
+    assert hist.counts[-1] == 1
+    assert hist.count == 5 and abs(hist.sum - (0.000001 + 0.0002 + 1200.0 + 5000.0)) < 1e-9
+    cumulative = hist.cumulative_counts()
+    assert cumulative == sorted(cumulative) and cumulative[-1] == hist.count
+
+
+def test_nothing_is_recorded_when_disabled():
+    instrumentation.reset()
+    instrumentation.disable()
+
+    @instrumentation.timed('call')
+    def call(x):
+        return 2 * x
+
+    assert call(3) == 6
+    instrumentation.record('recorded', 0.5)
+    with instrumentation.span('block'):
+        pass
+    assert instrumentation.span('block') is instrumentation._no_span
+    assert json.loads(instrumentation.to_json()) == {'spans': {}}
+
+
+def test_exports():
+    instrumentation.reset()
+    instrumentation.enable()
+    try:
+        @instrumentation.timed('call')
+        def call():
+            pass
+
+        call()
+        call()
+        instrumentation.record('recorded', 0.002)
+        with instrumentation.span('block'):
+            pass
+    finally:
+        instrumentation.disable()
+
+    spans = json.loads(instrumentation.to_json())['spans']
+    assert sorted(spans) == ['block', 'call', 'recorded']
+    assert spans['call']['count'] == 2 and spans['block']['count'] == 1
+    assert spans['recorded']['mean'] == 0.002 and spans['recorded']['buckets'][-1] == '+Inf'
+    assert len(spans['recorded']['counts']) == len(instrumentation.buckets) + 1
+
+    text = instrumentation.to_prometheus()
+    name = instrumentation.metric_name
+    assert '# TYPE {0} histogram\n'.format(name) in text
+    assert '{0}_bucket{{span="recorded",le="0.001"}} 0\n'.format(name) in text
+    assert '{0}_bucket{{span="recorded",le="0.005"}} 1\n'.format(name) in text
+    assert '{0}_bucket{{span="call",le="+Inf"}} 2\n'.format(name) in text
+    assert '{0}_count{{span="block"}} 1\n'.format(name) in text
+    assert '{0}_sum{{span="recorded"}} 0.002\n'.format(name) in text
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'metrics.json')
+        instrumentation.write_metrics(path, fmt='json')
+        with open(path) as metrics_file:
+            assert json.load(metrics_file)['spans'] == spans
+        try:
+            instrumentation.write_metrics(path, fmt='xml')
+            assert False
+        except ValueError:
+            pass
+    finally:
+        shutil.rmtree(directory)
+        instrumentation.reset()
@@ -0,0 +1,94 @@
+import itertools
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from robotcontrol import mission_planner
+from robotcontrol.mission_planner import MissionPlanner, held_karp, path_time, solve
+
+
+def brute_force(times):
+    n = times.shape[0] - 1
+    return min(path_time(times, order) for order in itertools.permutations(range(1, n + 1)))
+
+
+def random_times(rng, n):
+    times = rng.uniform(1.0, 100.0, (n + 1, n + 1))
+    np.fill_diagonal(times, 0.0)
+    return times
+
+
+def test_held_karp_matches_brute_force():
+    rng = np.random.RandomState(0)
+    for n in range(1, 8):
+        for _ in range(5):
+            times = random_times(rng, n)
+            order = held_karp(times)
+            assert sorted(order) == list(range(1, n + 1))
+            assert abs(path_time(times, order) - brute_force(times)) < 1e-9
+
+
+def test_local_search_is_a_permutation_no_worse_than_greedy():
+    rng = np.random.RandomState(1)
+    exact_limit = mission_planner.exact_limit
+    mission_planner.exact_limit = 0
+    try:
+        for n in (5, 8, 30):
+            times = random_times(rng, n)
+            order = solve(times)
+            assert sorted(order) == list(range(1, n + 1))
+            greedy = mission_planner.nearest_neighbour(times)
+            assert path_time(times, order) <= path_time(times, greedy) + 1e-9
+            if n <= 8:
+                # 2-opt and or-opt are not exact, but close on small instances
+                assert path_time(times, order) <= 1.5 * brute_force(times)
+    finally:
+        mission_planner.exact_limit = exact_limit
+
+
+def test_unreachable_targets_go_last():
+    times = np.array([[0.0, 1.0, np.inf], [1.0, 0.0, np.inf], [5.0, 5.0, 0.0]])
+    assert list(solve(times)) == [1, 2]
+
+
+class Instructions:
+
+    def __init__(self, db):
+        self.db = db
+
+
+def write_map(directory):
+    """a 3 x 3 grid, 2 m between neighbours"""
+    waypoints = []
+    for row in range(3):
+        for col in range(3):
+            neighbours = [(row + dr, col + dc) for dr, dc in ((-1, 0), (1, 0), (0, -1), (0, 1))
+                          if 0 <= row + dr < 3 and 0 <= col + dc < 3]
+            waypoints.append({'node-id': 'l{0}'.format(row * 3 + col + 1),
+                              'coords': {'x': 2.0 * col, 'y': 2.0 * row},
+                              'connected-to': ['l{0}'.format(r * 3 + c + 1) for r, c in neighbours]})
+    path = os.path.join(directory, 'map.json')
+    with open(path, 'w') as map_json:
+        json.dump({'map': waypoints, 'stations': ['l1']}, map_json)
+    return path
+
+
+def test_travel_time_matrix_matches_travel_time():
+    from robotcontrol.mapserver import MapServer
+    directory = tempfile.mkdtemp()
+    try:
+        map_server = MapServer(write_map(directory))
+        # a recorded route that is slower than the shortest path
+        db = {'l1_to_l9': {'path': ['l1', 'l2', 'l3', 'l6', 'l9'], 'time': 40, 'start-dir': 0.0, 'instructions': ''}}
+        planner = MissionPlanner(Instructions(db), map_server, speed=0.5)
+        nodes = ['l1', 'l9', 'l5', 'l3', 'l9']
+        times = planner.travel_time_matrix(nodes[0], nodes[1:])
+        expected = np.array([[planner.travel_time(a, b) for b in nodes] for a in nodes])
+        assert np.allclose(times, expected)
+        order = planner.plan(nodes[0], nodes[1:])
+        assert sorted(order) == sorted(nodes[1:])
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,91 @@
+import shutil
+import tempfile
+
+import numpy as np
+
+from robotcontrol import instruction_generator
+from robotcontrol.mapserver import MapServer
+from robotcontrol.mission_predictor import MissionPredictor
+from test_mission_planner import Instructions, write_map
+
+
+class Configurations:
+
+    def __init__(self, speeds, power_loads):
+        self.db = [{'config_id': k, 'speed': speed, 'power_load_w': power}
+                   for k, (speed, power) in enumerate(zip(speeds, power_loads))]
+
+    def get_speed(self, config_id):
+        return self.db[config_id]['speed']
+
+    def get_power_load(self, config_id):
+        return self.db[config_id]['power_load_w']
+
+
+class Battery:
+
+    def discharge_rate(self, power_load):
+        return power_load / (12.0 * 3600)
+
+
+def steps(a, b):
+    """legs between two waypoints of the 3 x 3 grid of write_map"""
+    (r0, c0), (r1, c1) = divmod(int(a[1:]) - 1, 3), divmod(int(b[1:]) - 1, 3)
+    return abs(r1 - r0) + abs(c1 - c0)
+
+
+def reference_duration(a, b, speed):
+    """the duration of one pair worked out by hand: the l1_to_l9 route of the db is 8 m and took 40 s, every
+    other pair drives its shortest path with the overhead per leg fitted to that observation"""
+    residual = 40 - 8.0 / instruction_generator.speed
+    if (a, b) == ('l1', 'l9'):
+        return 8.0 / speed + residual
+    per_leg = residual * 4 / 16.0
+    return 2.0 * steps(a, b) / speed + steps(a, b) * per_leg
+
+
+def test_predict_matches_per_pair_loop():
+    directory = tempfile.mkdtemp()
+    try:
+        map_server = MapServer(write_map(directory))
+        db = {'l1_to_l9': {'path': ['l1', 'l2', 'l3', 'l6', 'l9'], 'time': 40, 'start-dir': 0.0, 'instructions': ''}}
+        configurations = Configurations([0.3, 0.5, 0.9], [20.0, 35.0, 60.0])
+        battery = Battery()
+        predictor = MissionPredictor(Instructions(db), map_server, configurations, battery)
+
+        ids = ['l{0}'.format(k) for k in range(1, 10)]
+        # the batches of the planner come from the rows searched on demand
+        durations = predictor.duration_model.durations(ids, ids[::-1], 0.5)
+        for k, a in enumerate(ids):
+            for l, b in enumerate(ids[::-1]):
+                assert abs(durations[k, l] - reference_duration(a, b, 0.5)) < 1e-9
+
+        # the predictor sums the legs over the whole arrays
+        rng = np.random.RandomState(0)
+        missions = [list(rng.choice(ids, size=rng.randint(1, 7))) for _ in range(50)] + [['l1', 'l9', 'l1', 'l9']]
+        time, energy = predictor.predict(predictor.encode(missions), [2, 0, 1])
+
+        for m, mission in enumerate(missions):
+            for c, config_id in enumerate([2, 0, 1]):
+                speed = configurations.get_speed(config_id)
+                expected = sum(reference_duration(a, b, speed) for a, b in zip(mission[:-1], mission[1:]))
+                assert abs(time[m, c] - expected) < 1e-9
+                rate = battery.discharge_rate(configurations.get_power_load(config_id))
+                assert abs(energy[m, c] - expected * rate) < 1e-12
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_planner_fits_the_shared_model_on_first_use():
+    from robotcontrol.mission_planner import MissionPlanner
+    directory = tempfile.mkdtemp()
+    try:
+        map_server = MapServer(write_map(directory))
+        db = {'l1_to_l9': {'path': ['l1', 'l2', 'l3', 'l6', 'l9'], 'time': 40, 'start-dir': 0.0, 'instructions': ''}}
+        predictor = MissionPredictor(Instructions(db), map_server, Configurations([0.5], [35.0]), Battery())
+        planner = MissionPlanner(Instructions(db), map_server, speed=0.5, mission_predictor=predictor)
+        assert predictor._duration_model is None
+        assert abs(planner.travel_time('l1', 'l9') - reference_duration('l1', 'l9', 0.5)) < 1e-9
+        assert planner.duration_model is predictor.duration_model
+    finally:
+        shutil.rmtree(directory)
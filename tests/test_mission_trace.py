@@ -0,0 +1,87 @@
+import shutil
+import tempfile
+import threading
+
+from robotcontrol.mission_trace import MissionTraceReader, MissionTraceWriter
+
+
+def test_round_trip():
+    directory = tempfile.mkdtemp()
+    try:
+        writer = MissionTraceWriter(directory, chunk_size=4)
+        locs = []
+        for mission in range(3):
+            writer.begin_mission()
+            for k in range(5):
+                loc = {"start": 'l{0}'.format(k), "target": 'l{0}'.format(k + 1), "x": 0.5 * k, "y": -1.0 * k,
+                       "task_accomplished": k % 2 == 0, "dist_to_target": 0.25 * k}
+                writer.record_task(loc["start"], loc["target"], loc["x"], loc["y"], loc["task_accomplished"],
+                                   loc["dist_to_target"], timestamp=100.0 * mission + k)
+                writer.record_telemetry(100.0 * mission + k, 1.0 - 0.01 * k, False, mission)
+                locs.append(loc)
+        writer.record_observation('go_charging', 3)
+        writer.close()
+
+        reader = MissionTraceReader(directory)
+        assert list(reader.missions()) == [0, 1, 2]
+        assert [loc for mission in reader.missions() for loc in reader.locs(mission)] == locs
+        assert list(reader.mission_telemetry(2)['config_id']) == [2] * 5
+        assert reader.observations['kind'][0] == b'go_charging'
+
+        # appending continues the mission numbering
+        writer = MissionTraceWriter(directory)
+        assert writer.begin_mission() == 3
+        writer.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_long_waypoint_ids():
+    directory = tempfile.mkdtemp()
+    try:
+        long_id = 'aisle-{0}'.format('7' * 40)
+        writer = MissionTraceWriter(directory, waypoint_ids=['l1', long_id])
+        writer.begin_mission()
+        writer.record_task('l1', long_id, 0.0, 0.0, True, 0.0)
+        writer.close()
+        assert MissionTraceReader(directory).locs(0)[0]['target'] == long_id
+
+        # a trace made for shorter ids rejects them instead of cutting them
+        writer = MissionTraceWriter(directory)
+        try:
+            writer.record_task('l1', long_id + 'x' * 64, 0.0, 0.0, True, 0.0)
+        except ValueError:
+            pass
+        else:
+            assert False, 'a waypoint id longer than the field was written'
+        writer.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_concurrent_writers():
+    directory = tempfile.mkdtemp()
+    try:
+        writer = MissionTraceWriter(directory, chunk_size=7, flush_interval=0.0)
+        writer.begin_mission()
+
+        def telemetry():
+            for k in range(2000):
+                writer.record_telemetry(float(k), 1.0, False, 0)
+
+        def tasks():
+            for k in range(2000):
+                writer.record_task('l1', 'l2', 0.0, 0.0, True, 0.0, timestamp=float(k))
+
+        threads = [threading.Thread(target=telemetry), threading.Thread(target=tasks)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        writer.close()
+
+        reader = MissionTraceReader(directory)
+        assert sorted(reader.telemetry['timestamp']) == [float(k) for k in range(2000)]
+        assert list(reader.tasks['task']) == list(range(2000))
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,42 @@
+import math
+
+import numpy as np
+
+from robotcontrol import planar_pose, transformations
+
+
+def random_quaternions(n, seed=0):
+    q = np.random.RandomState(seed).normal(size=(n, 4))
+    return q / np.linalg.norm(q, axis=1)[:, None]
+
+
+def angle_difference(a, b):
+    return abs((a - b + math.pi) % (2 * math.pi) - math.pi)
+
+
+def test_yaw_matches_the_sxyz_euler_angle():
+    quaternions = random_quaternions(1000)
+    yaws = planar_pose.yaws_from_quaternions(quaternions)
+    for q, yaw in zip(quaternions, yaws):
+        expected = transformations.euler_from_quaternion(q)[2]
+        assert angle_difference(planar_pose.yaw_from_quaternion(*q), expected) < 1e-9
+        assert angle_difference(yaw, expected) < 1e-9
+
+    out = np.empty(len(quaternions))
+    assert planar_pose.yaws_from_quaternions(quaternions, out=out) is out
+    assert np.array_equal(out, yaws)
+
+
+def test_quaternion_matches_the_sxyz_rotation_about_z():
+    yaws = np.random.RandomState(1).uniform(-math.pi, math.pi, 1000)
+    quaternions = planar_pose.quaternions_from_yaws(yaws)
+    assert quaternions.shape == (1000, 4)
+    for yaw, q in zip(yaws, quaternions):
+        expected = transformations.quaternion_from_euler(0.0, 0.0, yaw)
+        assert np.allclose(planar_pose.quaternion_from_yaw(yaw), expected, atol=1e-12)
+        assert np.allclose(q, expected, atol=1e-12)
+        # and back
+        assert angle_difference(planar_pose.yaw_from_quaternion(*q), yaw) < 1e-9
+
+    assert planar_pose.quaternion_from_yaw(0.0) == planar_pose.identity_quaternion
+    assert planar_pose.quaternions_from_yaws(np.zeros((2, 3))).shape == (2, 3, 4)
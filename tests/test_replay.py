@@ -0,0 +1,158 @@
+import re
+import shutil
+import tempfile
+import time
+import unittest
+
+try:
+    import rospy
+    from robotcontrol.bot_controller import BotController
+    from robotcontrol.configuration_db import ConfigurationDB
+    from robotcontrol.instructions_db import InstructionDB
+    from robotcontrol.mission_trace import MissionTraceReader, MissionTraceWriter
+    from robotcontrol.replay import ReplayDivergence, ReplayInterface, replay_mission, replay_trace
+except ImportError:
+    raise unittest.SkipTest('the replay runs the mission loops of the controller, which need ROS')
+
+from test_instruction_generator import db_file, shipped_map
+
+
+class Battery:
+    battery_voltage = 12.0
+    charge_rate = 2.0
+    capacity = 1.0
+
+    def discharge_rate(self, power_load):
+        return power_load / (self.battery_voltage * 3600)
+
+    def time_to_fully_charge(self, charge_level):
+        return (self.capacity - charge_level) / self.charge_rate * 3600
+
+
+class Simulation(ReplayInterface):
+    """drives the robot to the last MoveAbsH of every igcode, a task costs a third of the battery and the
+    observations are handed to the trace like the ros interface does"""
+
+    def __init__(self, default_config):
+        ReplayInterface.__init__(self, [], [], default_config)
+        self.pos = (0.0, 0.0)
+        self.charge = 1.0
+
+    def observe(self, kind, value=0.0, x=0.0, y=0.0, yaw=0.0):
+        if self.observation_cb is not None:
+            self.observation_cb(kind, value, x, y, yaw, timestamp=time.time())
+
+    def tick(self, drop):
+        self.charge = self.battery_capacity if self.is_charging else self.charge - drop
+        self.update_charge(self.charge, time.time())
+
+    def move_bot_with_igcode(self, igcode, active_cb=None, done_cb=None):
+        x, y = re.findall(r'MoveAbsH\(([-\d.]+), ([-\d.]+)', igcode)[-1]
+        self.pos = (float(x), float(y))
+        self.tick(0.35)
+        self.observe('ig_result', 1)
+        return True
+
+    def move_to_point(self, x, y):
+        self.pos = (x, y)
+        self.tick(0.05)
+        self.observe('movebase_result', 1)
+        return True
+
+    def get_bot_state(self):
+        x, y = self.pos
+        self.observe('pose', 0.0, x, y, 0.0)
+        self.last_loc = {'x': x, 'y': y}
+        return x, y, 0.0, 0.0
+
+    def get_current_configuration(self, current_or_historical):
+        self.observe('config', self.current_config)
+        return self.current_config
+
+    def set_charging(self, charging):
+        self.is_charging = charging
+        self.tick(0.0)
+        return True
+
+
+def record(directory, map_server, instruction_server, config_server):
+    gazebo = Simulation(config_server.get_default_config())
+    bot = BotController(map_server, instruction_server, config_server, Battery(), gazebo)
+    bot.start_trace(directory)
+    try:
+        return bot.go_instructions_multiple_tasks_reactive('l1', ['l2', 'l4', 'l9', 'l5', 'l3'])
+    finally:
+        bot.stop_trace()
+
+
+def databases(directory):
+    _, map_server = shipped_map(directory)
+    return map_server, InstructionDB(db_file), ConfigurationDB('cp1/config_list_true.json')
+
+
+def test_replay_takes_the_recorded_decisions():
+    directory = tempfile.mkdtemp()
+    rospy.rostime.set_rostime_initialized(True)
+    try:
+        map_server, instruction_server, config_server = databases(directory)
+        tasks, locs = record(directory + '/trace', map_server, instruction_server, config_server)
+        assert tasks == 5
+
+        results = replay_trace(directory + '/trace', 'reactive', map_server, instruction_server, config_server,
+                               Battery())
+        assert len(results) == 1
+        assert results[0]['mismatches'] == []
+        assert results[0]['tasks'] == locs
+        # the battery ran low on the way
+        assert [kind for kind, _ in results[0]['decisions']] == ['go_charging']
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_changed_decisions_are_reported():
+    directory = tempfile.mkdtemp()
+    rospy.rostime.set_rostime_initialized(True)
+    try:
+        map_server, instruction_server, config_server = databases(directory)
+        record(directory + '/trace', map_server, instruction_server, config_server)
+        reader = MissionTraceReader(directory + '/trace')
+
+        # the same mission, recorded without the charging decision
+        writer = MissionTraceWriter(directory + '/changed',
+                                    waypoint_ids=[wp['node-id'] for wp in map_server.waypoint_list])
+        writer.begin_mission()
+        for task in reader.tasks:
+            writer.record_task(task['start'].decode(), task['target'].decode(), task['x'], task['y'],
+                               task['task_accomplished'], task['dist_to_target'], timestamp=task['timestamp'])
+        for update in reader.telemetry:
+            writer.record_telemetry(update['timestamp'], update['charge'], update['charging'], update['config_id'])
+        for obs in reader.observations:
+            if obs['kind'] != b'go_charging':
+                writer.record_observation(obs['kind'].decode(), obs['value'], obs['x'], obs['y'], obs['yaw'],
+                                          timestamp=obs['timestamp'])
+        writer.close()
+
+        result = replay_mission(MissionTraceReader(directory + '/changed'), 0, 'reactive', map_server,
+                                instruction_server, config_server, Battery())
+        assert not result['matches']
+        assert any(mismatch.startswith('Recorded decisions []') for mismatch in result['mismatches'])
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_charging_waits_for_the_recorded_charge():
+    gazebo = ReplayInterface([], [], 0)
+    gazebo.battery_capacity = 1.0
+    gazebo.recorded_telemetry = [{'timestamp': 1.0, 'charge': 0.5}, {'timestamp': 2.0, 'charge': 1.0}]
+    gazebo.advance_until_charged()
+    assert gazebo.battery_charge == 1.0 and gazebo.clock == 2.0
+
+    gazebo = ReplayInterface([], [], 0)
+    gazebo.battery_capacity = 1.0
+    gazebo.recorded_telemetry = [{'timestamp': 1.0, 'charge': 0.5}]
+    try:
+        gazebo.advance_until_charged()
+    except ReplayDivergence:
+        pass
+    else:
+        assert False, 'a charge that never got full was waited for'
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+
+from robotcontrol import synthetic
+from robotcontrol.instructions_db import InstructionDB
+from robotcontrol.mapserver import MapServer
+
+layouts = [
+    ('grid', lambda seed: synthetic.Grid(6, 7, station_every=3, seed=seed)),
+    ('jittered', lambda seed: synthetic.Grid(6, 7, jitter=1.0, station_every=3, seed=seed)),
+    ('aisles', lambda seed: synthetic.Aisles(8, 5, cross_every=3, seed=seed)),
+    ('random', lambda seed: synthetic.RandomGeometric(60, radius=5.0, stations=2, seed=seed)),
+]
+
+
+def write(directory, layout, pairs=30, seed=synthetic.seed):
+    map_file = os.path.join(directory, 'map.json')
+    db_file = os.path.join(directory, 'instructions-all.json')
+    synthetic.write_map(map_file, layout)
+    written = synthetic.write_instructions(db_file, layout, synthetic.sample_pairs(layout, pairs, seed=seed))
+    return map_file, db_file, written
+
+
+def test_written_files_load():
+    directory = tempfile.mkdtemp()
+    try:
+        for name, make in layouts:
+            layout = make(synthetic.seed)
+            map_file, db_file, written = write(directory, layout)
+            map_server = MapServer(map_file)
+            assert len(map_server.waypoint_list) == layout.count
+            assert map_server.get_charging_stations() == [synthetic.waypoint_id(i) for i in layout.stations()]
+            for i in range(layout.count):
+                coords = map_server.waypoint_to_coords(synthetic.waypoint_id(i))
+                assert (coords['x'], coords['y']) == layout.coords(i)
+
+            db = InstructionDB(db_file)
+            assert len(db.db) == written > 0
+            for key, entry in db.db.items():
+                src, tgt = key.split('_to_')
+                assert db.get_path(src, tgt) == entry['path']
+                assert entry['path'][0] == src and entry['path'][-1] == tgt
+                # every leg of the path is an edge of the map and the program visits the rest of the path
+                for a, b in zip(entry['path'][:-1], entry['path'][1:]):
+                    assert b in map_server.get_waypoint(a)[0]['connected-to']
+                assert db.get_instructions(src, tgt).count('MoveAbsH') == len(entry['path']) - 1
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_route_is_a_shortest_path():
+    directory = tempfile.mkdtemp()
+    try:
+        for name, make in layouts:
+            layout = make(synthetic.seed)
+            map_file, _, _ = write(directory, layout, pairs=1)
+            map_server = MapServer(map_file)
+            for src, tgt in synthetic.sample_pairs(layout, 40, seed=2):
+                indices, length = synthetic.route(layout, src, tgt)
+                path, expected = map_server.shortest_path(synthetic.waypoint_id(src), synthetic.waypoint_id(tgt))
+                if not path:
+                    assert indices == [] and length == float('inf')
+                    continue
+                assert abs(length - expected) < 1e-9, (name, src, tgt)
+                assert indices[0] == src and indices[-1] == tgt
+        # without jitter the grid routes are manhattan routes
+        grid = synthetic.Grid(6, 7, spacing=4.0)
+        indices, length = synthetic.route(grid, 0, 41)
+        assert length == 4.0 * (5 + 6) and len(indices) == 12
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_a_fixed_seed_gives_the_same_files():
+    directory = tempfile.mkdtemp()
+    try:
+        for name, make in layouts:
+            contents = []
+            for seed in (3, 3, 4):
+                written = write(directory, make(seed), seed=seed)
+                contents.append([open(path).read() for path in written[:2]])
+            assert contents[0] == contents[1]
+            if name in ('jittered', 'random'):
+                # the waypoints themselves are random
+                assert contents[0][0] != contents[2][0]
+            assert contents[0][1] != contents[2][1]
+    finally:
+        shutil.rmtree(directory)